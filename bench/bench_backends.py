@@ -0,0 +1,154 @@
+"""Threads vs asyncio: wall-clock time of one reconcile pass over N stale records.
+
+Each record sits in a zone of its own, so the per-zone limit does not cap
+concurrency and the backends are compared on how many requests they keep in
+flight. The thread pool talks HTTP/1.1 to a threaded stub; the asyncio
+backend talks HTTP/2 (cleartext, prior knowledge) to an HTTP/2 stub that
+multiplexes streams like api.cloudflare.com. Both stubs answer after
+--latency seconds and run in a child process. On a single CPU core the stubs
+compete with the client for the CPU, so their own cost is part of the result.
+
+Needs httpx[http2] (h2 is used by the HTTP/2 stub too).
+
+Usage:
+    python bench/bench_backends.py [--records 1000] [--latency 0.02]
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+import time
+from urllib.parse import parse_qs, urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "tests")]
+
+import cfUpdater  # noqa: E402
+from cloudflare_stub import CloudflareStub, make_zone, serve_in_subprocess  # noqa: E402
+
+try:
+    import h2.config
+    import h2.connection
+    import h2.events
+    import httpx
+except ImportError:
+    sys.exit("This benchmark needs httpx[http2]: pip install \"httpx[http2]\"")
+
+NEW_IP = "203.0.113.7"
+MAX_STREAMS = 100
+
+
+def serve_http2(zones: dict, delay: float, connection):
+    """Serves the stub's answers over cleartext HTTP/2 until the parent terminates the process."""
+    stub = CloudflareStub(zones)
+
+    async def handle(reader, writer):
+        conn = h2.connection.H2Connection(h2.config.H2Configuration(client_side=False))
+        conn.local_settings.max_concurrent_streams = MAX_STREAMS
+        conn.initiate_connection()
+        writer.write(conn.data_to_send())
+        streams = {}
+
+        async def answer(stream_id, headers, body):
+            await asyncio.sleep(delay)
+            headers = {name.decode(): value.decode() for name, value in headers}
+            url = urlsplit(headers[":path"])
+            query = {key: values[0] for key, values in parse_qs(url.query).items()}
+            status, payload = stub.handle(headers[":method"], url.path, query, json.loads(body) if body else None)
+            data = json.dumps(payload).encode()
+            conn.send_headers(stream_id, [(":status", str(status)), ("content-type", "application/json"),
+                                          ("content-length", str(len(data)))])
+            conn.send_data(stream_id, data, end_stream=True)
+            writer.write(conn.data_to_send())
+
+        while data := await reader.read(65536):
+            for event in conn.receive_data(data):
+                if isinstance(event, h2.events.RequestReceived):
+                    streams[event.stream_id] = [event.headers, b""]
+                elif isinstance(event, h2.events.DataReceived):
+                    streams[event.stream_id][1] += event.data
+                    conn.acknowledge_received_data(event.flow_controlled_length, event.stream_id)
+                elif isinstance(event, h2.events.StreamEnded):
+                    asyncio.ensure_future(answer(event.stream_id, *streams.pop(event.stream_id)))
+            writer.write(conn.data_to_send())
+        writer.close()
+
+    async def main():
+        server = await asyncio.start_server(handle, "127.0.0.1", 0, backlog=2048)
+        connection.send(f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}/client/v4")
+        await server.serve_forever()
+
+    asyncio.run(main())
+
+
+def serve_http2_in_subprocess(zones: dict, delay: float) -> tuple[multiprocessing.Process, str]:
+    parent, child = multiprocessing.Pipe()
+    process = multiprocessing.Process(target=serve_http2, args=(zones, delay, child), daemon=True)
+    process.start()
+    return process, parent.recv()
+
+
+def build_zones(count: int) -> dict[str, list[dict]]:
+    return {f"zone{number:05d}": make_zone(f"zone{number:05d}", 1, domain=f"zone{number}.example")
+            for number in range(count)}
+
+
+def run(zones: dict, serve) -> tuple[float, dict]:
+    process, api = serve(zones)
+    try:
+        cfUpdater.CLOUDFLARE_API = api
+        cfUpdater.record_id_cache = cfUpdater.RecordIdCache()
+        desired = [(cfUpdater.RecordSpec(records[0]["name"], zone_id), NEW_IP) for zone_id, records in zones.items()]
+        results = {}
+        started = time.perf_counter()
+        for _, result in cfUpdater.reconcile_records("key", "user@example.com", desired):
+            results[result] = results.get(result, 0) + 1
+        return time.perf_counter() - started, results
+    finally:
+        process.terminate()
+        process.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds the stubs take per request")
+    args = parser.parse_args()
+    cfUpdater.rate_limiter = cfUpdater.RateLimiter(limit=10 ** 7)  # Measure the backends, not the rate limit
+    zones = build_zones(args.records)
+
+    def threaded(workers):
+        cfUpdater.max_workers = workers
+        cfUpdater.configure_http_client(max(cfUpdater.DEFAULT_POOL_SIZE, workers))
+        return run(zones, lambda zones: serve_in_subprocess(zones, args.latency))
+
+    print(f"{args.records} records, one per zone, latency {args.latency * 1000:.0f} ms")
+    for label, measure in (
+        (f"threads, MaxWorkers={cfUpdater.DEFAULT_MAX_WORKERS} (default)",
+         lambda: threaded(cfUpdater.DEFAULT_MAX_WORKERS)),
+        ("threads, MaxWorkers=32", lambda: threaded(32)),
+    ):
+        seconds, results = measure()
+        print(f"{label:48s} {seconds:7.2f} s  {results}")
+
+    cfUpdater.async_client = client = cfUpdater.AsyncHttpClient()
+
+    async def use_prior_knowledge():  # The stub speaks cleartext HTTP/2, which needs prior knowledge instead of ALPN
+        await client.client.aclose()
+        limits = httpx.Limits(max_connections=client.connections, max_keepalive_connections=client.connections)
+        client.client = httpx.AsyncClient(http1=False, http2=True, limits=limits)
+    client.run(use_prior_knowledge())
+    try:
+        seconds, results = run(zones, lambda zones: serve_http2_in_subprocess(zones, args.latency))
+    finally:
+        client.close()
+        cfUpdater.async_client = None
+    label = f"asyncio, {client.connections} HTTP/2 connections, {client.streams} streams"
+    print(f"{label:48s} {seconds:7.2f} s  {results}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""TLS handshakes per update cycle: module-level requests calls vs the pooled HttpClient.
+
+Serves the stub over HTTPS with a throwaway self-signed certificate and counts
+the connections it accepts, each one a full TCP and TLS handshake. A cycle is
+the pre-reconcile update loop: one public IP lookup, then a record ID lookup
+and a PUT per record. The "requests.get" variant sends it the way the code did
+before HttpClient, with a module-level requests call (and so a new connection)
+per request; the "HttpClient" variant sends the same requests through the
+shared keep-alive client.
+
+Needs the openssl command line tool to create the certificate.
+
+Usage:
+    python bench/bench_handshakes.py [--records 10] [--cycles 5]
+"""
+
+import argparse
+import os
+import shutil
+import ssl
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "tests")]
+
+import requests  # noqa: E402
+
+import cfUpdater  # noqa: E402
+from cloudflare_stub import CloudflareStub, make_zone  # noqa: E402
+
+NEW_IPS = ("203.0.113.7", "203.0.113.8")
+
+
+def make_certificate(directory: str) -> tuple[str, str]:
+    """Creates a self-signed certificate for 127.0.0.1; returns (certificate, key) paths."""
+    cert, key = os.path.join(directory, "cert.pem"), os.path.join(directory, "key.pem")
+    subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+                    "-subj", "/CN=127.0.0.1", "-addext", "subjectAltName=IP:127.0.0.1",
+                    "-keyout", key, "-out", cert],
+                   check=True, capture_output=True)
+    return cert, key
+
+
+def cycle(get, put, stub: CloudflareStub, ip: str):
+    """One update pass over every record of zone1, sent with the given get/put functions."""
+    get(f"{stub.url}/ip", params={"answer": ip}, timeout=10).raise_for_status()
+    headers = cfUpdater.cloudflare_headers("key", "user@example.com")
+    for record in stub.zones["zone1"]:
+        response = get(f"{stub.api}/zones/zone1/dns_records", params={"type": "A", "name": record["name"]},
+                       headers=headers, timeout=10)
+        record_id = response.json()["result"][0]["id"]
+        put(f"{stub.api}/zones/zone1/dns_records/{record_id}", headers=headers, timeout=10,
+            json={"type": "A", "name": record["name"], "content": ip})
+
+
+def run(label: str, get, put, stub: CloudflareStub, cycles: int):
+    handshakes, started = [], time.perf_counter()
+    for number in range(cycles):
+        before = stub.connections
+        cycle(get, put, stub, NEW_IPS[number % 2])
+        handshakes.append(stub.connections - before)
+    seconds = time.perf_counter() - started
+    requests_per_cycle = 1 + 2 * len(stub.zones["zone1"])
+    print(f"{label:14s} {requests_per_cycle:>9} {' '.join(map(str, handshakes)):>24} {sum(handshakes):>6}"
+          f" {seconds / cycles * 1000:>10.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=10)
+    parser.add_argument("--cycles", type=int, default=5)
+    args = parser.parse_args()
+    if shutil.which("openssl") is None:
+        sys.exit("This benchmark needs the openssl command line tool to create a certificate")
+    cfUpdater.rate_limiter = cfUpdater.RateLimiter(limit=10 ** 6)  # Measure the connections, not the rate limit
+
+    with tempfile.TemporaryDirectory() as directory:
+        cert, key = make_certificate(directory)
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(cert, key)
+        os.environ["REQUESTS_CA_BUNDLE"] = cert  # Trusted by module-level requests calls and by HttpClient
+        stub = CloudflareStub({"zone1": make_zone("zone1", args.records)}).start(context)
+        cfUpdater.CLOUDFLARE_API = stub.api
+        client = cfUpdater.configure_http_client()
+        try:
+            print(f"{args.records} records, {args.cycles} cycles over HTTPS")
+            print(f"{'client':14s} {'requests':>9} {'handshakes per cycle':>24} {'total':>6} {'per cycle':>13}")
+            run("requests.get", requests.get, requests.put, stub, args.cycles)
+            run("HttpClient", client.get, client.put, stub, args.cycles)
+        finally:
+            client.close()
+            stub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Wall-clock time of one update pass over N stale records against a latency-injecting stub.
+
+Compares the old one-record-at-a-time loop (check_dns_record, then
+update_dns_record_for_domain) with reconcile_records, with and without the
+batch endpoint. The stub runs in a child process and answers every request
+after --latency seconds.
+
+Usage:
+    python bench/bench_reconcile.py [--sizes 10 100 1000] [--latency 0.02] [--zones 10]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "tests")]
+
+import cfUpdater  # noqa: E402
+from cloudflare_stub import make_zone, serve_in_subprocess  # noqa: E402
+
+NEW_IP = "203.0.113.7"
+
+
+def build_zones(count: int, zones: int) -> dict[str, list[dict]]:
+    per_zone = -(-count // zones)
+    return {f"zone{n}": make_zone(f"zone{n}", min(per_zone, count - n * per_zone), domain=f"zone{n}.example")
+            for n in range(zones) if count > n * per_zone}
+
+
+def sequential(desired):
+    for spec, ip in desired:
+        if cfUpdater.check_dns_record("key", "user@example.com", spec.zone_id, spec.name, spec.type) != ip:
+            cfUpdater.update_dns_record_for_domain("key", "user@example.com", spec.zone_id, spec.name, spec.type, ip)
+
+
+def concurrent(desired):
+    for _ in cfUpdater.reconcile_records("key", "user@example.com", desired):
+        pass
+
+
+def run(variant, count, zones, latency, batch_size) -> float:
+    zone_records = build_zones(count, zones)
+    process, api = serve_in_subprocess(zone_records, latency)
+    try:
+        cfUpdater.CLOUDFLARE_API = api
+        cfUpdater.record_id_cache = cfUpdater.RecordIdCache()
+        cfUpdater.batch_size = batch_size
+        desired = [(cfUpdater.RecordSpec(record["name"], zone_id), NEW_IP)
+                   for zone_id, records in zone_records.items() for record in records]
+        started = time.perf_counter()
+        variant(desired)
+        return time.perf_counter() - started
+    finally:
+        process.terminate()
+        process.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds the stub takes per request")
+    parser.add_argument("--zones", type=int, default=10, help="zones the records are spread over")
+    args = parser.parse_args()
+    cfUpdater.rate_limiter = cfUpdater.RateLimiter(limit=10 ** 6)  # Measure the engine, not the rate limit
+
+    variants = [("sequential", sequential, 0),
+                ("concurrent", concurrent, 0),
+                ("concurrent+batch", concurrent, cfUpdater.DEFAULT_BATCH_SIZE)]
+    print(f"latency {args.latency * 1000:.0f} ms, {args.zones} zones, "
+          f"{cfUpdater.max_workers} workers, {cfUpdater.zone_concurrency} per zone")
+    print(f"{'records':>8}" + "".join(f"{name:>18}" for name, _, _ in variants))
+    for count in args.sizes:
+        times = [run(variant, count, args.zones, args.latency, batch) for _, variant, batch in variants]
+        print(f"{count:>8}" + "".join(f"{seconds:>17.2f}s" for seconds in times))
+
+
+if __name__ == "__main__":
+    main()
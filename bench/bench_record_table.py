@@ -0,0 +1,87 @@
+"""Load time and memory of a large JSON record table.
+
+Writes a table of --records records to a temporary file and measures the
+first load (read, validate and build RecordSpecs), a reload of the unchanged
+file (served from the mtime cache) and, for comparison, building the same
+records from comma-joined ZoneIDs/RecordNames fields.
+
+Usage:
+    python bench/bench_record_table.py [--records 10000] [--repeat 5]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cfUpdater  # noqa: E402
+
+
+def build_table(count: int) -> dict:
+    return {
+        "defaults": {"zone": "023e105f4ecef8ad9ca31a8372d0c353", "ttl": 300},
+        "records": [{"name": f"host{number}.example.com", "proxied": number % 2 == 0,
+                     **({"type": "A+AAAA"} if number % 10 == 0 else {})}
+                    for number in range(count)],
+    }
+
+
+def timed(func, repeat: int) -> float:
+    """Returns the median wall-clock time of `repeat` calls, in milliseconds."""
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - started) * 1000)
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    table = build_table(args.records)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "records.json")
+        with open(path, "w", encoding="utf-8") as tablefile:
+            json.dump(table, tablefile)
+
+        def first_load():
+            cfUpdater.record_tables.clear()
+            return cfUpdater.load_record_table(path)
+
+        records = first_load()
+        cold = timed(first_load, args.repeat)
+        warm = timed(lambda: cfUpdater.load_record_table(path), args.repeat)
+
+        cfUpdater.record_tables.clear()
+        tracemalloc.start()
+        first_load()
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+    names = ",".join(entry["name"] for entry in table["records"])
+    zone = table["defaults"]["zone"]
+
+    def legacy():
+        cfUpdater.legacy_record_specs.cache_clear()
+        return cfUpdater.legacy_record_specs(zone, names, "A")
+    fields = timed(legacy, args.repeat)
+
+    print(f"{len(table['records'])} table entries -> {len(records)} records")
+    print(f"first load            {cold:9.2f} ms")
+    print(f"unchanged reload      {warm:9.3f} ms")
+    print(f"comma-joined fields   {fields:9.2f} ms")
+    print(f"memory of the records {memory / len(records):9.0f} bytes per record")
+
+
+if __name__ == "__main__":
+    main()
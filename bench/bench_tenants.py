@@ -0,0 +1,89 @@
+"""Memory cost of each extra account served by the headless engine.
+
+Builds accounts the way run_daemon does (a Tenant configured from its
+settings, plus the account's requests.Session) and runs one cycle for them
+against a stub in a child process. A few warm-up accounts go first, so the
+connection pool, thread pools and metrics that every engine has are in place;
+then the memory traced by tracemalloc for N further accounts is reported per
+account: once idle, and once their cycles have filled the state journals, the
+record ID cache and the zone indexes. Each account has --records records in a
+zone of its own.
+
+Usage:
+    python bench/bench_tenants.py [--accounts 50] [--records 10]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "tests")]
+
+import cfUpdater  # noqa: E402
+from cloudflare_stub import make_zone, serve_in_subprocess  # noqa: E402
+
+PUBLIC_IP = "203.0.113.7"
+WARMUP_ACCOUNTS = 5
+
+
+def account(number: int, records: int) -> tuple[dict, list[cfUpdater.RecordSpec]]:
+    zone_id = f"zone{number:05d}"
+    names = [f"host{n}.{zone_id}.example" for n in range(records)]
+    settings = {'api_key': f"key{number}", 'email': f"user{number}@example.com", 'zone_ids': zone_id,
+                'record_names': ", ".join(names), 'record_type': "A", 'records_file': '',
+                'interval': 60.0, 'rate_limit': cfUpdater.DEFAULT_RATE_LIMIT}
+    return settings, cfUpdater.desired_records(settings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--accounts", type=int, default=50)
+    parser.add_argument("--records", type=int, default=10, help="records per account")
+    args = parser.parse_args()
+    total = WARMUP_ACCOUNTS + args.accounts
+    zones = {f"zone{number:05d}": make_zone(f"zone{number:05d}", args.records, domain=f"zone{number:05d}.example")
+             for number in range(total)}
+    accounts = [account(number, args.records) for number in range(total)]
+    cfUpdater.get_source_ip = lambda source, family=4: PUBLIC_IP  # Measure the accounts, not IP discovery
+    cfUpdater.print_status = lambda kind, value: None
+    process, api = serve_in_subprocess(zones)
+    try:
+        cfUpdater.CLOUDFLARE_API = api
+        with tempfile.TemporaryDirectory() as directory:
+            def add_tenants(numbers: range) -> list[cfUpdater.Tenant]:
+                tenants = []
+                for number in numbers:
+                    settings, records = accounts[number]
+                    tenant = cfUpdater.Tenant(f"account{number}", os.path.join(directory, f"{number}.journal"))
+                    tenant.configure(settings, records)
+                    cfUpdater.http_client.account_session(tenant.name)
+                    tenants.append(tenant)
+                return tenants
+
+            tracemalloc.start()
+            warmup = add_tenants(range(WARMUP_ACCOUNTS))
+            cfUpdater.run_due_tenants(warmup, threading.Event())
+            baseline = tracemalloc.take_snapshot()
+            tenants = add_tenants(range(WARMUP_ACCOUNTS, total))
+            idle = tracemalloc.take_snapshot()
+            cfUpdater.run_due_tenants(tenants, threading.Event())
+            cycled = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+    finally:
+        process.terminate()
+        process.join()
+
+    def per_account(snapshot) -> float:
+        return sum(stat.size_diff for stat in snapshot.compare_to(baseline, "filename")) / args.accounts
+
+    print(f"{args.accounts} accounts after {WARMUP_ACCOUNTS} warm-up accounts, {args.records} records each")
+    print(f"{'idle (tenant, scheduler, limiter, session)':48s} {per_account(idle) / 1024:8.1f} KiB per account")
+    print(f"{'after one cycle (state, ID cache, records)':48s} {per_account(cycled) / 1024:8.1f} KiB per account")
+
+
+if __name__ == "__main__":
+    main()
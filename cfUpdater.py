@@ -1,333 +1,3554 @@
 import requests
-import tkinter as tk
-from tkinter import messagebox, ttk  # Import ttk for themed widgets
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+try:
+    import httpx  # Optional: only needed for NetworkBackend = asyncio
+except ImportError:
+    httpx = None
+import argparse
+import asyncio
+import bisect
 import configparser
+import contextlib
+import ctypes
+import ctypes.util
+import datetime
+import email.utils
+import functools
+import hashlib
+import inspect
+import ipaddress
+import itertools
+import json
 import os
+import random
+import signal
+import socket
+import struct
+import sys
 import time
+import zlib
 import logging
+import math
+import queue
+import re
+import threading
+from collections import OrderedDict
+from urllib.parse import parse_qs, urlsplit
+from collections import deque
+from collections.abc import Iterator
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+# tkinter is imported by run_gui() only, so headless mode never loads it
+tk = ttk = messagebox = None
+
+# Path of the configuration file, overridable with --config
+config_path = 'config.ini'
+
+# Record table named by RecordsFile in config.ini; when set it replaces the record fields
+records_file = ''
 
 # Global variables for auto update scheduling
 auto_update_running = False
 auto_update_id = None
+update_in_progress = False
+update_scheduler = None
+
+# Update cycles run on a worker thread and hand results back to Tk through this queue
+ui_queue = queue.Queue()
+UI_POLL_MS = 100
+
+
+class QueueLogHandler(logging.Handler):
+    """Forwards logged errors to the result box via ui_queue, from any thread."""
+
+    def __init__(self, target: queue.Queue):
+        super().__init__(level=logging.ERROR)
+        self.target = target
+
+    def emit(self, record: logging.LogRecord):
+        self.target.put(("status", f"Error: {record.getMessage()}\n"))
+
+CLOUDFLARE_API = "https://api.cloudflare.com/client/v4"
+
+# Metrics in the Prometheus text format, served on MetricsPort (0 disables the endpoint)
+DEFAULT_METRICS_PORT = 0
+DEFAULT_METRICS_ADDRESS = "127.0.0.1"
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+CYCLE_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+class Counter:
+    """Monotonic counter, optionally split by label values."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self.values = {} if labelnames else {(): 0.0}  # label values -> count
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        with self._lock:
+            self.values[labels] = self.values.get(labels, 0.0) + amount
+
+    def samples(self) -> list[tuple[str, tuple, float]]:
+        with self._lock:
+            return [(self.name, labels, value) for labels, value in self.values.items()]
+
+
+class Histogram:
+    """Distribution of observed values over fixed buckets, optionally split by label values."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = REQUEST_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self.values = {}  # label values -> [count per bucket..., count above the last bucket, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        with self._lock:
+            entry = self.values.get(labels)
+            if entry is None:
+                entry = self.values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            entry[bisect.bisect_left(self.buckets, value)] += 1
+            entry[-1] += value
+
+    def samples(self) -> list[tuple[str, tuple, float]]:
+        samples = []
+        with self._lock:
+            for labels, entry in self.values.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets + (math.inf,), entry):
+                    cumulative += count
+                    le = "+Inf" if bound == math.inf else repr(float(bound))
+                    samples.append((f"{self.name}_bucket", labels + (le,), cumulative))
+                samples.append((f"{self.name}_sum", labels, entry[-1]))
+                samples.append((f"{self.name}_count", labels, cumulative))
+        return samples
+
+
+class MetricsRegistry:
+    """The set of metrics exposed by the metrics endpoint."""
+
+    def __init__(self):
+        self.metrics = []
+
+    def counter(self, name: str, help_text: str, labelnames: tuple[str, ...] = ()) -> Counter:
+        metric = Counter(name, help_text, labelnames)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, labelnames: tuple[str, ...] = (),
+                  buckets: tuple[float, ...] = REQUEST_BUCKETS) -> Histogram:
+        metric = Histogram(name, help_text, labelnames, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    @staticmethod
+    def _escape(value: str) -> str:
+        return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+    def render(self) -> str:
+        """Returns every metric in the Prometheus text exposition format."""
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            names = metric.labelnames + (("le",) if metric.kind == "histogram" else ())
+            for sample_name, labels, value in metric.samples():
+                label_text = ",".join(f'{name}="{self._escape(label)}"' for name, label in zip(names, labels))
+                value = int(value) if float(value).is_integer() else value
+                lines.append(f"{sample_name}{{{label_text}}} {value}" if label_text else f"{sample_name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+cycle_seconds = metrics.histogram("cfupdater_cycle_duration_seconds", "Duration of update cycles.",
+                                  ("outcome",), CYCLE_BUCKETS)
+request_seconds = metrics.histogram("cfupdater_request_duration_seconds", "Latency of single HTTP requests.",
+                                    ("endpoint", "method"))
+requests_total = metrics.counter("cfupdater_requests_total", "HTTP requests by response status.",
+                                 ("endpoint", "method", "status"))
+function_seconds = metrics.histogram("cfupdater_function_duration_seconds",
+                                     "Duration of network functions, including retries.", ("function",))
+records_total = metrics.counter("cfupdater_records_total", "Records checked, by result.", ("result",))
+ip_changes_total = metrics.counter("cfupdater_ip_changes_total", "Public IP changes seen by update cycles.")
+ip_events_total = metrics.counter("cfupdater_ip_events_total", "IP-change events from event sources.", ("source",))
+rate_limit_wait_seconds = metrics.histogram("cfupdater_rate_limit_wait_seconds",
+                                            "Time Cloudflare requests waited for the rate limiter.")
+rate_limited_total = metrics.counter("cfupdater_rate_limited_total", "429 responses from Cloudflare.")
+
+
+def instrumented(func):
+    """Decorator recording the duration of every call of a network function (or coroutine) in function_seconds."""
+    name = func.__qualname__
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                function_seconds.observe(time.perf_counter() - started, name)
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            function_seconds.observe(time.perf_counter() - started, name)
+    return wrapper
+
+
+def endpoint_label(url: str) -> str:
+    """Names the endpoint of a URL for metrics, with IDs replaced so the label set stays small.
+
+    Cloudflare calls become e.g. "cloudflare /zones/{id}/dns_records"; other
+    calls (IP providers) are labeled by host.
+    """
+    parts = urlsplit(url)
+    if not url.startswith(CLOUDFLARE_API):
+        return parts.netloc
+    path = parts.path[len(urlsplit(CLOUDFLARE_API).path):]
+    return "cloudflare " + re.sub(r"/[^/]*\d[^/]*", "/{id}", path)
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """Serves the metrics registry at /metrics."""
+
+    def do_GET(self):
+        if urlsplit(self.path).path != "/metrics":
+            self.send_error(404)
+            return
+        body = metrics.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Scrapes are not worth a log line
+
+
+metrics_server = None
+metrics_endpoint = None  # The (address, port) metrics_server was started for, as configured
+
+
+def start_metrics_server(port: int, address: str = DEFAULT_METRICS_ADDRESS) -> ThreadingHTTPServer | None:
+    """Starts, moves or stops the metrics endpoint to match the configuration.
+
+    Args:
+        port: TCP port to listen on; 0 stops the endpoint.
+        address: Address to bind; the default only accepts local connections.
+
+    Returns:
+        The running server, or None if the endpoint is disabled or could not be started.
+    """
+    global metrics_server, metrics_endpoint
+    # Compared as configured: the bound address differs for host names like localhost
+    if metrics_server is not None and metrics_endpoint == (address, port):
+        return metrics_server
+    if metrics_server is not None:
+        metrics_server.shutdown()
+        metrics_server.server_close()
+        metrics_server = metrics_endpoint = None
+    if port:
+        try:
+            metrics_server = ThreadingHTTPServer((address, port), MetricsHandler)
+        except OSError as e:
+            logging.error(f"Cannot serve metrics on {address}:{port}: {e}")
+            return None
+        metrics_server.daemon_threads = True
+        metrics_endpoint = (address, port)
+        threading.Thread(target=metrics_server.serve_forever, daemon=True).start()
+    return metrics_server
+
+# Cloudflare allows 1200 requests per 5 minutes per user, overridable via RateLimit in config.ini
+DEFAULT_RATE_LIMIT = 1200
+RATE_LIMIT_PERIOD = 300
+DEFAULT_RETRY_AFTER = 60
+MAX_RATE_LIMITED_RETRIES = 3
+
+
+class RateLimiter:
+    """Token bucket that paces every Cloudflare request of an account.
+
+    The bucket holds up to `limit` tokens and refills at limit/period per
+    second, so one budget is shared by all zones. Writes take priority: while a
+    write is waiting, reads are held back. A 429 pauses the whole bucket for the
+    server's Retry-After.
+    """
+
+    def __init__(self, limit: int = DEFAULT_RATE_LIMIT, period: float = RATE_LIMIT_PERIOD, clock=time.monotonic):
+        self.limit = limit
+        self.rate = limit / period
+        self.clock = clock
+        self.tokens = float(limit)
+        self.updated = clock()
+        self.paused_until = 0.0
+        self.waiting_writes = 0
+        self._cond = threading.Condition()
+
+    def _refill(self, now: float):
+        self.tokens = min(float(self.limit), self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, write: bool = False, timeout: float | None = None) -> float:
+        """Blocks until the request may be sent.
+
+        Args:
+            write: Whether the request modifies records; writes jump ahead of waiting reads.
+            timeout: Seconds the caller may wait at most, e.g. what is left of the
+                update cycle; None waits as long as needed.
+
+        Returns:
+            The number of seconds spent waiting.
+
+        Raises:
+            DeadlineExceeded: If the request cannot be sent within `timeout`.
+        """
+        started = self.clock()
+        deadline = None if timeout is None else started + timeout
+        with self._cond:
+            if write:
+                self.waiting_writes += 1
+            try:
+                while True:
+                    now = self.clock()
+                    self._refill(now)
+                    if now >= self.paused_until and self.tokens >= 1 and (write or not self.waiting_writes):
+                        self.tokens -= 1
+                        return now - started
+                    if now < self.paused_until:
+                        delay = self.paused_until - now
+                    elif self.tokens < 1:
+                        delay = (1 - self.tokens) / self.rate
+                    else:
+                        delay = None  # Held back for a write; woken up when it is sent
+                    if deadline is not None:
+                        if now >= deadline or (delay is not None and now + delay > deadline):
+                            raise DeadlineExceeded("Update cycle deadline exceeded while waiting for the rate limit")
+                        if delay is None:
+                            delay = deadline - now
+                    self._cond.wait(delay)
+            finally:
+                if write:
+                    self.waiting_writes -= 1
+                    self._cond.notify_all()
+
+    @contextlib.contextmanager
+    def queued_write(self):
+        """Holds reads back while a coroutine waits to send a write, as acquire does for a waiting thread."""
+        with self._cond:
+            self.waiting_writes += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self.waiting_writes -= 1
+                self._cond.notify_all()
+
+    def reserve(self, write: bool = False, timeout: float | None = None) -> float:
+        """Takes a token without blocking, for coroutines that wait on the event loop instead.
+
+        Args:
+            write: Whether the request modifies records.
+            timeout: Seconds the caller may still wait, e.g. what is left of the update cycle; None for no limit.
+
+        Returns:
+            0 if the request may be sent now, otherwise the seconds to wait before asking again.
+
+        Raises:
+            DeadlineExceeded: If the wait would exceed `timeout`.
+        """
+        with self._cond:
+            now = self.clock()
+            self._refill(now)
+            if now < self.paused_until:
+                delay = self.paused_until - now
+            elif self.tokens >= 1 and (write or not self.waiting_writes):
+                self.tokens -= 1
+                return 0.0
+            else:
+                delay = max(1 - self.tokens, 1) / self.rate
+        if timeout is not None and delay > timeout:
+            raise DeadlineExceeded("Update cycle deadline exceeded while waiting for the rate limit")
+        return delay
+
+    def pause(self, seconds: float):
+        """Stops handing out tokens for the given number of seconds (e.g. after a 429)."""
+        with self._cond:
+            self.paused_until = max(self.paused_until, self.clock() + seconds)
+            self.tokens = min(self.tokens, 0.0)
+
+
+def parse_retry_after(value: str | None) -> float:
+    """Converts a Retry-After header (seconds or an HTTP date) into seconds to wait."""
+    if not value:
+        return DEFAULT_RETRY_AFTER
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return DEFAULT_RETRY_AFTER
+
+
+rate_limiter = RateLimiter()
+
+
+def configure_rate_limiter(limit: int = DEFAULT_RATE_LIMIT) -> RateLimiter:
+    """Replaces the shared rate limiter if the limit changed.
+
+    Args:
+        limit: Requests allowed per RATE_LIMIT_PERIOD seconds.
+
+    Returns:
+        The shared rate limiter.
+    """
+    global rate_limiter
+    if rate_limiter.limit != limit:
+        rate_limiter = RateLimiter(limit)
+    return rate_limiter
+
+
+# Defaults for the shared HTTP client, overridable via PoolSize/Retries/CycleDeadline in config.ini
+DEFAULT_POOL_SIZE = 10
+DEFAULT_RETRIES = 3
+REQUEST_TIMEOUT = 10
+DEFAULT_CYCLE_DEADLINE = 120
+
+# Methods that may be resent after a failure that could have reached the server
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "PUT", "PATCH", "DELETE"})
+RETRYABLE_STATUS = frozenset({500, 502, 503, 504})
+
+# Monotonic time by which the running update cycle must finish; None outside a cycle
+cycle_deadline = None
+cycle_deadline_seconds = DEFAULT_CYCLE_DEADLINE
+
+
+class DeadlineExceeded(requests.exceptions.Timeout):
+    """Raised instead of sending a request once the cycle deadline has passed."""
+
+
+class ConnectFailed(requests.exceptions.ConnectionError):
+    """Raised by the asyncio backend when no connection could be established, so the server never saw the request."""
+
+
+class RetryPolicy:
+    """Capped exponential backoff with full jitter.
+
+    The n-th retry waits a random time between 0 and min(cap, base * 2**n), so
+    many workers failing at once do not retry in lockstep.
+    """
+
+    def __init__(self, retries: int = DEFAULT_RETRIES, base: float = 0.5, cap: float = 8.0, rng=random.random):
+        self.retries = retries
+        self.base = base
+        self.cap = cap
+        self.rng = rng
+
+    def backoff(self, attempt: int) -> float:
+        """Returns the delay before retry number `attempt` (0-based)."""
+        return self.rng() * min(self.cap, self.base * 2 ** attempt)
+
+    @staticmethod
+    def can_retry(method: str, idempotent: bool | None, error: Exception | None) -> bool:
+        """Decides whether a failed call may be sent again.
+
+        Idempotent calls (by method, or marked idempotent by the caller) are
+        retried after any transient failure. Other calls are only retried if the
+        connection was never established, so the server cannot have acted on them.
+        """
+        if idempotent if idempotent is not None else method in IDEMPOTENT_METHODS:
+            return True
+        if isinstance(error, (requests.exceptions.ConnectTimeout, ConnectFailed)):
+            return True
+        reason = getattr(error.args[0], 'reason', None) if error is not None and error.args else None
+        return isinstance(reason, NewConnectionError)
+
+
+def remaining_cycle_time() -> float | None:
+    """Returns the seconds left before the cycle deadline, or None outside a cycle."""
+    return None if cycle_deadline is None else cycle_deadline - time.monotonic()
+
+
+# Local addresses that pin an outgoing connection to one address family
+FAMILY_SOURCE_ADDRESSES = {4: ("0.0.0.0", 0), 6: ("::", 0)}
+
+
+class SourceAddressAdapter(HTTPAdapter):
+    """HTTPAdapter that binds its connections to a local source address.
+
+    Binding to the IPv4 or IPv6 wildcard address means only the target's
+    addresses of that family can connect, so an IP lookup service reports the
+    public address of that family.
+    """
+
+    def __init__(self, source_address: tuple[str, int], **kwargs):
+        self.source_address = source_address
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs['source_address'] = self.source_address
+        super().init_poolmanager(*args, **kwargs)
+
+
+class HttpClient:
+    """Keep-alive HTTP client shared by every Cloudflare and IP lookup call.
+
+    A single requests.Session is reused so connections to api.cloudflare.com
+    and the IP lookup service are pooled instead of re-handshaking per call;
+    IP lookups pinned to IPv4 or IPv6 get a session of their own per family.
+    Each Cloudflare account of the headless engine gets a session of its own
+    (cookies and headers stay separate) that draws from the same connection pool.
+    Transient failures are retried according to a RetryPolicy, within the
+    deadline of the running update cycle.
+    """
+
+    def __init__(self, pool_size: int = DEFAULT_POOL_SIZE, retries: int = DEFAULT_RETRIES,
+                 timeout: float = REQUEST_TIMEOUT):
+        """Creates the session and mounts the pooled adapters.
+
+        Args:
+            pool_size: Maximum number of kept-alive connections per host.
+            retries: Number of retries for transient failures.
+            timeout: Default timeout in seconds for each request.
+        """
+        self.pool_size = pool_size
+        self.retries = retries
+        self.timeout = timeout
+        self.retry_policy = RetryPolicy(retries)
+        self.session = self._new_session(HTTPAdapter)
+        self.family_sessions = {}  # Address family -> session pinned to it, created on first use
+        self.account_sessions = {}  # Account name -> session sharing the pooled adapters, created on first use
+        self.account = None  # Account whose session unpinned requests use; None for the shared session
+        self._lock = threading.Lock()
+
+    def _new_session(self, adapter_class, **adapter_args) -> requests.Session:
+        session = requests.Session()
+        # Retries are handled by request() so they follow the idempotency rules and the cycle deadline
+        adapter = adapter_class(pool_connections=self.pool_size, pool_maxsize=self.pool_size, max_retries=0,
+                                **adapter_args)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def session_for(self, family: int | None) -> requests.Session:
+        """Returns the active account's session, or the one pinned to an address family (4 or 6)."""
+        if family is None:
+            return self.session if self.account is None else self.account_session(self.account)
+        with self._lock:
+            if family not in self.family_sessions:
+                self.family_sessions[family] = self._new_session(
+                    SourceAddressAdapter, source_address=FAMILY_SOURCE_ADDRESSES[family])
+            return self.family_sessions[family]
+
+    def account_session(self, name: str) -> requests.Session:
+        """Returns the session of an account, mounting the shared adapters on first use."""
+        with self._lock:
+            if name not in self.account_sessions:
+                session = requests.Session()
+                for prefix, adapter in self.session.adapters.items():
+                    session.mount(prefix, adapter)
+                self.account_sessions[name] = session
+            return self.account_sessions[name]
+
+    def forget_account(self, name: str):
+        """Drops the session of an account that is no longer configured (its adapters stay open)."""
+        with self._lock:
+            self.account_sessions.pop(name, None)
+
+    def request(self, method: str, url: str, retry: bool = True, idempotent: bool | None = None,
+                **kwargs) -> requests.Response:
+        """Sends a request over the pooled session, retrying transient failures.
+
+        Connection errors, timeouts and 5xx responses are retried with backoff
+        as long as RetryPolicy.can_retry allows it and the cycle deadline leaves
+        time for another attempt. Each attempt's timeout is clipped to that deadline.
+
+        Args:
+            method: The HTTP method.
+            url: The URL.
+            retry: Whether transient failures may be retried at all.
+            idempotent: Overrides the method-based idempotency rule for this call.
+            **kwargs: Passed on to requests, except `family` (4 or 6), which pins
+                the connection to that address family.
+
+        Raises:
+            requests.exceptions.RequestException: If the last attempt failed.
+        """
+        timeout = kwargs.pop("timeout", self.timeout)
+        attempt = 0
+        while True:
+            remaining = remaining_cycle_time()
+            if remaining is not None and remaining <= 0:
+                raise DeadlineExceeded(f"Update cycle deadline exceeded before {method} {url}")
+            attempt_timeout = timeout if remaining is None else min(timeout, remaining)
+
+            error = None
+            try:
+                response = self._send(method, url, timeout=attempt_timeout, **kwargs)
+                if response.status_code not in RETRYABLE_STATUS:
+                    return response
+            except DeadlineExceeded:
+                raise  # Retrying cannot help once the cycle is out of time
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                error = e
+
+            delay = self.retry_policy.backoff(attempt)
+            remaining = remaining_cycle_time()
+            out_of_time = remaining is not None and remaining <= delay
+            if not retry or attempt >= self.retry_policy.retries or out_of_time or \
+                    not RetryPolicy.can_retry(method, idempotent, error):
+                if error is not None:
+                    raise error
+                return response
+            attempt += 1
+            time.sleep(delay)
+
+    def _send(self, method: str, url: str, **kwargs) -> requests.Response:
+        """Sends one attempt; Cloudflare calls are paced by the shared rate limiter.
+
+        A 429 pauses the limiter for the server's Retry-After and the call is
+        sent again. A wait for the limiter that would overrun the cycle deadline
+        raises DeadlineExceeded instead.
+        """
+        session = self.session_for(kwargs.pop("family", None))
+        if not url.startswith(CLOUDFLARE_API):
+            return self._timed(session, method, url, **kwargs)
+
+        for _ in range(MAX_RATE_LIMITED_RETRIES):
+            waited = rate_limiter.acquire(write=method != "GET", timeout=remaining_cycle_time())
+            rate_limit_wait_seconds.observe(waited)
+            response = self._timed(session, method, url, **kwargs)
+            if response.status_code != 429:
+                return response
+            rate_limited_total.inc()
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            remaining = remaining_cycle_time()
+            if remaining is not None and retry_after >= remaining:
+                break  # Waiting would overrun the cycle; report the 429
+            logging.error(f"Rate limited by Cloudflare, pausing requests for {retry_after:.0f} s")
+            rate_limiter.pause(retry_after)
+        return response
+
+    @staticmethod
+    def _timed(session: requests.Session, method: str, url: str, **kwargs) -> requests.Response:
+        """Sends one request, recording its latency and status in the metrics."""
+        endpoint = endpoint_label(url)
+        started = time.perf_counter()
+        status = "error"
+        try:
+            response = session.request(method, url, **kwargs)
+            status = str(response.status_code)
+            return response
+        finally:
+            request_seconds.observe(time.perf_counter() - started, endpoint, method)
+            requests_total.inc(endpoint, method, status)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def put(self, url: str, **kwargs) -> requests.Response:
+        return self.request("PUT", url, **kwargs)
+
+    def patch(self, url: str, **kwargs) -> requests.Response:
+        return self.request("PATCH", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def close(self):
+        """Closes all pooled connections."""
+        self.session.close()
+        for session in self.family_sessions.values():
+            session.close()
+
+
+http_client = HttpClient()
+
+
+def configure_http_client(pool_size: int = DEFAULT_POOL_SIZE, retries: int = DEFAULT_RETRIES) -> HttpClient:
+    """Replaces the shared HTTP client with one using the given pool settings.
+
+    The current client, and its warm connections, is kept if the settings are unchanged.
+
+    Args:
+        pool_size: Maximum number of kept-alive connections per host.
+        retries: Number of retries for transient failures.
+
+    Returns:
+        The shared client.
+    """
+    global http_client
+    if (http_client.pool_size, http_client.retries) == (pool_size, retries):
+        return http_client
+    http_client.close()
+    http_client = HttpClient(pool_size, retries)
+    return http_client
+
+
+# Cloudflare calls run on a thread pool, or as coroutines over HTTP/2 with NetworkBackend = asyncio (needs httpx)
+NETWORK_BACKENDS = ("threads", "asyncio")
+DEFAULT_NETWORK_BACKEND = "threads"
+ASYNC_CONNECTIONS = 2  # HTTP/2 connections to api.cloudflare.com; each multiplexes many requests
+ASYNC_STREAMS = 100  # Requests in flight at once, within the usual HTTP/2 stream limit of one connection
+
+
+class AsyncResponse:
+    """Wraps an httpx response in the parts of the requests.Response interface the API functions use."""
+
+    __slots__ = ('response',)
+
+    def __init__(self, response):
+        self.response = response
+
+    @property
+    def status_code(self) -> int:
+        return self.response.status_code
+
+    @property
+    def headers(self):
+        return self.response.headers
+
+    @property
+    def ok(self) -> bool:
+        return self.response.status_code < 400
+
+    def json(self):
+        try:
+            return self.response.json()
+        except ValueError as e:
+            raise requests.exceptions.RequestException(f"Invalid JSON in response: {e}") from e
+
+    def raise_for_status(self):
+        if not self.ok:
+            raise requests.exceptions.HTTPError(
+                f"{self.status_code} {self.response.reason_phrase} for url: {self.response.url}")
+
+
+class AsyncHttpClient:
+    """asyncio counterpart of HttpClient for Cloudflare calls.
+
+    An event loop on a background thread drives one httpx.AsyncClient, which
+    multiplexes all requests over a few HTTP/2 connections, so hundreds of
+    record calls can be in flight without a thread each. Retries, the cycle
+    deadline and the shared rate limiter work as in HttpClient, and httpx
+    errors are raised as their requests counterparts so the API coroutines
+    handle them like the threaded functions do. Threads hand coroutines to the
+    loop with submit() or run().
+    """
+
+    def __init__(self, connections: int = ASYNC_CONNECTIONS, streams: int = ASYNC_STREAMS,
+                 retries: int = DEFAULT_RETRIES, timeout: float = REQUEST_TIMEOUT):
+        """Starts the event loop thread and opens the client.
+
+        Args:
+            connections: Maximum number of connections (per host) to multiplex requests over.
+            streams: Maximum number of requests in flight; further requests wait for a free slot.
+            retries: Number of retries for transient failures.
+            timeout: Default timeout in seconds for each request.
+        """
+        self.connections = connections
+        self.streams = streams
+        self.retries = retries
+        self.timeout = timeout
+        self.retry_policy = RetryPolicy(retries)
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="cfupdater-asyncio", daemon=True)
+        self.thread.start()
+        self.client = self.run(self._open())
+
+    async def _open(self):
+        # Created on the loop so the semaphore belongs to it
+        self.slots = asyncio.Semaphore(self.streams)
+        limits = httpx.Limits(max_connections=self.connections, max_keepalive_connections=self.connections)
+        try:
+            return httpx.AsyncClient(http2=True, limits=limits)
+        except ImportError:
+            # Without the h2 package httpx speaks HTTP/1.1, one request per connection at a time
+            logging.error("HTTP/2 needs the h2 package (pip install httpx[http2]); using HTTP/1.1")
+            self.slots = asyncio.Semaphore(DEFAULT_POOL_SIZE)
+            limits = httpx.Limits(max_connections=DEFAULT_POOL_SIZE, max_keepalive_connections=DEFAULT_POOL_SIZE)
+            return httpx.AsyncClient(limits=limits)
+
+    def submit(self, coroutine) -> Future:
+        """Schedules a coroutine on the event loop and returns a concurrent.futures.Future for its result."""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def run(self, coroutine):
+        """Runs a coroutine on the event loop and blocks the calling thread until it returns."""
+        return self.submit(coroutine).result()
+
+    async def request(self, method: str, url: str, retry: bool = True, idempotent: bool | None = None,
+                      **kwargs) -> AsyncResponse:
+        """Sends a request, retrying transient failures like HttpClient.request.
+
+        Args:
+            method: The HTTP method.
+            url: The URL.
+            retry: Whether transient failures may be retried at all.
+            idempotent: Overrides the method-based idempotency rule for this call.
+            **kwargs: Passed on to httpx.
+
+        Raises:
+            requests.exceptions.RequestException: If the last attempt failed.
+        """
+        timeout = kwargs.pop("timeout", self.timeout)
+        attempt = 0
+        while True:
+            remaining = remaining_cycle_time()
+            if remaining is not None and remaining <= 0:
+                raise DeadlineExceeded(f"Update cycle deadline exceeded before {method} {url}")
+            attempt_timeout = timeout if remaining is None else min(timeout, remaining)
+
+            error = None
+            try:
+                response = await self._send(method, url, timeout=attempt_timeout, **kwargs)
+                if response.status_code not in RETRYABLE_STATUS:
+                    return response
+            except DeadlineExceeded:
+                raise  # Retrying cannot help once the cycle is out of time
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                error = e
+
+            delay = self.retry_policy.backoff(attempt)
+            remaining = remaining_cycle_time()
+            out_of_time = remaining is not None and remaining <= delay
+            if not retry or attempt >= self.retry_policy.retries or out_of_time or \
+                    not RetryPolicy.can_retry(method, idempotent, error):
+                if error is not None:
+                    raise error
+                return response
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    async def _send(self, method: str, url: str, **kwargs) -> AsyncResponse:
+        """Sends one attempt paced by the shared rate limiter; a 429 pauses it and the call is sent again.
+
+        A write registers with the limiter while it waits, so reads are held back as for threaded writes.
+        """
+        limiter = rate_limiter
+        write = method != "GET"
+        for _ in range(MAX_RATE_LIMITED_RETRIES):
+            waited = 0.0
+            with limiter.queued_write() if write else contextlib.nullcontext():
+                while (delay := limiter.reserve(write=write, timeout=remaining_cycle_time())) > 0:
+                    waited += delay
+                    await asyncio.sleep(delay)
+            rate_limit_wait_seconds.observe(waited)
+            response = await self._timed(method, url, **kwargs)
+            if response.status_code != 429:
+                return response
+            rate_limited_total.inc()
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            remaining = remaining_cycle_time()
+            if remaining is not None and retry_after >= remaining:
+                break  # Waiting would overrun the cycle; report the 429
+            logging.error(f"Rate limited by Cloudflare, pausing requests for {retry_after:.0f} s")
+            limiter.pause(retry_after)
+        return response
+
+    async def _timed(self, method: str, url: str, timeout: float, **kwargs) -> AsyncResponse:
+        """Sends one request once a slot is free, recording its latency and status in the metrics.
+
+        The timeout covers the request itself; waiting for a slot or a pooled connection is not counted.
+        """
+        async with self.slots:
+            return await self._timed_request(method, url, httpx.Timeout(timeout, pool=None), **kwargs)
+
+    async def _timed_request(self, method: str, url: str, timeout, **kwargs) -> AsyncResponse:
+        endpoint = endpoint_label(url)
+        started = time.perf_counter()
+        status = "error"
+        try:
+            response = AsyncResponse(await self.client.request(method, url, timeout=timeout, **kwargs))
+            status = str(response.status_code)
+            return response
+        except httpx.ConnectTimeout as e:
+            raise requests.exceptions.ConnectTimeout(f"{method} {url}: {e!r}") from e
+        except httpx.TimeoutException as e:
+            raise requests.exceptions.Timeout(f"{method} {url}: {e!r}") from e
+        except httpx.ConnectError as e:
+            raise ConnectFailed(f"{method} {url}: {e!r}") from e
+        except httpx.TransportError as e:
+            raise requests.exceptions.ConnectionError(f"{method} {url}: {e!r}") from e
+        finally:
+            request_seconds.observe(time.perf_counter() - started, endpoint, method)
+            requests_total.inc(endpoint, method, status)
+
+    async def get(self, url: str, **kwargs) -> AsyncResponse:
+        return await self.request("GET", url, **kwargs)
+
+    async def patch(self, url: str, **kwargs) -> AsyncResponse:
+        return await self.request("PATCH", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> AsyncResponse:
+        return await self.request("POST", url, **kwargs)
+
+    def close(self):
+        """Closes the connections and stops the event loop."""
+        self.run(self.client.aclose())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+
+# The asyncio backend's client while NetworkBackend = asyncio; None selects the thread pool
+async_client = None
+pending_network_backend = None  # (backend, retries) requested while a cycle was running
+
+
+def configure_network_backend(backend: str = DEFAULT_NETWORK_BACKEND,
+                              retries: int = DEFAULT_RETRIES) -> AsyncHttpClient | None:
+    """Selects the backend for Cloudflare calls, starting or stopping the asyncio client as needed.
+
+    While a GUI update cycle is running the change is only recorded, because
+    closing the asyncio client would strand the cycle's coroutines; it is
+    applied by apply_pending_network_backend once the cycle has finished.
+
+    Args:
+        backend: One of NETWORK_BACKENDS. "asyncio" falls back to "threads" if httpx is not installed.
+        retries: Number of retries for transient failures.
+
+    Returns:
+        The asyncio client, or None if the thread pool backend is selected
+        (the client in use until the cycle ends if the change was deferred).
+
+    Raises:
+        ValueError: If the backend name is unknown.
+    """
+    global async_client, pending_network_backend
+    backend = backend.strip().lower()
+    if backend not in NETWORK_BACKENDS:
+        raise ValueError(f"NetworkBackend must be one of {', '.join(NETWORK_BACKENDS)}, not {backend!r}")
+    if backend == "asyncio" and httpx is None:
+        logging.error("NetworkBackend = asyncio needs the httpx package (pip install httpx[http2]); using threads")
+        backend = "threads"
+    if update_in_progress:
+        pending_network_backend = (backend, retries)
+        return async_client
+    pending_network_backend = None
+    if async_client is not None and (backend == "threads" or async_client.retries != retries):
+        async_client.close()
+        async_client = None
+    if backend == "asyncio" and async_client is None:
+        async_client = AsyncHttpClient(retries=retries)
+    return async_client
+
+
+def apply_pending_network_backend():
+    """Applies a backend change that configure_network_backend deferred while a cycle was running."""
+    if pending_network_backend is not None and not update_in_progress:
+        configure_network_backend(*pending_network_backend)
+
+# DNS record types and classes understood by the dns:// IP provider backend
+DNS_TYPES = {'A': 1, 'TXT': 16, 'AAAA': 28}
+DNS_CLASSES = {'IN': 1, 'CH': 3}
+
+
+def build_dns_query(name: str, qtype: int, qclass: int = DNS_CLASSES['IN']) -> tuple[int, bytes]:
+    """Builds a single-question DNS query packet.
+
+    Args:
+        name: The name to query, e.g. myip.opendns.com.
+        qtype: The numeric record type.
+        qclass: The numeric record class.
+
+    Returns:
+        The transaction ID and the packet.
+    """
+    txid = random.getrandbits(16)
+    header = struct.pack('!HHHHHH', txid, 0x0100, 1, 0, 0, 0)  # Recursion desired, one question
+    qname = b''.join(bytes([len(label)]) + label.encode('ascii') for label in name.strip('.').split('.')) + b'\0'
+    return txid, header + qname + struct.pack('!HH', qtype, qclass)
+
+
+def _skip_dns_name(packet: bytes, offset: int) -> int:
+    """Returns the offset just past the (possibly compressed) name starting at offset."""
+    while True:
+        length = packet[offset]
+        if length & 0xC0 == 0xC0:  # Compression pointer ends the name
+            return offset + 2
+        offset += 1 + length
+        if length == 0:
+            return offset
+
+
+def parse_dns_response(packet: bytes, txid: int, qtype: int) -> list[str]:
+    """Extracts the answers of the given type from a DNS response.
+
+    Args:
+        packet: The raw response.
+        txid: The transaction ID of the query.
+        qtype: The numeric record type that was asked for.
+
+    Returns:
+        The A/AAAA addresses or the first string of each TXT record.
+
+    Raises:
+        ValueError: If the packet is malformed, truncated, an error response or for another query.
+    """
+    try:
+        rid, flags, qdcount, ancount = struct.unpack_from('!HHHH', packet)
+        if rid != txid or not flags & 0x8000:
+            raise ValueError("response does not match the query")
+        if flags & 0x0200:
+            raise ValueError("response is truncated")
+        if flags & 0x000F:
+            raise ValueError(f"server returned rcode {flags & 0x000F}")
+
+        offset = 12
+        for _ in range(qdcount):
+            offset = _skip_dns_name(packet, offset) + 4
+        answers = []
+        for _ in range(ancount):
+            offset = _skip_dns_name(packet, offset)
+            rtype, _rclass, _ttl, rdlength = struct.unpack_from('!HHIH', packet, offset)
+            offset += 10
+            rdata = packet[offset:offset + rdlength]
+            offset += rdlength
+            if rtype != qtype or len(rdata) != rdlength:
+                continue
+            if rtype == DNS_TYPES['A'] and rdlength == 4:
+                answers.append(socket.inet_ntop(socket.AF_INET, rdata))
+            elif rtype == DNS_TYPES['AAAA'] and rdlength == 16:
+                answers.append(socket.inet_ntop(socket.AF_INET6, rdata))
+            elif rtype == DNS_TYPES['TXT'] and rdata:
+                answers.append(rdata[1:1 + rdata[0]].decode('ascii', 'replace'))
+        return answers
+    except (struct.error, IndexError) as e:
+        raise ValueError(f"malformed DNS response: {e}") from e
+
+
+@instrumented
+def query_dns_provider(provider: str, timeout: float, family: int | None = None) -> str:
+    """Finds the public IP with a single UDP query to a whoami-style DNS service.
+
+    The provider is written as dns://resolver[:port]/name[?type=A|AAAA|TXT&class=IN|CH],
+    e.g. dns://208.67.222.222/myip.opendns.com or
+    dns://1.1.1.1/whoami.cloudflare?type=TXT&class=CH.
+
+    Args:
+        provider: The provider spec.
+        timeout: Seconds to wait for the answer.
+        family: Reach the resolver over this address family only (4 or 6).
+
+    Returns:
+        The answer as text; validated as an IP address by the caller.
+
+    Raises:
+        OSError: If the query could not be sent or timed out.
+        ValueError: If the spec or the response is invalid.
+    """
+    spec = urlsplit(provider)
+    options = {key.upper(): values[0].upper() for key, values in parse_qs(spec.query).items()}
+    qtype = DNS_TYPES[options.get('TYPE', 'A')]
+    qclass = DNS_CLASSES[options.get('CLASS', 'IN')]
+    name = spec.path.strip('/')
+    if not spec.hostname or not name:
+        raise ValueError(f"invalid DNS provider {provider}")
+
+    socket_family = {4: socket.AF_INET, 6: socket.AF_INET6}.get(family, socket.AF_UNSPEC)
+    socket_family, _, _, _, address = socket.getaddrinfo(spec.hostname, spec.port or 53, socket_family,
+                                                         socket.SOCK_DGRAM)[0]
+    txid, query = build_dns_query(name, qtype, qclass)
+    with socket.socket(socket_family, socket.SOCK_DGRAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(address)  # Only accept datagrams from the resolver we asked
+        sock.send(query)
+        deadline = time.monotonic() + timeout
+        while True:
+            packet = sock.recv(4096)
+            if packet[:2] == query[:2]:
+                break
+            # A stray reply to another query; an error answer to ours is final, so only these are skipped
+            sock.settimeout(max(deadline - time.monotonic(), 0.001))
+    answers = parse_dns_response(packet, txid, qtype)
+    if not answers:
+        raise ValueError(f"{provider} returned no {options.get('TYPE', 'A')} answer")
+    return answers[0]
+
+
+# Linux rtnetlink constants used by the local:// IP provider backend
+RTM_NEWADDR = 20
+RTM_DELADDR = 21
+RTM_GETADDR = 22
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+NLM_F_REQUEST = 0x1
+NLM_F_DUMP = 0x300
+IFA_ADDRESS = 1
+IFA_LOCAL = 2
+IFA_LABEL = 3
+RTMGRP_IPV4_IFADDR = 0x10
+RTMGRP_IPV6_IFADDR = 0x100
+
+
+def _parse_ifaddr_messages(data: bytes) -> tuple[list[tuple[str, str]], bool]:
+    """Parses a buffer of rtnetlink address messages.
+
+    Returns:
+        The (interface, address) pairs of the RTM_NEWADDR messages, and whether
+        the buffer ended the dump (NLMSG_DONE).
+
+    Raises:
+        OSError: If the kernel reported an error.
+    """
+    entries = []
+    offset = 0
+    while offset + 16 <= len(data):
+        length, msg_type, _flags, _seq, _pid = struct.unpack_from('=LHHLL', data, offset)
+        if length < 16:
+            break
+        if msg_type == NLMSG_DONE:
+            return entries, True
+        if msg_type == NLMSG_ERROR:
+            errno, = struct.unpack_from('=i', data, offset + 16)
+            if errno:
+                raise OSError(-errno, os.strerror(-errno))
+        elif msg_type == RTM_NEWADDR:
+            family, _prefixlen, _flags, _scope, index = struct.unpack_from('=BBBBI', data, offset + 16)
+            attrs = {}
+            attr_offset = offset + 24
+            while attr_offset + 4 <= offset + length:
+                attr_len, attr_type = struct.unpack_from('=HH', data, attr_offset)
+                if attr_len < 4:
+                    break
+                attrs[attr_type] = data[attr_offset + 4:attr_offset + attr_len]
+                attr_offset += (attr_len + 3) & ~3
+            raw = attrs.get(IFA_LOCAL) or attrs.get(IFA_ADDRESS)  # IFA_ADDRESS is the peer on point-to-point links
+            if raw and family in (socket.AF_INET, socket.AF_INET6):
+                if IFA_LABEL in attrs:
+                    name = attrs[IFA_LABEL].split(b'\0', 1)[0].decode()
+                else:
+                    try:
+                        name = socket.if_indextoname(index)
+                    except OSError:
+                        name = str(index)
+                entries.append((name, socket.inet_ntop(family, raw)))
+        offset += (length + 3) & ~3
+    return entries, False
+
+
+def read_interface_addresses() -> list[tuple[str, str]]:
+    """Lists the addresses bound to this host's interfaces.
+
+    Uses an rtnetlink dump on Linux; elsewhere falls back to resolving the host
+    name, which yields addresses without interface names.
+
+    Returns:
+        (interface, address) pairs.
+    """
+    if not hasattr(socket, 'AF_NETLINK'):
+        infos = socket.getaddrinfo(socket.gethostname(), None, proto=socket.IPPROTO_TCP)
+        return [('', info[4][0]) for info in infos]
+
+    with socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE) as sock:
+        sock.settimeout(REQUEST_TIMEOUT)
+        request = struct.pack('=LHHLL', 24, RTM_GETADDR, NLM_F_REQUEST | NLM_F_DUMP, 1, 0)
+        sock.send(request + struct.pack('=BBBBI', socket.AF_UNSPEC, 0, 0, 0, 0))
+        entries = []
+        while True:
+            batch, done = _parse_ifaddr_messages(sock.recv(65536))
+            entries.extend(batch)
+            if done:
+                return entries
+
+
+def pick_public_addresses(table: list[tuple[str, str]], interface: str | None = None,
+                          version: int | None = None) -> list[str]:
+    """Picks the globally routable addresses out of an interface table.
+
+    Private (RFC 1918), unique-local (ULA), link-local, loopback and CGNAT
+    addresses are skipped.
+
+    Args:
+        table: (interface, address) pairs as returned by read_interface_addresses.
+        interface: Only consider this interface.
+        version: Only consider this IP version (4 or 6).
+
+    Returns:
+        The public addresses, in table order.
+    """
+    public = []
+    for name, address in table:
+        if interface and name != interface:
+            continue
+        try:
+            ip = ipaddress.ip_address(address.split('%', 1)[0])
+        except ValueError:
+            continue
+        if (version is None or ip.version == version) and ip.is_global:
+            public.append(str(ip))
+    return public
+
+
+@instrumented
+def query_local_provider(provider: str, family: int | None = None) -> str:
+    """Reads the public IP from the host's own interfaces, with no network traffic.
+
+    The provider is written as local://[interface][?family=4|6]; the family
+    defaults to the `family` argument, or 4.
+
+    Args:
+        provider: The provider spec.
+        family: The address family to use if the spec names none.
+
+    Returns:
+        The first public address found.
+
+    Raises:
+        OSError: If the interfaces could not be read.
+        ValueError: If no public address is bound.
+    """
+    spec = urlsplit(provider)
+    family = int(parse_qs(spec.query).get('family', [str(family or 4)])[0])
+    addresses = pick_public_addresses(read_interface_addresses(), spec.hostname or None, family)
+    if not addresses:
+        raise ValueError(f"no public IPv{family} address bound to {spec.hostname or 'any interface'}")
+    return addresses[0]
+
+
+class AddressWatcher:
+    """Calls back whenever an address is added to or removed from an interface (Linux only).
+
+    Listens on the rtnetlink IPv4/IPv6 address groups from a daemon thread, so
+    an address change can trigger an update right away instead of at the next
+    scheduled check.
+    """
+
+    def __init__(self, callback):
+        self.callback = callback
+        self.sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE)
+        self.sock.bind((0, RTMGRP_IPV4_IFADDR | RTMGRP_IPV6_IFADDR))
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        while True:
+            try:
+                data = self.sock.recv(65536)
+            except OSError as e:
+                logging.error(f"Stopped watching interface addresses: {e}")
+                return
+            offset = 0
+            while offset + 16 <= len(data):
+                length, msg_type = struct.unpack_from('=LH', data, offset)
+                if msg_type in (RTM_NEWADDR, RTM_DELADDR):
+                    ip_events_total.inc("interface")
+                    self.callback()
+                    break
+                if length < 16:
+                    break
+                offset += (length + 3) & ~3
+
+
+address_watcher = None
+
+
+def start_address_watcher(callback) -> AddressWatcher | None:
+    """Starts watching for address changes if a local:// provider is configured.
+
+    Args:
+        callback: Called from the watcher thread on every address change.
+
+    Returns:
+        The watcher, or None if no local:// provider is configured or the
+        platform has no rtnetlink.
+    """
+    global address_watcher
+    if address_watcher is None and hasattr(socket, 'AF_NETLINK') and \
+            any(provider.startswith("local://") for resolver in ip_resolvers.values()
+                for provider in resolver.providers):
+        try:
+            address_watcher = AddressWatcher(callback)
+        except OSError as e:
+            logging.error(f"Cannot watch interface addresses: {e}")
+    return address_watcher
+
+
+# Public IP providers, overridable via IpProviders/IpQuorum/IpRaceWidth in config.ini
+DEFAULT_IP_PROVIDERS = "https://api.ipify.org, https://ipv4.icanhazip.com, https://checkip.amazonaws.com"
+DEFAULT_IPV6_PROVIDERS = "https://api6.ipify.org, https://ipv6.icanhazip.com"
+DEFAULT_IP_QUORUM = 1
+DEFAULT_IP_RACE_WIDTH = 2
+
+
+class ProviderStats:
+    """Moving average of a provider's latency; failures count as a full timeout."""
+
+    __slots__ = ('latency', 'successes', 'failures')
+
+    SMOOTHING = 0.3
+
+    def __init__(self):
+        self.latency = 0.0  # Untried providers rank first so they get measured
+        self.successes = 0
+        self.failures = 0
+
+    def record(self, seconds: float, ok: bool):
+        if ok:
+            self.successes += 1
+        else:
+            self.failures += 1
+        self.latency += self.SMOOTHING * (seconds - self.latency)
+
+
+class IpResolver:
+    """Looks up the public IP by racing several providers.
+
+    The fastest `race_width` providers (by moving-average latency) are queried
+    in parallel and the first address reported by `quorum` of them wins. The
+    remaining queries are left to finish on their own, up to `timeout`, and
+    their latency is still recorded, so slow or failing providers drift down
+    the ranking. At most one query per provider is ever in flight: a race that
+    needs a provider whose query from an earlier race is still running joins
+    that query instead of starting another, so however often the IP is probed,
+    the queries left running hold at most one thread and one connection per
+    provider. If the race does not reach a quorum, the next providers in the
+    ranking are tried.
+    With a `family`, every lookup is pinned to that address family and an
+    answer of the other family counts as a failure.
+    """
+
+    def __init__(self, providers: list[str], quorum: int = DEFAULT_IP_QUORUM,
+                 race_width: int = DEFAULT_IP_RACE_WIDTH, timeout: float = REQUEST_TIMEOUT,
+                 family: int | None = None):
+        self.providers = list(providers)
+        self.family = family
+        self.quorum = max(1, quorum)
+        self.race_width = max(race_width, self.quorum)
+        self.timeout = timeout
+        self.stats = {provider: ProviderStats() for provider in self.providers}
+        self.running = {}  # provider -> future of its query still in flight, joined by later races
+        self._pool = None  # One thread per provider at most, started on first use
+        self._lock = threading.Lock()
+
+    def ranked(self) -> list[str]:
+        """Returns the providers, fastest first."""
+        with self._lock:
+            return sorted(self.providers, key=lambda provider: self.stats[provider].latency)
+
+    def query(self, provider: str) -> str | None:
+        """Asks a single provider for the public IP and records how long it took."""
+        started = time.perf_counter()
+        ip = None
+        try:
+            if provider.startswith("dns://"):
+                answer = query_dns_provider(provider, self.timeout, self.family)
+            elif provider.startswith("local://"):
+                answer = query_local_provider(provider, self.family)
+            else:
+                # The race covers failures, so no retries
+                response = http_client.get(provider, timeout=self.timeout, retry=False, family=self.family)
+                response.raise_for_status()  # Raise HTTPError for bad responses (4xx or 5xx)
+                answer = response.content.decode('ascii', 'replace')
+            address = ipaddress.ip_address(answer.strip())
+            if self.family and address.version != self.family:
+                raise ValueError(f"{address} is not an IPv{self.family} address")
+            ip = str(address)
+        except (requests.exceptions.RequestException, OSError) as e:
+            logging.warning(f"Failed to get public IP from {provider}: {e}")
+        except (ValueError, KeyError) as e:
+            logging.warning(f"{provider} did not return an IP address: {e}")
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.stats[provider].record(elapsed if ip else max(elapsed, self.timeout), ip is not None)
+        return ip
+
+    @instrumented
+    def resolve(self) -> str | None:
+        """Races the providers.
+
+        Providers that answered with a different address than the quorum are
+        penalized like a failure.
+
+        Returns:
+            The public IP agreed on by the quorum, or None if no quorum was reached.
+        """
+        ranked = self.ranked()
+        answers: dict[str, str] = {}
+        for start in range(0, len(ranked), self.race_width):
+            ip = self._race(ranked[start:start + self.race_width], answers)
+            if ip:
+                with self._lock:
+                    for provider, answer in answers.items():
+                        if answer != ip:
+                            self.stats[provider].record(self.timeout, False)
+                return ip
+        logging.error(f"Failed to get public IP: no {self.quorum} provider(s) agreed")
+        return None
+
+    def _query_once(self, provider: str) -> Future:
+        """Starts a query of the provider, or returns the one still in flight from an earlier race."""
+        with self._lock:
+            future = self.running.get(provider)
+            if future is not None:
+                return future
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=len(self.providers), thread_name_prefix="ip-query")
+            future = self.running[provider] = self._pool.submit(self.query, provider)
+        future.add_done_callback(lambda done: self._query_done(provider, done))
+        return future
+
+    def _query_done(self, provider: str, future: Future):
+        with self._lock:
+            if self.running.get(provider) is future:
+                del self.running[provider]
+
+    def _race(self, providers: list[str], answers: dict[str, str]) -> str | None:
+        futures = {self._query_once(provider): provider for provider in providers}
+        try:
+            # Do not wait for the losers; they run on until they answer or time out, then update their stats
+            for future in as_completed(futures, timeout=self.timeout * 2):
+                ip = future.result()
+                if ip:
+                    answers[futures[future]] = ip
+                    if list(answers.values()).count(ip) >= self.quorum:
+                        return ip
+        except FutureTimeoutError:
+            pass
+        return None
+
+
+# Shared resolvers for the A (IPv4) and AAAA (IPv6) records
+ip_resolvers = {
+    4: IpResolver([p.strip() for p in DEFAULT_IP_PROVIDERS.split(",")], family=4),
+    6: IpResolver([p.strip() for p in DEFAULT_IPV6_PROVIDERS.split(",")], family=6),
+}
+
+
+def configure_ip_resolver(providers: list[str], quorum: int = DEFAULT_IP_QUORUM,
+                          race_width: int = DEFAULT_IP_RACE_WIDTH, family: int = 4) -> IpResolver:
+    """Replaces the shared resolver of a family, keeping its latency stats if the providers are unchanged.
+
+    Args:
+        providers: Provider URLs, each returning the caller's IP as plain text, or dns:// / local:// specs
+            (see query_dns_provider and query_local_provider).
+        quorum: How many providers must report the same address.
+        race_width: How many providers to query in parallel.
+        family: The address family the resolver looks up (4 or 6).
+
+    Returns:
+        The shared resolver.
+    """
+    resolver = ip_resolvers[family]
+    if resolver.providers != providers:
+        resolver = ip_resolvers[family] = IpResolver(providers, quorum, race_width, family=family)
+    else:
+        resolver.quorum = max(1, quorum)
+        resolver.race_width = max(race_width, resolver.quorum)
+    return resolver
+
+
+def get_public_ip(family: int = 4) -> str | None:
+    """Fetches the current public IP address from the configured providers.
+
+    Args:
+        family: 4 for the IPv4 address, 6 for the IPv6 address.
+
+    Returns:
+        str: The public IP address, or None if an error occurred.
+    """
+    return ip_resolvers[family].resolve()
+
+
+source_resolvers = {}  # (ip_source of a record table entry, family) -> IpResolver
+
+
+def get_source_ip(ip_source: str | None, family: int = 4) -> str | None:
+    """Fetches the IP address of a family for a record's ip_source, or the public IP if it has none.
+
+    Each distinct ip_source gets its own resolver per family, kept across
+    cycles so its provider ranking carries over.
+    """
+    if not ip_source:
+        return get_public_ip(family)
+    resolver = source_resolvers.get((ip_source, family))
+    if resolver is None:
+        providers = [p.strip() for p in ip_source.split(",") if p.strip()]
+        shared = ip_resolvers[family]
+        resolver = source_resolvers[ip_source, family] = IpResolver(providers, shared.quorum, shared.race_width,
+                                                                    family=family)
+    return resolver.resolve()
+
+
+def apply_tuning(section: configparser.SectionProxy):
+    """Applies the connection pool and concurrency settings from a config section.
+
+    Args:
+        section: The DEFAULT section of config.ini.
+
+    Raises:
+        ValueError: If one of the numeric settings is malformed or the NetworkBackend is unknown.
+    """
+    global max_workers, zone_concurrency, batch_size, verify_interval, probe_interval, debounce_delay
+    global cycle_deadline_seconds, zone_index_ttl, status_lines
+    max_workers = section.getint('MaxWorkers', DEFAULT_MAX_WORKERS)
+    zone_concurrency = section.getint('ZoneConcurrency', DEFAULT_ZONE_CONCURRENCY)
+    batch_size = section.getint('BatchSize', DEFAULT_BATCH_SIZE)
+    cycle_deadline_seconds = section.getfloat('CycleDeadline', DEFAULT_CYCLE_DEADLINE)
+    verify_interval = section.getfloat('VerifyInterval', DEFAULT_VERIFY_INTERVAL)
+    record_id_cache.ttl = section.getfloat('IdCacheTtl', DEFAULT_ID_CACHE_TTL) * 60
+    zone_index_ttl = section.getfloat('ZoneIndexTtl', DEFAULT_ZONE_INDEX_TTL)
+    probe_interval = section.getfloat('ProbeInterval', DEFAULT_PROBE_INTERVAL)
+    debounce_delay = section.getfloat('Debounce', DEFAULT_DEBOUNCE)
+    status_lines = section.getint('StatusLines', DEFAULT_STATUS_LINES)
+    configure_rate_limiter(section.getint('RateLimit', DEFAULT_RATE_LIMIT))
+    start_metrics_server(section.getint('MetricsPort', DEFAULT_METRICS_PORT),
+                         section.get('MetricsAddress', DEFAULT_METRICS_ADDRESS))
+    # Keep enough pooled connections for every worker
+    configure_http_client(section.getint('PoolSize', max(DEFAULT_POOL_SIZE, max_workers)),
+                          section.getint('Retries', DEFAULT_RETRIES))
+    configure_network_backend(section.get('NetworkBackend', DEFAULT_NETWORK_BACKEND),
+                              section.getint('Retries', DEFAULT_RETRIES))
+    for family, key, default in ((4, 'IpProviders', DEFAULT_IP_PROVIDERS), (6, 'IpProvidersV6', DEFAULT_IPV6_PROVIDERS)):
+        providers = [p.strip() for p in section.get(key, default).split(",") if p.strip()]
+        configure_ip_resolver(providers, section.getint('IpQuorum', DEFAULT_IP_QUORUM),
+                              section.getint('IpRaceWidth', DEFAULT_IP_RACE_WIDTH), family)
+
+
+def get_records_file(section: configparser.SectionProxy, path: str) -> str:
+    """Returns the RecordsFile setting resolved against the config file's directory, or ''."""
+    name = section.get('RecordsFile', '').strip()
+    if not name:
+        return ''
+    return os.path.join(os.path.dirname(os.path.abspath(path)), os.path.expanduser(name))
+
+
+def load_settings(path: str) -> dict:
+    """Reads the configuration file into the settings dict used by run_update_cycle.
+
+    Args:
+        path: Path of the configuration file.
+
+    Returns:
+        The settings, including the update interval in minutes.
+
+    Raises:
+        OSError: If the file cannot be read.
+        ValueError: If a numeric setting is malformed.
+    """
+    config = configparser.ConfigParser()
+    if not config.read(path):
+        raise FileNotFoundError(f"Config file not found: {path}")
+    section = config['DEFAULT']
+    apply_tuning(section)
+    return account_settings(section, path)
+
+
+def account_settings(section: configparser.SectionProxy, path: str, fallback: dict | None = None) -> dict:
+    """Reads the credentials, records, interval and rate limit of one account from a config section.
+
+    Args:
+        section: The DEFAULT section, or an [Account <name>] section.
+        path: Path of the configuration file (RecordsFile is relative to it).
+        fallback: Settings whose interval and rate limit apply if the section sets none.
+    """
+    fallback = fallback or {}
+    return {
+        'api_key': section.get('ApiKey', ''),
+        'email': section.get('Email', ''),
+        'zone_ids': section.get('ZoneIDs', ''),
+        'record_names': section.get('RecordNames', ''),
+        'record_type': section.get('RecordType', ''),
+        'records_file': get_records_file(section, path),
+        'interval': section.getfloat('Interval', fallback.get('interval', 5.0)),
+        'rate_limit': section.getint('RateLimit', fallback.get('rate_limit', DEFAULT_RATE_LIMIT)),
+    }
+
+
+# Further Cloudflare accounts served by the headless engine are [Account <name>] sections of config.ini
+ACCOUNT_SECTION_PREFIX = "Account "
+PRIMARY_ACCOUNT = "default"  # The account of the DEFAULT section, which the GUI edits
+
+
+def load_accounts(path: str, primary: dict) -> dict[str, dict]:
+    """Reads the settings of every account in the configuration file.
+
+    Account sections do not inherit the DEFAULT section's credentials or
+    records; only their Interval and RateLimit fall back to it. The DEFAULT
+    section is an account of its own unless it has no API key and other
+    accounts are configured.
+
+    Args:
+        path: Path of the configuration file.
+        primary: The DEFAULT section's settings, as returned by load_settings.
+
+    Returns:
+        Account name -> settings, in file order with the DEFAULT account first.
+
+    Raises:
+        OSError: If the file cannot be read.
+        ValueError: If a setting is malformed or an account name is empty.
+    """
+    # Without a default section, every section holds only the keys it sets itself
+    config = configparser.ConfigParser(default_section='')
+    if not config.read(path):
+        raise FileNotFoundError(f"Config file not found: {path}")
+    accounts = {}
+    for section_name in config.sections():
+        if not section_name.startswith(ACCOUNT_SECTION_PREFIX):
+            continue
+        name = section_name[len(ACCOUNT_SECTION_PREFIX):].strip()
+        if not name or name == PRIMARY_ACCOUNT:
+            raise ValueError(f"[{section_name}]: account name must not be empty or {PRIMARY_ACCOUNT!r}")
+        accounts[name] = account_settings(config[section_name], path, primary)
+    if primary['api_key'] or not accounts:
+        accounts = {PRIMARY_ACCOUNT: primary, **accounts}
+    return accounts
+
+# Save and load configuration
+def save_config():
+    """Saves the user's configuration to a file."""
+    config = configparser.ConfigParser()
+    config.read(config_path)  # Keep settings that have no GUI field (e.g. PoolSize)
+    config['DEFAULT'].update({
+        'ApiKey': api_key_entry.get(),
+        'Email': email_entry.get(),
+        'ZoneIDs': zone_id_entry.get(),
+        'RecordNames': record_name_entry.get(),
+        'RecordType': record_type_entry.get(),
+        'Interval': interval_entry.get()
+    })
+    try:
+        with open(config_path, 'w') as configfile:
+            config.write(configfile)
+        messagebox.showinfo("Info", "Configuration saved successfully.")
+    except OSError as e:
+        messagebox.showerror("Error", f"Failed to save config: {e}")
+        logging.error(f"Failed to save config: {e}")
+
+
+def load_config():
+    """Loads the user's configuration from a file."""
+    global records_file
+    config = configparser.ConfigParser()
+    try:
+        config.read(config_path)
+        if 'DEFAULT' in config:
+            api_key_entry.delete(0, tk.END)
+            api_key_entry.insert(0, config['DEFAULT'].get('ApiKey', ''))
+
+            email_entry.delete(0, tk.END)
+            email_entry.insert(0, config['DEFAULT'].get('Email', ''))
+
+            zone_id_entry.delete(0, tk.END)
+            zone_id_entry.insert(0, config['DEFAULT'].get('ZoneIDs', ''))
+
+            record_name_entry.delete(0, tk.END)
+            record_name_entry.insert(0, config['DEFAULT'].get('RecordNames', ''))
+
+            record_type_entry.delete(0, tk.END)
+            record_type_entry.insert(0, config['DEFAULT'].get('RecordType', ''))
+
+            interval_entry.delete(0, tk.END)
+            interval_entry.insert(0, config['DEFAULT'].get('Interval', ''))
+
+            apply_tuning(config['DEFAULT'])
+            records_file = get_records_file(config['DEFAULT'], config_path)
+            status_log.resize(status_lines)
+            status_view.refresh()
+    except (OSError, ValueError) as e:
+        messagebox.showerror("Error",f"Failed to load config file: {e}")
+        logging.error(f"Failed to load config file: {e}")
+
+
+# Record IDs are cached for IdCacheTtl minutes (overridable in config.ini)
+DEFAULT_ID_CACHE_TTL = 1440
+ID_CACHE_MAX_ENTRIES = 10000
+
+
+class RecordIdCache:
+    """LRU cache of DNS record IDs keyed by (zone_id, name, type), with a TTL.
+
+    Record IDs almost never change, so a cached ID lets an update PATCH the
+    record directly instead of looking it up first. Entries are dropped when
+    they expire, when the cache is full (least recently used first) and when a
+    write to the cached ID returns 404. The entries are persisted with the
+    UpdateState.
+    """
+
+    def __init__(self, ttl_minutes: float = DEFAULT_ID_CACHE_TTL, max_entries: int = ID_CACHE_MAX_ENTRIES):
+        self.ttl = ttl_minutes * 60
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # key -> (record_id, expires_at)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(zone_id: str, record_name: str, record_type: str) -> str:
+        return f"{zone_id}/{normalize_record_name(record_name)}/{record_type.upper()}"
+
+    def get(self, zone_id: str, record_name: str, record_type: str) -> str | None:
+        """Returns the cached record ID, or None if unknown or expired."""
+        key = self.key(zone_id, record_name, record_type)
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.time():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, zone_id: str, record_name: str, record_type: str, record_id: str):
+        """Caches a record ID, evicting the least recently used entries if full."""
+        key = self.key(zone_id, record_name, record_type)
+        with self._lock:
+            self.entries[key] = (record_id, time.time() + self.ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, zone_id: str, record_name: str, record_type: str):
+        """Drops a cached record ID, e.g. after the record was deleted or recreated."""
+        with self._lock:
+            self.entries.pop(self.key(zone_id, record_name, record_type), None)
+
+    def to_json(self) -> dict:
+        with self._lock:
+            return {key: list(entry) for key, entry in self.entries.items()}
+
+    def load_json(self, data: dict):
+        """Restores entries saved by to_json, skipping expired ones."""
+        now = time.time()
+        with self._lock:
+            for key, (record_id, expires_at) in data.items():
+                if expires_at > now:
+                    self.entries[key] = (record_id, expires_at)
+
+
+record_id_cache = RecordIdCache()
+
+
+# Coroutine versions of the Cloudflare API functions, keyed by the function they replace while NetworkBackend = asyncio
+async_variants = {}
+
+
+def async_capable(func):
+    """Decorator that hands calls to the function's coroutine version while the asyncio backend is selected.
+
+    The coroutine (registered with coroutine_of) takes the same arguments and
+    runs on the backend's event loop; the calling thread waits for its result.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if async_client is not None:
+            return async_client.run(async_variants[wrapper](*args, **kwargs))
+        return func(*args, **kwargs)
+    return wrapper
+
+
+def coroutine_of(func):
+    """Decorator registering a coroutine as the asyncio version of an async_capable function."""
+    def register(coroutine_function):
+        async_variants[func] = coroutine_function
+        return coroutine_function
+    return register
+
+
+# Get the DNS record ID for a given domain record
+@async_capable
+@instrumented
+def get_dns_record_id(api_key: str, email: str, zone_id: str, record_name: str, record_type: str) -> str | None:
+    """Retrieves the DNS record ID from Cloudflare.
+
+    Args:
+        api_key: The Cloudflare API key.
+        email: The Cloudflare account email.
+        zone_id: The Cloudflare zone ID.
+        record_name: The DNS record name.
+        record_type: The DNS record type.
+
+    Returns:
+        The DNS record ID, or None if an error occurred.
+    """
+    cached_id = record_id_cache.get(zone_id, record_name, record_type)
+    if cached_id:
+        return cached_id
+
+    headers = cloudflare_headers(api_key, email)
+    try:
+        response = http_client.get(
+            f"{CLOUDFLARE_API}/zones/{zone_id}/dns_records?type={record_type}&name={record_name}",
+            headers=headers
+        )
+        response.raise_for_status()
+        records = response.json()["result"]
+        if records:
+            record_id_cache.put(zone_id, record_name, record_type, records[0]["id"])
+            return records[0]["id"]
+        else:
+            logging.error(f"No matching DNS record found for {record_name}")
+            return None
+    except requests.exceptions.RequestException as e:
+        logging.error(f"API request failed: {e}")
+        return None
+    except requests.exceptions.Timeout as e:
+        logging.error(f"API request timed out: {e}")
+        return None
+
+# Check the current IP content of a DNS record
+@async_capable
+@instrumented
+def check_dns_record(api_key: str, email: str, zone_id: str, record_name: str, record_type: str) -> str | None:
+    """Checks the current IP address of a DNS record.
+
+    Args:
+        api_key: The Cloudflare API key.
+        email: The Cloudflare account email.
+        zone_id: The Cloudflare zone ID.
+        record_name: The DNS record name.
+        record_type: The DNS record type.
+
+    Returns:
+        The current IP address of the DNS record, or None if not found.
+    """
+    headers = cloudflare_headers(api_key, email)
+    try:
+        response = http_client.get(
+            f"{CLOUDFLARE_API}/zones/{zone_id}/dns_records?type={record_type}&name={record_name}",
+            headers=headers
+        )
+        response.raise_for_status()
+        records = response.json()["result"]
+        if records:
+            return records[0]['content']  # Return the IP address of the DNS record
+    except requests.exceptions.RequestException as e:
+        logging.error(f"Failed to check DNS record: {e}")
+        return None
+    except requests.exceptions.Timeout as e:
+        logging.error(f"Failed to check DNS record, request timed out: {e}")
+        return None
+
+
+# Update a single DNS record and return True if successful
+@async_capable
+@instrumented
+def update_dns_record_for_domain(api_key: str, email: str, zone_id: str, record_name: str, record_type: str, ip: str) -> bool:
+    """Updates a single DNS record on Cloudflare.
+
+    Args:
+        api_key: The Cloudflare API key.
+        email: The Cloudflare account email.
+        zone_id: The Cloudflare zone ID.
+        record_name: The DNS record name.
+        record_type: The DNS record type.
+        ip: The new IP address.
+
+    Returns:
+        True if the update was successful, False otherwise.
+    """
+    record = {"id": None, "name": record_name, "type": record_type}
+    for _ in range(2):
+        record["id"] = get_dns_record_id(api_key, email, zone_id, record_name, record_type)
+        if not record["id"]:
+            return False
+        # PATCH only the content so proxied and ttl are preserved without fetching the record first
+        updated = patch_dns_record(api_key, email, zone_id, record, {"content": ip})
+        if updated is not None:
+            return updated
+        # The cached ID was stale (record deleted or recreated); it has been invalidated, look it up again
+    logging.error(f"Failed to update {record_name}: record not found")
+    return False
+
+# Outcomes reported by reconcile_records for each record
+RESULT_UP_TO_DATE = "up-to-date"
+RESULT_UPDATED = "updated"
+RESULT_NOT_FOUND = "not-found"
+RESULT_FAILED = "failed"
+
+# Largest page size the dns_records listing accepts
+DNS_RECORDS_PER_PAGE = 5000
+
+# Concurrency limits for reconcile_records, overridable via MaxWorkers/ZoneConcurrency in config.ini
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_ZONE_CONCURRENCY = 4
+max_workers = DEFAULT_MAX_WORKERS
+zone_concurrency = DEFAULT_ZONE_CONCURRENCY
+
+# Stale records of a zone are written through the batch endpoint in chunks of BatchSize (0 disables batching)
+DEFAULT_BATCH_SIZE = 100
+BATCH_UNAVAILABLE_STATUS = (404, 405, 501)
+BATCH_REJECTED_STATUS = 400  # A record failed validation; any other error fails the whole chunk
+batch_size = DEFAULT_BATCH_SIZE
+batch_unavailable_zones = set()
+
+# Cached state lives next to config.ini; a full reconcile is forced every VerifyInterval minutes
+STATE_FILE_NAME = 'cfUpdater.state.journal'
+LEGACY_STATE_FILE_NAME = 'cfUpdater.state.json'  # Read once if there is no journal yet
+JOURNAL_COMPACT_ENTRIES = 100  # Appended entries after which the journal is rewritten as one snapshot
+DEFAULT_VERIFY_INTERVAL = 360
+verify_interval = DEFAULT_VERIFY_INTERVAL
+update_state = None
+
+# Event-driven scheduling, overridable via ProbeInterval/Debounce in config.ini.
+# ProbeInterval (seconds) enables a cheap IP probe that triggers a cycle on change; 0 disables it.
+DEFAULT_PROBE_INTERVAL = 0
+DEFAULT_DEBOUNCE = 5
+MAX_EVENT_DELAY = 60
+probe_interval = DEFAULT_PROBE_INTERVAL
+debounce_delay = DEFAULT_DEBOUNCE
+
+
+# An ApiKey without an Email is a scoped API token; its verification and scopes are cached this long (seconds)
+CREDENTIALS_CACHE_TTL = 3600
+DNS_WRITE_PERMISSION = "DNS Write"  # Permission group a token needs to change records
+ZONE_RESOURCE_PREFIX = "com.cloudflare.api.account.zone."
+
+
+def parse_api_time(value: str | None) -> float | None:
+    """Converts a timestamp of the Cloudflare API (ISO 8601, e.g. "2030-01-01T00:00:00Z") to epoch seconds."""
+    if not value:
+        return None
+    try:
+        return datetime.datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+class Credentials:
+    """Authentication for the Cloudflare API.
+
+    An API key with an email is the global API key, sent as X-Auth-Key and
+    X-Auth-Email; an API key without an email is a scoped API token, sent as a
+    Bearer token. The headers are built once and shared by every request.
+
+    A token is verified lazily, before its first write, and the outcome is
+    cached for CREDENTIALS_CACHE_TTL seconds or until the token expires. So are
+    its permission policies, read from the token itself where the token is
+    allowed to read them, so zones it may not edit can be left out of a cycle
+    instead of sending writes that would be rejected.
+    """
+
+    __slots__ = ('api_key', 'email', 'headers', 'valid', 'policies', 'checked_until', '_lock')
+
+    def __init__(self, api_key: str, email: str):
+        self.api_key = api_key
+        self.email = email
+        if email:
+            self.headers = {"X-Auth-Email": email, "X-Auth-Key": api_key, "Content-Type": "application/json"}
+        else:
+            self.headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
+        self.valid = None  # Outcome of the last verification
+        self.policies = None  # The token's policies; None if they could not be read
+        self.checked_until = 0.0  # Wall-clock time until which valid and policies are trusted
+        self._lock = threading.Lock()
+
+    @property
+    def is_token(self) -> bool:
+        return not self.email
+
+    def verify(self) -> bool | None:
+        """Verifies an API token and reads its policies, at most once per cache period.
+
+        A 4xx from the verify endpoint is not taken as a rejection: an
+        account-owned token is verified under /accounts/{id}/tokens/verify and
+        gets one here although it may well be allowed to write DNS. Such an
+        outcome is cached like an unreadable policy, and writes go ahead.
+
+        Returns:
+            True if the token is active (global API keys are always taken as
+            valid), False if Cloudflare reports it disabled or expired, or None
+            if it could not be verified, e.g. because of a network error.
+        """
+        if not self.is_token:
+            return True
+        with self._lock:
+            if time.time() < self.checked_until:
+                return self.valid
+            try:
+                response = http_client.get(f"{CLOUDFLARE_API}/user/tokens/verify", headers=self.headers)
+                if response.status_code in (400, 401, 403):
+                    logging.warning(f"The API token could not be verified (HTTP {response.status_code}); "
+                                    f"writes go ahead unchecked")
+                    self.valid = self.policies = None
+                    self.checked_until = time.time() + CREDENTIALS_CACHE_TTL
+                    return None
+                response.raise_for_status()
+                result = response.json()["result"]
+            except (requests.exceptions.RequestException, ValueError, KeyError) as e:
+                logging.error(f"Failed to verify the API token: {e}")
+                return None
+            self.valid = result.get("status") == "active"
+            self.policies = self.fetch_policies(result["id"]) if self.valid and result.get("id") else None
+            expires_on = parse_api_time(result.get("expires_on"))
+            self.checked_until = min(time.time() + CREDENTIALS_CACHE_TTL, expires_on or math.inf)
+            return self.valid
+
+    def fetch_policies(self, token_id: str) -> list[dict] | None:
+        """Reads the token's policies; None if the token lacks the permission to read itself."""
+        try:
+            response = http_client.get(f"{CLOUDFLARE_API}/user/tokens/{token_id}", headers=self.headers)
+            if response.status_code in (401, 403, 404):
+                return None
+            response.raise_for_status()
+            return response.json()["result"]["policies"]
+        except (requests.exceptions.RequestException, ValueError, KeyError) as e:
+            logging.error(f"Failed to read the API token's permissions: {e}")
+            return None
+
+    @staticmethod
+    def covers_zone(resources: dict, zone_id: str) -> bool:
+        """Tells whether a policy's resources include a zone, directly, by wildcard or through an account."""
+        for resource, scope in resources.items():
+            if resource in (ZONE_RESOURCE_PREFIX + zone_id, ZONE_RESOURCE_PREFIX + "*"):
+                return True
+            if isinstance(scope, dict) and Credentials.covers_zone(scope, zone_id):
+                return True
+        return False
+
+    def may_edit_dns(self, zone_id: str) -> bool:
+        """Tells whether the credentials may change records in a zone, as far as known.
+
+        Global API keys, and tokens whose policies could not be read, are
+        assumed to be allowed. Call verify() first.
+        """
+        if self.policies is None:
+            return True
+        allowed = False
+        for policy in self.policies:
+            groups = {group.get("name") for group in policy.get("permission_groups", [])}
+            if DNS_WRITE_PERMISSION not in groups or not self.covers_zone(policy.get("resources", {}), zone_id):
+                continue
+            if policy.get("effect") == "deny":
+                return False
+            allowed = True
+        return allowed
+
+
+@functools.lru_cache(maxsize=64)
+def credentials_for(api_key: str, email: str) -> Credentials:
+    """Returns the shared Credentials object of an API key (or token) and email."""
+    return Credentials(api_key, email)
+
+
+def cloudflare_headers(api_key: str, email: str) -> dict:
+    """Returns the authentication headers for the Cloudflare API, built once per credentials; do not modify them."""
+    return credentials_for(api_key, email).headers
+
+
+def normalize_record_name(record_name: str) -> str:
+    """Normalizes a record name the way Cloudflare reports it (lowercase, no trailing dot)."""
+    return record_name.strip().rstrip(".").lower()
+
+
+def parse_targets(zone_ids_text: str, record_names_text: str) -> list[tuple[str | None, str]] | None:
+    """Pairs the comma-separated record names with their zone IDs.
+
+    Args:
+        zone_ids_text: Comma-separated zone IDs, either one or one per record. If
+            empty, every zone ID is None and is resolved later by resolve_zones.
+        record_names_text: Comma-separated record names.
 
-# Configure logging
-logging.basicConfig(filename='cfUpdater.log', level=logging.ERROR,
-                    format='%(asctime)s:%(levelname)s:%(message)s')
+    Returns:
+        A list of (zone_id, record_name) pairs, or None if the counts do not line up.
+    """
+    record_names = [r.strip() for r in record_names_text.split(",") if r.strip()]
+    zone_ids = [z.strip() for z in zone_ids_text.split(",") if z.strip()]
+
+    if not zone_ids:
+        return [(None, record_name) for record_name in record_names]
+    # If only one zone ID is provided, use it for all record names.
+    if len(zone_ids) == 1 and len(record_names) > 1:
+        zone_ids = zone_ids * len(record_names)
+    elif len(zone_ids) != len(record_names):
+        return None
+    return list(zip(zone_ids, record_names))
+
+
+# Structured record table (RecordsFile in config.ini)
+RECORD_TYPES = ('A', 'AAAA')
+RECORD_FIELDS = frozenset({'name', 'zone', 'type', 'proxied', 'ttl', 'ip_source'})
+MIN_TTL, MAX_TTL = 60, 86400  # A ttl of 1 means "automatic"
+record_tables = {}  # path -> ((mtime_ns, size), records)
+
+
+class RecordSpec:
+    """One desired DNS record: where it lives, how it should look and where its IP comes from.
+
+    proxied and ttl are only enforced when set; None leaves whatever Cloudflare
+    has. ip_source is a comma-separated provider list like IpProviders, or None
+    for the shared resolver.
+    """
+
+    __slots__ = ('name', 'zone_id', 'type', 'proxied', 'ttl', 'ip_source')
+
+    def __init__(self, name: str, zone_id: str | None = None, record_type: str = 'A',
+                 proxied: bool | None = None, ttl: int | None = None, ip_source: str | None = None):
+        self.name = name
+        self.zone_id = zone_id
+        self.type = record_type.upper()
+        self.proxied = proxied
+        self.ttl = ttl
+        self.ip_source = ip_source
 
-def get_public_ip() -> str | None:
-    """Fetches the current public IP address.
+    def __repr__(self) -> str:
+        return f"RecordSpec({self.name!r}, {self.zone_id!r}, {self.type!r})"
+
+    @property
+    def family(self) -> int:
+        """The address family of the record's IP: 6 for AAAA, 4 for A."""
+        return 6 if self.type == 'AAAA' else 4
+
+    @property
+    def key(self) -> str:
+        """Identifies the record as "zone_id/name/type", the key used by the caches."""
+        return RecordIdCache.key(self.zone_id, self.name, self.type)
+
+    def with_zone(self, zone_id: str | None) -> 'RecordSpec':
+        """Returns a copy placed in the given zone."""
+        return RecordSpec(self.name, zone_id, self.type, self.proxied, self.ttl, self.ip_source)
+
+    def write_fields(self, ip: str) -> dict:
+        """Returns every field a write of this record sets."""
+        fields = {"content": ip}
+        if self.proxied is not None:
+            fields["proxied"] = self.proxied
+        if self.ttl is not None:
+            fields["ttl"] = self.ttl
+        return fields
+
+    def changes(self, record: dict, ip: str) -> dict:
+        """Returns the fields of a listed record that differ from this spec (empty if none)."""
+        return {field: value for field, value in self.write_fields(ip).items() if record.get(field) != value}
+
+    def fingerprint(self, ip: str) -> str:
+        """Summarizes the desired state, so the state cache notices a changed proxied or ttl too."""
+        if self.proxied is None and self.ttl is None:
+            return ip
+        return f"{ip} proxied={self.proxied} ttl={self.ttl}"
+
+
+def parse_record_table(data, source: str) -> list[RecordSpec]:
+    """Validates a decoded record table and turns it into RecordSpecs.
+
+    The table is an object with a "records" list and optional "defaults" that
+    every record inherits, e.g.
+    {"defaults": {"zone": "...", "proxied": false}, "records": [{"name": "home.example.com"}]}.
+
+    Args:
+        data: The decoded JSON document.
+        source: Name of the file, used in error messages.
 
     Returns:
-        str: The public IP address, or None if an error occurred.
+        The records in file order.
+
+    Raises:
+        ValueError: If the table or one of its records is invalid.
+    """
+    if not isinstance(data, dict) or not isinstance(data.get('records'), list):
+        raise ValueError(f"{source}: expected an object with a \"records\" list")
+    defaults = data.get('defaults', {})
+    if not isinstance(defaults, dict) or 'name' in defaults:
+        raise ValueError(f"{source}: \"defaults\" must be an object without a name")
+
+    records = []
+    seen = set()
+    for number, entry in enumerate(data['records'], 1):
+        where = f"{source}: record {number}"
+        if not isinstance(entry, dict):
+            raise ValueError(f"{where}: expected an object")
+        fields = {**defaults, **entry}
+        unknown = set(fields) - RECORD_FIELDS
+        if unknown:
+            raise ValueError(f"{where}: unknown field(s) {', '.join(sorted(unknown))}")
+        name = fields.get('name')
+        if not isinstance(name, str) or not normalize_record_name(name):
+            raise ValueError(f"{where}: \"name\" must be a non-empty string")
+        where = f"{source}: record {number} ({name})"
+        zone_id = fields.get('zone') or None
+        if zone_id is not None and not isinstance(zone_id, str):
+            raise ValueError(f"{where}: \"zone\" must be a string")
+        record_type = fields.get('type', 'A')
+        record_types = split_record_types(record_type) if isinstance(record_type, str) else None
+        if record_types is None:
+            raise ValueError(f"{where}: \"type\" must be A, AAAA or A+AAAA")
+        proxied = fields.get('proxied')
+        if proxied is not None and not isinstance(proxied, bool):
+            raise ValueError(f"{where}: \"proxied\" must be true or false")
+        ttl = fields.get('ttl')
+        if ttl is not None and (isinstance(ttl, bool) or not isinstance(ttl, int)
+                                or not (ttl == 1 or MIN_TTL <= ttl <= MAX_TTL)):
+            raise ValueError(f"{where}: \"ttl\" must be 1 (automatic) or {MIN_TTL}-{MAX_TTL}")
+        ip_source = fields.get('ip_source') or None
+        if ip_source is not None and not isinstance(ip_source, str):
+            raise ValueError(f"{where}: \"ip_source\" must be a string")
+
+        for record_type in record_types:
+            spec = RecordSpec(name.strip(), zone_id and zone_id.strip(), record_type, proxied, ttl,
+                              ip_source and ip_source.strip())
+            identity = (spec.zone_id, normalize_record_name(spec.name), spec.type)
+            if identity in seen:
+                raise ValueError(f"{where}: listed more than once")
+            seen.add(identity)
+            records.append(spec)
+    return records
+
+
+def load_record_table(path: str) -> list[RecordSpec]:
+    """Returns the records of a record table file, parsing it again only if it changed.
+
+    Args:
+        path: Path of the JSON record table.
+
+    Raises:
+        OSError: If the file cannot be read.
+        ValueError: If the file is not a valid record table.
+    """
+    stat = os.stat(path)
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    cached = record_tables.get(path)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    with open(path, encoding='utf-8') as tablefile:
+        records = parse_record_table(json.load(tablefile), os.path.basename(path))
+    record_tables[path] = (stamp, records)
+    return records
+
+
+def split_record_types(text: str) -> list[str] | None:
+    """Splits a record type like "A", "aaaa" or "A+AAAA" (both families) into record types.
+
+    Returns:
+        The upper-case types, or None if one of them is not in RECORD_TYPES.
+    """
+    types = [part.strip().upper() for part in text.split("+")]
+    if not all(record_type in RECORD_TYPES for record_type in types):
+        return None
+    return list(dict.fromkeys(types))
+
+
+@functools.lru_cache(maxsize=8)
+def legacy_record_specs(zone_ids_text: str, record_names_text: str, record_types_text: str) -> tuple[RecordSpec, ...]:
+    """Builds RecordSpecs from the ZoneIDs, RecordNames and RecordType fields, once per distinct value.
+
+    RecordType is either one type for all records or one per record; a type
+    of "A+AAAA" keeps both the IPv4 and the IPv6 record up to date.
+
+    Raises:
+        ValueError: If the counts do not line up or a record type is not supported.
+    """
+    targets = parse_targets(zone_ids_text, record_names_text)
+    if targets is None:
+        raise ValueError("Number of Zone IDs must be either 1 or match the number of Record Names.")
+    record_types = [t.strip() for t in record_types_text.split(",") if t.strip()] or ['A']
+    if len(record_types) == 1:
+        record_types = record_types * len(targets)
+    elif len(record_types) != len(targets):
+        raise ValueError("Number of Record Types must be either 1 or match the number of Record Names.")
+
+    records = []
+    for (zone_id, name), record_type in zip(targets, record_types):
+        types = split_record_types(record_type)
+        if types is None:
+            raise ValueError(f"Unsupported record type {record_type} for {name}; use A, AAAA or A+AAAA.")
+        records.extend(RecordSpec(name, zone_id, t) for t in types)
+    return tuple(records)
+
+
+def desired_records(settings: dict) -> list[RecordSpec]:
+    """Returns the records to keep up to date: the record table if one is configured, else the plain fields.
+
+    Raises:
+        OSError: If the record table cannot be read.
+        ValueError: If the record table or the plain fields are invalid.
+    """
+    if settings.get('records_file'):
+        return load_record_table(settings['records_file'])
+    return list(legacy_record_specs(settings['zone_ids'], settings['record_names'], settings['record_type']))
+
+
+def diff_records(old: list[RecordSpec], new: list[RecordSpec]) -> tuple[list[RecordSpec], list[RecordSpec], list[RecordSpec]]:
+    """Compares two record lists by (zone, name, type).
+
+    Returns:
+        (added, removed, changed) records; changed ones (different proxied, ttl
+        or ip_source) are taken from `new`.
+    """
+    def identity(spec):
+        return spec.zone_id, normalize_record_name(spec.name), spec.type
+
+    before = {identity(spec): spec for spec in old}
+    after = {identity(spec): spec for spec in new}
+    added = [spec for key, spec in after.items() if key not in before]
+    removed = [spec for key, spec in before.items() if key not in after]
+    changed = [spec for key, spec in after.items() if key in before and
+               (spec.proxied, spec.ttl, spec.ip_source) != (before[key].proxied, before[key].ttl, before[key].ip_source)]
+    return added, removed, changed
+
+
+# The zone index is refreshed after ZoneIndexTtl minutes (overridable in config.ini)
+DEFAULT_ZONE_INDEX_TTL = 1440
+ZONES_PER_PAGE = 50
+ZONE_INDEX_MIN_AGE = 300  # An unknown name triggers a re-listing at most this often (seconds)
+zone_index_ttl = DEFAULT_ZONE_INDEX_TTL
+zone_index = None
+
+
+class ZoneNode:
+    """One label of the zone trie; zone_id is set where a zone apex ends."""
+
+    __slots__ = ('children', 'zone_id')
+
+    def __init__(self):
+        self.children = {}
+        self.zone_id = None
+
+
+class ZoneIndex:
+    """Maps record names to zone IDs by longest-suffix match.
+
+    Zone names are stored in a trie keyed by their labels from right to left
+    (com -> example -> ...), so a lookup costs one step per label of the record
+    name, however many zones the account has.
+    """
+
+    def __init__(self, zones: dict[str, str], owner: str, built_at: float | None = None):
+        """Builds the trie.
+
+        Args:
+            zones: Zone name -> zone ID.
+            owner: Fingerprint of the credentials the zones were listed with.
+            built_at: Wall-clock time of the listing (defaults to now).
+        """
+        self.zones = zones
+        self.owner = owner
+        self.built_at = time.time() if built_at is None else built_at
+        self.root = ZoneNode()
+        for zone_name, zone_id in zones.items():
+            node = self.root
+            for label in reversed(normalize_record_name(zone_name).split('.')):
+                node = node.children.setdefault(label, ZoneNode())
+            node.zone_id = zone_id
+
+    def lookup(self, record_name: str) -> str | None:
+        """Returns the ID of the most specific zone containing record_name, or None."""
+        node = self.root
+        zone_id = None
+        for label in reversed(normalize_record_name(record_name).split('.')):
+            node = node.children.get(label)
+            if node is None:
+                break
+            zone_id = node.zone_id or zone_id
+        return zone_id
+
+    def is_fresh(self, owner: str) -> bool:
+        return owner == self.owner and time.time() - self.built_at < zone_index_ttl * 60
+
+
+
+def credentials_fingerprint(api_key: str, email: str) -> str:
+    """Identifies an account in cached data without storing its credentials."""
+    return hashlib.sha256(f"{email}\0{api_key}".encode()).hexdigest()[:16]
+
+
+@instrumented
+def fetch_zone_index(api_key: str, email: str) -> ZoneIndex | None:
+    """Lists every zone of the account, following pagination, and indexes them.
+
+    Args:
+        api_key: The Cloudflare API key.
+        email: The Cloudflare account email.
+
+    Returns:
+        The zone index, or None if an error occurred.
+    """
+    headers = cloudflare_headers(api_key, email)
+    zones = {}
+    page = 1
+    try:
+        while True:
+            response = http_client.get(f"{CLOUDFLARE_API}/zones", params={"page": page, "per_page": ZONES_PER_PAGE},
+                                       headers=headers)
+            response.raise_for_status()
+            body = response.json()
+            zones.update((zone["name"], zone["id"]) for zone in body["result"])
+            if page >= body.get("result_info", {}).get("total_pages", 1):
+                return ZoneIndex(zones, credentials_fingerprint(api_key, email))
+            page += 1
+    except (requests.exceptions.RequestException, ValueError, KeyError) as e:
+        logging.error(f"Failed to list zones: {e}")
+        return None
+
+
+def resolve_zones(api_key: str, email: str, records: list[RecordSpec]) -> list[RecordSpec]:
+    """Fills in the zone ID of every record that has none, using the cached zone index.
+
+    The index is listed again when it is older than zone_index_ttl, belongs to
+    other credentials, or does not know one of the names (a zone may have been
+    added since; at most every ZONE_INDEX_MIN_AGE seconds).
+
+    Args:
+        api_key: The Cloudflare API key.
+        email: The Cloudflare account email.
+        records: The desired records, some without a zone ID.
+
+    Returns:
+        The records with resolved zone IDs; a zone ID stays None if no zone matches.
+    """
+    global zone_index
+    if all(spec.zone_id for spec in records):
+        return records
+
+    owner = credentials_fingerprint(api_key, email)
+    refreshed = False
+    if zone_index is None or not zone_index.is_fresh(owner):
+        zone_index = fetch_zone_index(api_key, email) or zone_index
+        refreshed = True
+    if zone_index is None:
+        return records
+
+    unresolved = [spec.name for spec in records if not spec.zone_id and not zone_index.lookup(spec.name)]
+    if unresolved and not refreshed and time.time() - zone_index.built_at >= ZONE_INDEX_MIN_AGE:
+        zone_index = fetch_zone_index(api_key, email) or zone_index
+    return [spec if spec.zone_id else spec.with_zone(zone_index.lookup(spec.name)) for spec in records]
+
+
+@async_capable
+@instrumented
+def list_dns_records(api_key: str, email: str, zone_id: str) -> list[dict] | None:
+    """Lists every DNS record in a zone, following pagination.
+
+    Args:
+        api_key: The Cloudflare API key.
+        email: The Cloudflare account email.
+        zone_id: The Cloudflare zone ID.
+
+    Returns:
+        The raw record dicts (id, name, type, content, proxied, ttl, ...), or None if an error occurred.
+    """
+    headers = cloudflare_headers(api_key, email)
+    records = []
+    page = 1
+    try:
+        while True:
+            response = http_client.get(
+                f"{CLOUDFLARE_API}/zones/{zone_id}/dns_records",
+                params={"page": page, "per_page": DNS_RECORDS_PER_PAGE},
+                headers=headers
+            )
+            response.raise_for_status()
+            body = response.json()
+            records.extend(body["result"])
+            total_pages = body.get("result_info", {}).get("total_pages", 1)
+            if page >= total_pages:
+                return records
+            page += 1
+    except (requests.exceptions.RequestException, ValueError, KeyError) as e:
+        logging.error(f"Failed to list DNS records for zone {zone_id}: {e}")
+        return None
+
+
+@async_capable
+@instrumented
+def patch_dns_record(api_key: str, email: str, zone_id: str, record: dict, fields: dict) -> bool | None:
+    """Changes some fields of an existing DNS record, leaving the others untouched.
+
+    Args:
+        api_key: The Cloudflare API key.
+        email: The Cloudflare account email.
+        zone_id: The Cloudflare zone ID.
+        record: The record dict as returned by list_dns_records (id, name and type are used).
+        fields: The fields to set, e.g. {"content": ip}.
+
+    Returns:
+        True if the update was successful, None if no record has that ID any
+        more (its cached ID is invalidated), False otherwise.
+    """
+    try:
+        response = http_client.patch(
+            f"{CLOUDFLARE_API}/zones/{zone_id}/dns_records/{record['id']}",
+            json=fields, headers=cloudflare_headers(api_key, email)
+        )
+        if response.status_code == 404:
+            record_id_cache.invalidate(zone_id, record['name'], record['type'])
+            return None
+        response.raise_for_status()
+        return True
+    except requests.exceptions.RequestException as e:
+        logging.error(f"Failed to update {record['name']}: {e}")
+        return False
+
+
+@async_capable
+@instrumented
+def batch_patch_dns_records(api_key: str, email: str, zone_id: str,
+                            writes: list[tuple[dict, dict]]) -> dict[str, bool] | None:
+    """Changes several records of one zone with a single batch request.
+
+    A batch is applied atomically, so one bad record rejects the whole chunk
+    with a 400; a rejected chunk is split in half until the offending records
+    are isolated and then written with individual PATCHes. Any other error
+    (authentication, or a 5xx that outlasted the retries) would fail every
+    split the same way, so it fails the whole chunk at once. A batch that
+    fails in transit is retried as individual PATCHes.
+
+    Args:
+        api_key: The Cloudflare API key.
+        email: The Cloudflare account email.
+        zone_id: The Cloudflare zone ID.
+        writes: (record, fields) pairs, record as returned by list_dns_records.
+
+    Returns:
+        A mapping of record id to the result of patch_dns_record (True on
+        success, None for a record ID that no longer exists), or None if the
+        zone has no batch endpoint.
     """
+    if len(writes) == 1:  # A batch of one buys nothing over a plain PATCH
+        record, fields = writes[0]
+        return {record["id"]: patch_dns_record(api_key, email, zone_id, record, fields)}
+
     try:
-        response = requests.get("https://api.ipify.org", timeout=10)
-        response.raise_for_status()  # Raise HTTPError for bad responses (4xx or 5xx)
-        return response.text
+        response = http_client.post(
+            f"{CLOUDFLARE_API}/zones/{zone_id}/dns_records/batch",
+            json={"patches": [{"id": record["id"], **fields} for record, fields in writes]},
+            headers=cloudflare_headers(api_key, email),
+            idempotent=True  # Setting the same fields twice is harmless
+        )
     except requests.exceptions.RequestException as e:
-        messagebox.showerror("Error", f"Failed to get public IP: {e}")
-        logging.error(f"Failed to get public IP: {e}")
+        logging.error(f"Batch update of {len(writes)} records in zone {zone_id} failed: {e}")
+        return {record["id"]: patch_dns_record(api_key, email, zone_id, record, fields) for record, fields in writes}
+
+    if response.status_code in BATCH_UNAVAILABLE_STATUS:
         return None
-    except requests.exceptions.Timeout as e:
-        messagebox.showerror("Error", f"Request timed out: {e}")
-        logging.error(f"Request timed out: {e}")
+    if response.ok:
+        return {record["id"]: True for record, _ in writes}
+    if response.status_code != BATCH_REJECTED_STATUS:
+        logging.error(f"Batch update of {len(writes)} records in zone {zone_id} failed: HTTP {response.status_code}")
+        return {record["id"]: False for record, _ in writes}
+
+    middle = len(writes) // 2
+    results = {}
+    for half in (writes[:middle], writes[middle:]):
+        half_results = batch_patch_dns_records(api_key, email, zone_id, half)
+        if half_results is None:
+            return None
+        results.update(half_results)
+    return results
+
+
+# asyncio versions of the functions above; they share the record ID cache and report errors the same way
+@coroutine_of(get_dns_record_id)
+@instrumented
+async def get_dns_record_id_async(api_key: str, email: str, zone_id: str, record_name: str,
+                                  record_type: str) -> str | None:
+    """Coroutine version of get_dns_record_id."""
+    cached_id = record_id_cache.get(zone_id, record_name, record_type)
+    if cached_id:
+        return cached_id
+    try:
+        response = await async_client.get(
+            f"{CLOUDFLARE_API}/zones/{zone_id}/dns_records",
+            params={"type": record_type, "name": record_name},
+            headers=cloudflare_headers(api_key, email)
+        )
+        response.raise_for_status()
+        records = response.json()["result"]
+    except requests.exceptions.RequestException as e:
+        logging.error(f"API request failed: {e}")
         return None
+    if not records:
+        logging.error(f"No matching DNS record found for {record_name}")
+        return None
+    record_id_cache.put(zone_id, record_name, record_type, records[0]["id"])
+    return records[0]["id"]
 
-# Save and load configuration
-def save_config():
-    """Saves the user's configuration to a file."""
-    config = configparser.ConfigParser()
-    config['DEFAULT'] = {
-        'ApiKey': api_key_entry.get(),
-        'Email': email_entry.get(),
-        'ZoneIDs': zone_id_entry.get(),
-        'RecordNames': record_name_entry.get(),
-        'RecordType': record_type_entry.get(),
-        'Interval': interval_entry.get()
-    }
+
+@coroutine_of(check_dns_record)
+@instrumented
+async def check_dns_record_async(api_key: str, email: str, zone_id: str, record_name: str,
+                                 record_type: str) -> str | None:
+    """Coroutine version of check_dns_record."""
     try:
-        with open('config.ini', 'w') as configfile:
-            config.write(configfile)
-        messagebox.showinfo("Info", "Configuration saved successfully.")
-    except OSError as e:
-        messagebox.showerror("Error", f"Failed to save config: {e}")
-        logging.error(f"Failed to save config: {e}")
+        response = await async_client.get(
+            f"{CLOUDFLARE_API}/zones/{zone_id}/dns_records",
+            params={"type": record_type, "name": record_name},
+            headers=cloudflare_headers(api_key, email)
+        )
+        response.raise_for_status()
+        records = response.json()["result"]
+    except requests.exceptions.RequestException as e:
+        logging.error(f"Failed to check DNS record: {e}")
+        return None
+    return records[0]['content'] if records else None
 
 
-def load_config():
-    """Loads the user's configuration from a file."""
-    config = configparser.ConfigParser()
+@coroutine_of(update_dns_record_for_domain)
+@instrumented
+async def update_dns_record_for_domain_async(api_key: str, email: str, zone_id: str, record_name: str,
+                                             record_type: str, ip: str) -> bool:
+    """Coroutine version of update_dns_record_for_domain."""
+    record = {"id": None, "name": record_name, "type": record_type}
+    for _ in range(2):
+        record["id"] = await get_dns_record_id_async(api_key, email, zone_id, record_name, record_type)
+        if not record["id"]:
+            return False
+        updated = await patch_dns_record_async(api_key, email, zone_id, record, {"content": ip})
+        if updated is not None:
+            return updated
+    logging.error(f"Failed to update {record_name}: record not found")
+    return False
+
+
+@coroutine_of(list_dns_records)
+@instrumented
+async def list_dns_records_async(api_key: str, email: str, zone_id: str) -> list[dict] | None:
+    """Coroutine version of list_dns_records."""
+    headers = cloudflare_headers(api_key, email)
+    records = []
+    page = 1
     try:
-        config.read('config.ini')
-        if 'DEFAULT' in config:
-            api_key_entry.delete(0, tk.END)
-            api_key_entry.insert(0, config['DEFAULT'].get('ApiKey', ''))
+        while True:
+            response = await async_client.get(
+                f"{CLOUDFLARE_API}/zones/{zone_id}/dns_records",
+                params={"page": page, "per_page": DNS_RECORDS_PER_PAGE},
+                headers=headers
+            )
+            response.raise_for_status()
+            body = response.json()
+            records.extend(body["result"])
+            total_pages = body.get("result_info", {}).get("total_pages", 1)
+            if page >= total_pages:
+                return records
+            page += 1
+    except (requests.exceptions.RequestException, ValueError, KeyError) as e:
+        logging.error(f"Failed to list DNS records for zone {zone_id}: {e}")
+        return None
 
-            email_entry.delete(0, tk.END)
-            email_entry.insert(0, config['DEFAULT'].get('Email', ''))
 
-            zone_id_entry.delete(0, tk.END)
-            zone_id_entry.insert(0, config['DEFAULT'].get('ZoneIDs', ''))
+@coroutine_of(patch_dns_record)
+@instrumented
+async def patch_dns_record_async(api_key: str, email: str, zone_id: str, record: dict, fields: dict) -> bool | None:
+    """Coroutine version of patch_dns_record."""
+    try:
+        response = await async_client.patch(
+            f"{CLOUDFLARE_API}/zones/{zone_id}/dns_records/{record['id']}",
+            json=fields, headers=cloudflare_headers(api_key, email)
+        )
+        if response.status_code == 404:
+            record_id_cache.invalidate(zone_id, record['name'], record['type'])
+            return None
+        response.raise_for_status()
+        return True
+    except requests.exceptions.RequestException as e:
+        logging.error(f"Failed to update {record['name']}: {e}")
+        return False
+
+
+@coroutine_of(batch_patch_dns_records)
+@instrumented
+async def batch_patch_dns_records_async(api_key: str, email: str, zone_id: str,
+                                        writes: list[tuple[dict, dict]]) -> dict[str, bool] | None:
+    """Coroutine version of batch_patch_dns_records; the PATCHes of a failed batch are sent concurrently."""
+    async def patch_each():
+        results = await asyncio.gather(*(patch_dns_record_async(api_key, email, zone_id, record, fields)
+                                         for record, fields in writes))
+        return {record["id"]: result for (record, _), result in zip(writes, results)}
+
+    if len(writes) == 1:
+        return await patch_each()
+
+    try:
+        response = await async_client.post(
+            f"{CLOUDFLARE_API}/zones/{zone_id}/dns_records/batch",
+            json={"patches": [{"id": record["id"], **fields} for record, fields in writes]},
+            headers=cloudflare_headers(api_key, email),
+            idempotent=True
+        )
+    except requests.exceptions.RequestException as e:
+        logging.error(f"Batch update of {len(writes)} records in zone {zone_id} failed: {e}")
+        return await patch_each()
+
+    if response.status_code in BATCH_UNAVAILABLE_STATUS:
+        return None
+    if response.ok:
+        return {record["id"]: True for record, _ in writes}
+    if response.status_code != BATCH_REJECTED_STATUS:
+        logging.error(f"Batch update of {len(writes)} records in zone {zone_id} failed: HTTP {response.status_code}")
+        return {record["id"]: False for record, _ in writes}
+
+    middle = len(writes) // 2
+    results = {}
+    for half in (writes[:middle], writes[middle:]):
+        half_results = await batch_patch_dns_records_async(api_key, email, zone_id, half)
+        if half_results is None:
+            return None
+        results.update(half_results)
+    return results
+
+
+def reconcile_records(api_key: str, email: str, desired: list[tuple[RecordSpec, str]],
+                      known_stale: set[str] | None = None, workers: int | None = None,
+                      per_zone: int | None = None) -> Iterator[tuple[RecordSpec, str]]:
+    """Brings every desired record in line with its IP, proxied and ttl, concurrently.
+
+    Each zone is listed once; the listing supplies id, content, proxied and ttl
+    for all of its records, so an up-to-date record costs nothing beyond its
+    share of the listing. Zones whose records are all known to be stale and
+    whose record IDs are all cached skip the listing and are written straight
+    away; a 404 on a cached ID falls back to listing the zone. Stale records are
+    written in chunks of batch_size through the batch endpoint, or with one
+    PATCH each where batching is disabled or unavailable. Listings and writes
+    run on a bounded thread pool, or as coroutines on the asyncio backend, with
+    at most `per_zone` requests in flight against any one zone, so a slow zone
+    or record no longer stalls the rest of the cycle.
+
+    Args:
+        api_key: The Cloudflare API key.
+        email: The Cloudflare account email.
+        desired: (record, ip) pairs; every record must have a zone ID.
+        known_stale: Keys (RecordSpec.key) of records the caller knows are not in the desired state yet.
+        workers: Global limit on concurrent requests of the thread pool (defaults to max_workers).
+        per_zone: Limit on concurrent requests per zone (defaults to zone_concurrency).
+
+    Yields:
+        (record, result) pairs in completion order, result being one of the RESULT_* constants.
+    """
+    workers = workers or max_workers
+    per_zone = per_zone or zone_concurrency
+    known_stale = known_stale or set()
+
+    by_zone: dict[str, list[tuple[RecordSpec, str]]] = {}
+    for spec, ip in desired:
+        by_zone.setdefault(spec.zone_id, []).append((spec, ip))
+    if not by_zone:
+        return
+
+    queued: dict[str, deque] = {zone_id: deque() for zone_id in by_zone}
+    in_flight = dict.fromkeys(by_zone, 0)
+    unlisted: dict[str, list[tuple[RecordSpec, str]]] = {}  # Records waiting for their zone's listing
+
+    with ThreadPoolExecutor(max_workers=min(workers, max(len(desired), 1))) as pool:
+        pending = {}
+        finished = queue.SimpleQueue()  # Futures arrive here as they complete, so no wait() over all of pending
+
+        def start(func, *args):
+            """Runs an API call on the pool, or as its coroutine version on the asyncio backend's event loop."""
+            if async_client is not None:
+                future = async_client.submit(async_variants[func](*args))
+            else:
+                future = pool.submit(func, *args)
+            future.add_done_callback(finished.put)
+            return future
+
+        def drain(zone_id):
+            """Starts queued writes for a zone up to its concurrency limit."""
+            while queued[zone_id] and in_flight[zone_id] < per_zone:
+                items = queued[zone_id].popleft()
+                in_flight[zone_id] += 1
+                if len(items) == 1:
+                    _, _, record, fields, _ = items[0]
+                    future = start(patch_dns_record, api_key, email, zone_id, record, fields)
+                else:
+                    writes = [(record, fields) for _, _, record, fields, _ in items]
+                    future = start(batch_patch_dns_records, api_key, email, zone_id, writes)
+                pending[future] = (zone_id, items)
+
+        def enqueue(zone_id, stale):
+            """Queues stale (spec, ip, record, fields, from_cache) items as batch chunks or single PATCHes."""
+            if batch_size > 1 and len(stale) > 1 and zone_id not in batch_unavailable_zones:
+                for start in range(0, len(stale), batch_size):
+                    queued[zone_id].append(stale[start:start + batch_size])
+            else:
+                queued[zone_id].extend([item] for item in stale)
+
+        def request_listing(zone_id, targets):
+            """Lists a zone (once at a time) to check the given (spec, ip) targets."""
+            if zone_id not in unlisted:
+                in_flight[zone_id] += 1
+                pending[start(list_dns_records, api_key, email, zone_id)] = (zone_id, None)
+            unlisted.setdefault(zone_id, []).extend(targets)
+
+        for zone_id, targets in by_zone.items():
+            cached_ids = [record_id_cache.get(zone_id, spec.name, spec.type) for spec, _ in targets]
+            if all(cached_ids) and all(spec.key in known_stale for spec, _ in targets):
+                enqueue(zone_id, [(spec, ip, {"id": record_id, "name": spec.name, "type": spec.type},
+                                   spec.write_fields(ip), True)
+                                  for (spec, ip), record_id in zip(targets, cached_ids)])
+                drain(zone_id)
+            else:
+                request_listing(zone_id, targets)
+
+        while pending:
+            done = [finished.get()]
+            while not finished.empty():
+                done.append(finished.get())
+            for future in done:
+                zone_id, items = pending.pop(future)
+                in_flight[zone_id] -= 1
+                if items is not None:  # A write finished
+                    outcome = future.result()
+                    if outcome is None and len(items) > 1:  # No batch endpoint: fall back to one PATCH per record
+                        batch_unavailable_zones.add(zone_id)
+                        queued[zone_id].extendleft([item] for item in reversed(items))
+                        drain(zone_id)
+                        continue
+                    if not isinstance(outcome, dict):
+                        outcome = {items[0][2]["id"]: outcome}
+                    missing = []
+                    for spec, ip, record, _, from_cache in items:
+                        updated = outcome.get(record["id"], False)
+                        if updated is None and from_cache:
+                            missing.append((spec, ip))  # The cached ID is gone: look the record up again
+                        elif updated is None:
+                            yield spec, RESULT_NOT_FOUND
+                        else:
+                            yield spec, RESULT_UPDATED if updated else RESULT_FAILED
+                    if missing:
+                        request_listing(zone_id, missing)
+                else:  # The zone listing finished
+                    listing = future.result()
+                    targets = unlisted.pop(zone_id)
+                    if listing is None:
+                        for spec, _ in targets:
+                            yield spec, RESULT_NOT_FOUND
+                        continue
+                    existing = {(normalize_record_name(r["name"]), r["type"]): r for r in listing}
+                    stale = []
+                    for spec, ip in targets:
+                        record = existing.get((normalize_record_name(spec.name), spec.type))
+                        if record is None:
+                            yield spec, RESULT_NOT_FOUND
+                            continue
+                        record_id_cache.put(zone_id, spec.name, spec.type, record["id"])
+                        fields = spec.changes(record, ip)
+                        if not fields:
+                            yield spec, RESULT_UP_TO_DATE
+                        else:
+                            stale.append((spec, ip, record, fields, False))
+                    enqueue(zone_id, stale)
+                drain(zone_id)
+
+
+def describe_result(record_name: str, result: str, ip: str) -> str:
+    """Formats a reconcile result as a status line for the result box."""
+    if result == RESULT_UP_TO_DATE:
+        return f"Info: {record_name} is already up-to-date.\n"
+    if result == RESULT_UPDATED:
+        return f"Success: Updated {record_name} to {ip}.\n"
+    if result == RESULT_NOT_FOUND:
+        return f"Error: Could not retrieve DNS record for {record_name}.\n"
+    return f"Error: Failed to update {record_name}.\n"
+
+class UpdateState:
+    """Last-known-good public IP and the record contents confirmed for it.
+
+    While the public IP matches the cached one and every target record was
+    confirmed by a reconcile less than verify_interval minutes ago, a cycle can
+    skip Cloudflare entirely; records added or changed since are reconciled on
+    their own.
+
+    The state, the record ID cache and the zone index are persisted next to
+    config.ini as an append-only journal: every save appends one line holding
+    only what changed since the previous save, prefixed with its CRC32. A line
+    torn by a crash fails its CRC (or lacks its newline) and is dropped on the
+    next load, together with anything after it. After JOURNAL_COMPACT_ENTRIES
+    appends the journal is rewritten as a single snapshot line, atomically.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.ip = None
+        self.records = {}  # RecordSpec.key -> RecordSpec.fingerprint last confirmed on Cloudflare
+        self.last_verified = 0.0  # Wall-clock time of the last completed reconcile
+        # What the journal on disk holds, so a save only appends the difference
+        self.saved = {'ip': None, 'last_verified': 0.0, 'records': {}, 'record_ids': {}, 'zone_index': None}
+        self.appended = 0  # Entries appended since the last snapshot
+        self.needs_compaction = True  # No valid journal yet, or its tail may be damaged
+
+    @staticmethod
+    def encode_entry(entry: dict) -> bytes:
+        payload = json.dumps(entry, separators=(',', ':')).encode()
+        return b'%08x %s\n' % (zlib.crc32(payload), payload)
+
+    @staticmethod
+    def decode_entry(line: bytes) -> dict | None:
+        """Returns the entry of a journal line, or None if the line is torn or corrupt."""
+        if not line.endswith(b'\n'):
+            return None
+        checksum, _, payload = line[:-1].partition(b' ')
+        try:
+            if int(checksum, 16) != zlib.crc32(payload):
+                return None
+            entry = json.loads(payload)
+        except ValueError:
+            return None
+        return entry if isinstance(entry, dict) else None
+
+    def apply(self, entry: dict):
+        """Applies a snapshot or delta entry to the saved view."""
+        if entry.get('snapshot'):
+            self.saved = {'ip': None, 'last_verified': 0.0, 'records': {}, 'record_ids': {}, 'zone_index': None}
+        for field in ('ip', 'last_verified', 'zone_index'):
+            if field in entry:
+                self.saved[field] = entry[field]
+        for field in ('records', 'record_ids'):
+            for key, value in entry.get(field, {}).items():
+                if value is None:
+                    self.saved[field].pop(key, None)
+                else:
+                    self.saved[field][key] = value
+
+    def load(self):
+        """Replays the journal; a missing journal leaves the state empty, a torn tail is cut off."""
+        global zone_index
+        try:
+            with open(self.path, 'rb') as journal:
+                lines = journal.readlines()
+        except FileNotFoundError:
+            self.load_legacy()
+            return
+        except OSError as e:
+            logging.error(f"Ignoring unreadable state journal {self.path}: {e}")
+            return
+
+        valid = 0
+        for line in lines:
+            entry = self.decode_entry(line)
+            if entry is None:
+                logging.error(f"Ignoring {len(lines) - valid} damaged line(s) at the end of {self.path}")
+                break
+            self.apply(entry)
+            valid += 1
+        self.appended = max(valid - 1, 0)
+        self.needs_compaction = valid == 0 or valid < len(lines)
+
+        try:
+            self.ip = self.saved['ip']
+            self.last_verified = float(self.saved['last_verified'])
+            self.records = dict(self.saved['records'])
+            record_id_cache.load_json(self.saved['record_ids'])
+            if self.saved['zone_index']:
+                saved = self.saved['zone_index']
+                zone_index = ZoneIndex(saved['zones'], saved['owner'], saved['built_at'])
+        except (ValueError, TypeError, KeyError, AttributeError) as e:
+            logging.error(f"Ignoring unreadable state journal {self.path}: {e}")
+            self.needs_compaction = True
+
+    def load_legacy(self):
+        """Imports the JSON state file written by earlier versions, if there is one."""
+        global zone_index
+        legacy_path = os.path.join(os.path.dirname(self.path), LEGACY_STATE_FILE_NAME)
+        try:
+            with open(legacy_path) as statefile:
+                data = json.load(statefile)
+            self.ip = data.get('ip')
+            self.records = dict(data.get('records', {}))
+            self.last_verified = float(data.get('last_verified', 0.0))
+            record_id_cache.load_json(data.get('record_ids', {}))
+            if data.get('zone_index'):
+                saved = data['zone_index']
+                zone_index = ZoneIndex(saved['zones'], saved['owner'], saved['built_at'])
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, TypeError, AttributeError) as e:
+            logging.error(f"Ignoring unreadable state file {legacy_path}: {e}")
+
+    def current(self) -> dict:
+        """Returns the state in the form the journal stores it."""
+        saved_index = None
+        if zone_index is not None:
+            saved_index = {'zones': zone_index.zones, 'owner': zone_index.owner, 'built_at': zone_index.built_at}
+        # The ID cache is shared by all accounts of the headless engine; keep the IDs of this state's records
+        record_ids = {key: value for key, value in record_id_cache.to_json().items() if key in self.records}
+        return {'ip': self.ip, 'last_verified': self.last_verified, 'records': dict(self.records),
+                'record_ids': record_ids, 'zone_index': saved_index}
+
+    @staticmethod
+    def changes(old: dict, new: dict, compare=lambda value: value) -> dict:
+        """Returns the entries of new that differ from old, and None for keys that are gone."""
+        changed = {key: value for key, value in new.items() if key not in old or compare(old[key]) != compare(value)}
+        changed.update(dict.fromkeys(old.keys() - new.keys()))
+        return changed
+
+    def save(self):
+        """Appends what changed since the last save to the journal, compacting it when due."""
+        current = self.current()
+        if self.needs_compaction or self.appended >= JOURNAL_COMPACT_ENTRIES:
+            self.compact(current)
+            return
+
+        entry = {field: current[field] for field in ('ip', 'last_verified') if current[field] != self.saved[field]}
+        records = self.changes(self.saved['records'], current['records'])
+        # A record ID whose expiry merely moved is not worth a journal entry
+        record_ids = self.changes(self.saved['record_ids'], current['record_ids'], lambda saved: saved[0])
+        if records:
+            entry['records'] = records
+        if record_ids:
+            entry['record_ids'] = record_ids
+        built_at = [index and index['built_at'] for index in (self.saved['zone_index'], current['zone_index'])]
+        if built_at[0] != built_at[1]:
+            entry['zone_index'] = current['zone_index']
+        if not entry:
+            return
+
+        try:
+            with open(self.path, 'ab') as journal:
+                journal.write(self.encode_entry(entry))
+                journal.flush()
+                os.fsync(journal.fileno())
+        except OSError as e:
+            logging.error(f"Failed to append to state journal {self.path}: {e}")
+            self.needs_compaction = True  # The tail may be torn; rewrite the journal next time
+            return
+        self.apply(entry)
+        self.appended += 1
+
+    def compact(self, current: dict):
+        """Rewrites the journal as a single snapshot entry, atomically."""
+        tmp_path = self.path + '.tmp'
+        try:
+            with open(tmp_path, 'wb') as journal:
+                journal.write(self.encode_entry({'snapshot': True, **current}))
+                journal.flush()
+                os.fsync(journal.fileno())
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logging.error(f"Failed to save state journal {self.path}: {e}")
+            return
+        self.apply({'snapshot': True, **current})
+        self.appended = 0
+        self.needs_compaction = False
+        legacy_path = os.path.join(os.path.dirname(self.path), LEGACY_STATE_FILE_NAME)
+        if os.path.exists(legacy_path):
+            try:
+                os.remove(legacy_path)
+            except OSError as e:
+                logging.error(f"Failed to remove old state file {legacy_path}: {e}")
+
+    def is_fresh(self, ip: str) -> bool:
+        """Tells whether the public IP is unchanged and the records were verified recently."""
+        return ip == self.ip and time.time() - self.last_verified < verify_interval * 60
+
+    def unconfirmed(self, desired: list[tuple[RecordSpec, str]]) -> list[tuple[RecordSpec, str]]:
+        """Returns the desired records not confirmed in their desired state, e.g. ones added since."""
+        return [(spec, ip) for spec, ip in desired if self.records.get(spec.key) != spec.fingerprint(ip)]
+
+
+def get_update_state() -> UpdateState:
+    """Returns the shared UpdateState, loading it from next to config.ini on first use."""
+    global update_state
+    if update_state is None:
+        config_dir = os.path.dirname(os.path.abspath(config_path))
+        update_state = UpdateState(os.path.join(config_dir, STATE_FILE_NAME))
+        update_state.load()
+    return update_state
+
+
+def record_cycle(func):
+    """Decorator recording the duration and outcome of every update cycle in cycle_seconds."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        outcome = "error"  # An exception escaped
+        try:
+            result = func(*args, **kwargs)
+            outcome = {True: "updated", False: "unchanged"}.get(result, "failed")
+            return result
+        finally:
+            cycle_seconds.observe(time.perf_counter() - started, outcome)
+    return wrapper
 
-            record_name_entry.delete(0, tk.END)
-            record_name_entry.insert(0, config['DEFAULT'].get('RecordNames', ''))
 
-            record_type_entry.delete(0, tk.END)
-            record_type_entry.insert(0, config['DEFAULT'].get('RecordType', ''))
+def ip_lookups(records: list[RecordSpec]) -> list[tuple[str | None, int]]:
+    """Lists the (ip_source, family) lookups the records need, the public address of each family first."""
+    public = {spec.family for spec in records if not spec.ip_source} or {4}
+    return list(dict.fromkeys([(None, family) for family in sorted(public)] +
+                              [(spec.ip_source, spec.family) for spec in records]))
 
-            interval_entry.delete(0, tk.END)
-            interval_entry.insert(0, config['DEFAULT'].get('Interval', ''))
-    except OSError as e:
-        messagebox.showerror("Error",f"Failed to load config file: {e}")
-        logging.error(f"Failed to load config file: {e}")
 
+def lookup_ips(lookups: list[tuple[str | None, int]]) -> dict[tuple[str | None, int], str | None]:
+    """Runs (ip_source, family) lookups in parallel and returns their addresses (None where a lookup failed)."""
+    if not lookups:
+        return {}
+    with ThreadPoolExecutor(max_workers=len(lookups)) as pool:
+        futures = [pool.submit(get_source_ip, source, family) for source, family in lookups]
+    return {lookup: future.result() for lookup, future in zip(lookups, futures)}
 
-# Get the DNS record ID for a given domain record
-def get_dns_record_id(api_key: str, email: str, zone_id: str, record_name: str, record_type: str) -> str | None:
-    """Retrieves the DNS record ID from Cloudflare.
+
+@record_cycle
+def run_update_cycle(settings: dict, emit, force: bool = False,
+                     known_ips: dict[tuple[str | None, int], str | None] | None = None) -> bool | None:
+    """Runs one full update cycle. Safe to call off the Tk main thread.
 
     Args:
-        api_key: The Cloudflare API key.
-        email: The Cloudflare account email.
-        zone_id: The Cloudflare zone ID.
-        record_name: The DNS record name.
-        record_type: The DNS record type.
+        settings: Snapshot of the configuration as returned by read_settings.
+        emit: Callable taking (kind, value); receives ("ip", address) once the
+            public IP is known (IPv4 and IPv6 joined by " / " for dual-stack
+            records) and ("status", line) for every status line.
+        force: Check Cloudflare even if the cached state says nothing changed.
+        known_ips: Addresses already looked up for other accounts, as returned by
+            lookup_ips; only the lookups missing from it are run.
+
+    Requests are retried on transient failures until the cycle has run for
+    CycleDeadline seconds; after that, remaining requests fail fast.
 
     Returns:
-        The DNS record ID, or None if an error occurred.
+        True if any record was updated, False if none needed updating, or None
+        if the cycle could not run (no public IP or bad configuration).
     """
-    headers = {
-        "X-Auth-Email": email,
-        "X-Auth-Key": api_key,
-        "Content-Type": "application/json"
-    }
+    global cycle_deadline
+    cycle_deadline = time.monotonic() + cycle_deadline_seconds
     try:
-        response = requests.get(
-            f"https://api.cloudflare.com/client/v4/zones/{zone_id}/dns_records?type={record_type}&name={record_name}",
-            headers=headers, timeout=10
-        )
-        response.raise_for_status()
-        records = response.json()["result"]
-        if records:
-            return records[0]["id"]
-        else:
-            messagebox.showinfo("Info", f"No matching DNS record found for {record_name}")
+        try:
+            records = desired_records(settings)
+        except (OSError, ValueError) as e:
+            emit("status", f"Error: {e}\n")
             return None
-    except requests.exceptions.RequestException as e:
-        messagebox.showerror("Error", f"API request failed: {e}")
-        logging.error(f"API request failed: {e}")
-        return None
-    except requests.exceptions.Timeout as e:
-        messagebox.showerror("Error", f"API request timed out: {e}")
-        logging.error(f"API request timed out: {e}")
-        return None
 
-# Check the current IP content of a DNS record
-def check_dns_record(api_key: str, email: str, zone_id: str, record_name: str, record_type: str) -> str | None:
-    """Checks the current IP address of a DNS record.
+        # The public IPv4 and IPv6 addresses (and those of any ip_source) are looked up in parallel
+        lookups = ip_lookups(records)
+        known_ips = known_ips or {}
+        ips = lookup_ips([lookup for lookup in lookups if lookup not in known_ips])
+        ips.update({lookup: known_ips[lookup] for lookup in lookups if lookup in known_ips})
+        public_ips = [ips[source, family] for source, family in lookups if source is None and ips[source, family]]
+        if not public_ips:
+            emit("status", "Error: Could not determine the public IP.\n")
+            return None
+        current_ip = " / ".join(public_ips)
+        emit("ip", current_ip)
+        for (source, family), ip in ips.items():
+            if not ip and source:
+                emit("status", f"Error: Could not determine an IPv{family} address from {source}.\n")
+            elif not ip:
+                emit("status", f"Error: Could not determine the public IPv{family} address.\n")
 
-    Args:
-        api_key: The Cloudflare API key.
-        email: The Cloudflare account email.
-        zone_id: The Cloudflare zone ID.
-        record_name: The DNS record name.
-        record_type: The DNS record type.
+        state = get_update_state()
+        if state.ip and state.ip != current_ip:
+            ip_changes_total.inc()
+        if not all(spec.zone_id for spec in records):
+            records = resolve_zones(settings['api_key'], settings['email'], records)
+            for spec in records:
+                if not spec.zone_id:
+                    emit("status", f"Error: No zone in this account matches {spec.name}.\n")
+            records = [spec for spec in records if spec.zone_id]
 
-    Returns:
-        The current IP address of the DNS record, or None if not found.
-    """
-    headers = {
-        "X-Auth-Email": email,
-        "X-Auth-Key": api_key,
-        "Content-Type": "application/json"
+        # A and AAAA records of a zone share its listing
+        desired = [(spec, ips[spec.ip_source, spec.family]) for spec in records if ips[spec.ip_source, spec.family]]
+        target_ip = {spec.key: ip for spec, ip in desired}
+        # Forget records that are no longer configured
+        removed = state.records.keys() - target_ip.keys()
+        for key in removed:
+            del state.records[key]
+
+        # Public IP unchanged and recently verified: only records added or changed since need Cloudflare calls
+        partial = not force and state.is_fresh(current_ip)
+        if partial:
+            desired = state.unconfirmed(desired)
+            if not desired:
+                if removed:
+                    state.save()
+                return False
+
+        # A rejected API token stops the cycle; zones the token may not edit are left out instead of failing writes
+        credentials = credentials_for(settings['api_key'], settings['email'])
+        if credentials.verify() is False:
+            emit("status", "Error: Cloudflare reports the API token as expired or disabled.\n")
+            return None
+        denied = [(spec, ip) for spec, ip in desired if not credentials.may_edit_dns(spec.zone_id)]
+        for spec, _ in denied:
+            emit("status", f"Error: The API token may not edit DNS records in zone {spec.zone_id} ({spec.name}).\n")
+            records_total.inc(RESULT_FAILED)
+        if denied:
+            desired = [(spec, ip) for spec, ip in desired if credentials.may_edit_dns(spec.zone_id)]
+
+        # Records confirmed in another state are known to be stale and can be written by cached ID without a listing
+        known_stale = {spec.key for spec, ip in desired
+                       if state.records.get(spec.key) not in (None, spec.fingerprint(ip))}
+        update_performed = False
+        for spec, result in reconcile_records(settings['api_key'], settings['email'], desired, known_stale):
+            emit("status", describe_result(spec.name, result, target_ip[spec.key]))
+            records_total.inc(result)
+            if result in (RESULT_UP_TO_DATE, RESULT_UPDATED):
+                state.records[spec.key] = spec.fingerprint(target_ip[spec.key])
+            else:
+                state.records.pop(spec.key, None)
+            if result == RESULT_UPDATED:
+                update_performed = True
+
+        if not partial:
+            state.ip = current_ip
+            state.last_verified = time.time()
+        state.save()
+        return update_performed
+    finally:
+        cycle_deadline = None
+
+
+def read_settings() -> dict:
+    """Snapshots the input fields so a worker thread never touches Tk widgets."""
+    return {
+        'api_key': api_key_entry.get(),
+        'email': email_entry.get(),
+        'zone_ids': zone_id_entry.get(),
+        'record_names': record_name_entry.get(),
+        'record_type': record_type_entry.get(),
+        'records_file': records_file,
     }
+
+
+def update_worker(settings: dict, auto: bool):
+    """Worker thread body: runs one cycle and reports back through ui_queue."""
+    started = time.perf_counter()
     try:
-        response = requests.get(
-            f"https://api.cloudflare.com/client/v4/zones/{zone_id}/dns_records?type={record_type}&name={record_name}",
-            headers=headers, timeout=10
-        )
-        response.raise_for_status()
-        records = response.json()["result"]
-        if records:
-            return records[0]['content']  # Return the IP address of the DNS record
-    except requests.exceptions.RequestException as e:
-        logging.error(f"Failed to check DNS record: {e}")
-        return None
-    except requests.exceptions.Timeout as e:
-        logging.error(f"Failed to check DNS record, request timed out: {e}")
-        return None
+        # Manual updates always check Cloudflare; automatic ones may rely on the cached state
+        updated = run_update_cycle(settings, lambda kind, value: ui_queue.put((kind, value)), force=not auto)
+    except Exception as e:  # Never let the worker die silently and wedge update_in_progress
+        logging.exception(f"Update cycle failed: {e}")
+        updated = None
+    ui_queue.put(("done", (auto, updated, time.perf_counter() - started)))
 
 
-# Update a single DNS record and return True if successful
-def update_dns_record_for_domain(api_key: str, email: str, zone_id: str, record_name: str, record_type: str, ip: str) -> bool:
-    """Updates a single DNS record on Cloudflare.
+def start_update_cycle(auto: bool) -> bool:
+    """Starts an update cycle on a background thread unless one is already running.
 
     Args:
-        api_key: The Cloudflare API key.
-        email: The Cloudflare account email.
-        zone_id: The Cloudflare zone ID.
-        record_name: The DNS record name.
-        record_type: The DNS record type.
-        ip: The new IP address.
+        auto: Whether the cycle was triggered by the auto update schedule.
 
     Returns:
-        True if the update was successful, False otherwise.
+        True if a cycle was started.
     """
-    record_id = get_dns_record_id(api_key, email, zone_id, record_name, record_type)
-    if not record_id:
+    global update_in_progress
+    if update_in_progress:
         return False
+    update_in_progress = True
+    ui_latency_probe.start()
+    threading.Thread(target=update_worker, args=(read_settings(), auto), daemon=True).start()
+    return True
 
-    headers = {
-        "X-Auth-Email": email,
-        "X-Auth-Key": api_key,
-        "Content-Type": "application/json"
-    }
 
-    # Fetch existing DNS record to preserve proxied setting
-    try:
-        resp = requests.get(
-            f"https://api.cloudflare.com/client/v4/zones/{zone_id}/dns_records/{record_id}",
-            headers=headers, timeout=10
-        )
-        resp.raise_for_status()
-        existing = resp.json().get("result", {})
-        proxied_flag = existing.get("proxied", False)
-    except requests.exceptions.RequestException:
-        proxied_flag = False
-
-    data = {
-        "type": record_type,
-        "name": record_name,
-        "content": ip,
-        "ttl": 1,  # Automatic TTL
-        "proxied": proxied_flag
-    }
+# The status box keeps the newest StatusLines lines (overridable in config.ini)
+DEFAULT_STATUS_LINES = 1000
+STATUS_SEVERITIES = ("Info", "Success", "Error")
+status_lines = DEFAULT_STATUS_LINES
 
-    try:
-        response = requests.put(
-            f"https://api.cloudflare.com/client/v4/zones/{zone_id}/dns_records/{record_id}",
-            json=data, headers=headers, timeout=10
-        )
-        response.raise_for_status()
-        return True  # Successful update
 
-    except requests.exceptions.RequestException as e:
-        messagebox.showerror("Error",f"Failed to update {record_name}: {e}")
-        logging.error(f"Failed to update {record_name}: {e}")
-        return False
-    except requests.exceptions.Timeout as e:
-        messagebox.showerror("Error",f"Failed to update {record_name}, request timed out: {e}")
-        logging.error(f"Failed to update {record_name}, request timed out: {e}")
-        return False
+class StatusLine:
+    """One line of the status box."""
 
-# Manual update triggered by the button
-def manual_update():
-    """Performs a manual DNS update."""
-    current_ip = get_public_ip()
-    if not current_ip:
-        return
+    __slots__ = ('seq', 'severity', 'text')
 
-    ip_label.config(text=current_ip)
-    record_names = [r.strip() for r in record_name_entry.get().split(",") if r.strip()]
-    zone_ids = [z.strip() for z in zone_id_entry.get().split(",") if z.strip()]
+    def __init__(self, seq: int, severity: str, text: str):
+        self.seq = seq  # Position in the whole session, so views can tell new lines from old
+        self.severity = severity
+        self.text = text
 
-    # If only one zone ID is provided, use it for all record names.
-    if len(zone_ids) == 1 and len(record_names) > 1:
-        zone_ids = zone_ids * len(record_names)
-    elif len(zone_ids) != len(record_names):
-        messagebox.showerror("Error", "Number of Zone IDs must be either 1 or match the number of Record Names.")
-        return
 
-    for record_name, zone_id in zip(record_names, zone_ids):
-        dns_record_ip = check_dns_record(api_key_entry.get(), email_entry.get(), zone_id, record_name, record_type_entry.get())
-        if dns_record_ip == current_ip:
-            result_text.insert(tk.END, f"Info: {record_name} is already up-to-date.\n")
-            continue
-        elif dns_record_ip is None:
-            result_text.insert(tk.END, f"Error: Could not retrieve DNS record for {record_name}.\n")
-            continue
+class StatusLog:
+    """Ring buffer holding the newest status lines; the oldest are dropped once max_lines is reached."""
+
+    def __init__(self, max_lines: int = DEFAULT_STATUS_LINES):
+        self.lines = deque(maxlen=max(1, max_lines))
+        self.total = 0  # Lines appended so far, including dropped ones
 
-        if update_dns_record_for_domain(api_key_entry.get(), email_entry.get(), zone_id, record_name, record_type_entry.get(), current_ip):
-            result_text.insert(tk.END, f"Success: Updated {record_name} to {current_ip}.\n")
+    @staticmethod
+    def severity_of(line: str) -> str:
+        """Reads the severity from a line's "Error:" / "Success:" / "Info:" prefix."""
+        prefix = line.split(":", 1)[0]
+        return prefix if prefix in STATUS_SEVERITIES else "Info"
+
+    def append(self, text: str):
+        """Adds every non-empty line of text."""
+        for line in text.splitlines():
+            if line.strip():
+                self.lines.append(StatusLine(self.total, self.severity_of(line), line))
+                self.total += 1
+
+    def resize(self, max_lines: int):
+        """Changes the line cap, dropping the oldest lines if it shrank."""
+        self.lines = deque(self.lines, maxlen=max(1, max_lines))
+
+    def since(self, seq: int) -> list[StatusLine]:
+        """Returns the lines still held whose seq is at least the given one, oldest first."""
+        new = []
+        for line in reversed(self.lines):
+            if line.seq < seq:
+                break
+            new.append(line)
+        new.reverse()
+        return new
+
+
+class StatusLogView:
+    """Shows a StatusLog in the window, with severity and record filters.
+
+    Only the lines that fit the widget are ever inserted into the Text, so
+    redraws cost the same however long the log is. The view follows new lines
+    while it is scrolled to the bottom.
+    """
+
+    def __init__(self, parent, log: StatusLog, height: int = 10, width: int = 80):
+        self.log = log
+        self.height = height
+        self.top = 0  # Index in self.lines of the first visible line
+        self.follow = True
+        self.lines = deque()  # Lines of the log that pass the filters
+        self.seen = 0  # Seq of the first log line not yet filtered into self.lines
+
+        self.frame = ttk.Frame(parent)
+        filters = ttk.Frame(self.frame)
+        ttk.Label(filters, text="Show:").pack(side=tk.LEFT)
+        self.severity = tk.StringVar(value="All")
+        ttk.Combobox(filters, textvariable=self.severity, values=("All",) + STATUS_SEVERITIES,
+                     state="readonly", width=8).pack(side=tk.LEFT)
+        ttk.Label(filters, text="Record:").pack(side=tk.LEFT, padx=(10, 0))
+        self.record = tk.StringVar()
+        ttk.Entry(filters, textvariable=self.record, width=30).pack(side=tk.LEFT)
+        filters.pack(fill=tk.X)
+
+        # No wrapping, so every log line is exactly one row of the widget
+        self.text = tk.Text(self.frame, height=height, width=width, wrap=tk.NONE, state=tk.DISABLED)
+        self.scrollbar = ttk.Scrollbar(self.frame, command=self.on_scroll)
+        self.text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.text.bind(sequence, self.on_wheel)
+        self.severity.trace_add("write", lambda *args: self.refilter())
+        self.record.trace_add("write", lambda *args: self.refilter())
+
+    def pack(self, **kwargs):
+        self.frame.pack(**kwargs)
+
+    def matches(self, line: StatusLine) -> bool:
+        severity = self.severity.get()
+        if severity != "All" and line.severity != severity:
+            return False
+        record = self.record.get().strip().lower()
+        return not record or record in line.text.lower()
+
+    def refilter(self):
+        """Rebuilds the filtered lines after a filter changed."""
+        self.lines = deque(line for line in self.log.lines if self.matches(line))
+        self.seen = self.log.total
+        self.follow = True
+        self.render()
+
+    def refresh(self):
+        """Picks up lines appended to the log since the last refresh and redraws once."""
+        self.lines.extend(line for line in self.log.since(self.seen) if self.matches(line))
+        self.seen = self.log.total
+        oldest = self.log.lines[0].seq if self.log.lines else self.seen
+        while self.lines and self.lines[0].seq < oldest:  # Dropped from the ring buffer
+            self.lines.popleft()
+            self.top -= 1
+        self.render()
+
+    def render(self):
+        last_top = max(0, len(self.lines) - self.height)
+        self.top = last_top if self.follow else min(max(0, self.top), last_top)
+        visible = itertools.islice(self.lines, self.top, self.top + self.height)
+        self.text.configure(state=tk.NORMAL)
+        self.text.delete("1.0", tk.END)
+        self.text.insert(tk.END, "\n".join(line.text for line in visible))
+        self.text.configure(state=tk.DISABLED)
+        if self.lines:
+            self.scrollbar.set(self.top / len(self.lines), min(1.0, (self.top + self.height) / len(self.lines)))
         else:
-            result_text.insert(tk.END, f"Error: Failed to update {record_name}.\n")
+            self.scrollbar.set(0.0, 1.0)
 
+    def scroll_to(self, top: int):
+        self.top = top
+        self.follow = top >= len(self.lines) - self.height
+        self.render()
 
-# Dynamic auto update using tkinter's after() for non-blocking scheduling
-def schedule_next_update(seconds: int):
-    """Schedules the next automatic update.
+    def on_scroll(self, action: str, amount: str, unit: str = "units"):
+        """Scrollbar command: ("moveto", fraction) or ("scroll", count, "units" / "pages")."""
+        if action == "moveto":
+            self.scroll_to(int(float(amount) * len(self.lines)))
+        else:
+            self.scroll_to(self.top + int(amount) * (self.height if unit == "pages" else 1))
 
-    Args:
-        seconds: The number of seconds until the next update.
+    def on_wheel(self, event):
+        up = event.num == 4 or getattr(event, "delta", 0) > 0
+        self.scroll_to(self.top + (-3 if up else 3))
+        return "break"
+
+
+def poll_ui_queue():
+    """Applies status lines and IP changes queued by worker threads. Runs on the Tk main thread.
+
+    Status lines are collected over the whole tick and appended to the status
+    log in one go, so the view is redrawn at most once per tick.
     """
-    global auto_update_running, auto_update_id
+    global update_in_progress
+    statuses = []
+    try:
+        while True:
+            kind, value = ui_queue.get_nowait()
+            if kind == "status":
+                statuses.append(value)
+            elif kind == "ip":
+                ip_label.config(text=value)
+            elif kind == "done":
+                auto, updated, duration = value
+                update_in_progress = False
+                apply_pending_network_backend()
+                stall = ui_latency_probe.stop()
+                statuses.append(f"Info: Cycle took {duration:.2f} s, longest UI stall {stall * 1000:.0f} ms.\n")
+                if auto:
+                    finish_auto_update(updated)
+            elif kind == "ip-event":
+                on_ip_event()
+    except queue.Empty:
+        pass
+    if statuses:
+        status_log.append("".join(statuses))
+        status_view.refresh()
+    root.after(UI_POLL_MS, poll_ui_queue)
+
+
+class UiLatencyProbe:
+    """Measures the longest gap the Tk main loop goes without servicing its timers.
+
+    While running, a heartbeat is re-armed every `interval_ms`; any lateness
+    beyond that is time during which the window was frozen.
+    """
+
+    def __init__(self, widget, interval_ms: int = 20):
+        self.widget = widget
+        self.interval_ms = interval_ms
+        self.max_stall = 0.0
+        self._last = 0.0
+        self._after_id = None
+
+    def start(self):
+        """Resets the measurement and starts the heartbeat."""
+        self.stop()
+        self.max_stall = 0.0
+        self._last = time.perf_counter()
+        self._after_id = self.widget.after(self.interval_ms, self._tick)
+
+    def stop(self) -> float:
+        """Stops the heartbeat.
+
+        Returns:
+            The longest stall in seconds since start().
+        """
+        if self._after_id:
+            self.widget.after_cancel(self._after_id)
+            self._after_id = None
+        self._tick_once()
+        return self.max_stall
+
+    def _tick_once(self):
+        now = time.perf_counter()
+        if self._last:
+            self.max_stall = max(self.max_stall, now - self._last - self.interval_ms / 1000)
+        self._last = now
+
+    def _tick(self):
+        self._tick_once()
+        self._after_id = self.widget.after(self.interval_ms, self._tick)
+
+
+def fetch_initial_ip():
+    """Fills the IP label without blocking window startup.
+
+    The IP cached in the state journal is shown at once; the next update
+    cycle confirms it. Only without a cached IP is it looked up now.
+    """
+    cached_ip = get_update_state().ip
+    if cached_ip:
+        ip_label.config(text=f"{cached_ip} (cached)")
+        return
+
+    def worker():
+        ip = get_public_ip()
+        ui_queue.put(("ip", ip or "Unavailable"))
+    threading.Thread(target=worker, daemon=True).start()
+
+
+# Manual update triggered by the button
+def manual_update():
+    """Performs a manual DNS update in the background."""
+    if not start_update_cycle(auto=False):
+        ui_queue.put(("status", "Info: An update is already in progress.\n"))
+
+
+# Dynamic auto update using tkinter's after() for non-blocking scheduling
+def schedule_next_update():
+    """Refreshes the countdown and runs the automatic update once the scheduler says it is due."""
+    global auto_update_id
     if not auto_update_running:
         countdown_label.config(text="Auto update stopped.")
         return
 
-    if seconds > 0:
-        mins, secs = divmod(seconds, 60)
-        countdown_label.config(text=f"Next check in: {mins:02d}:{secs:02d}")
-        auto_update_id = root.after(1000, schedule_next_update, seconds - 1)
+    remaining = update_scheduler.time_until_next()
+    if remaining > 0:
+        text, refresh_in = countdown_display(remaining)
+        countdown_label.config(text=text)
+        auto_update_id = root.after(math.ceil(refresh_in * 1000), schedule_next_update)
     else:
         perform_update()
 
 def perform_update():
-    """Performs the automatic DNS update."""
-    global auto_update_running
+    """Starts the automatic DNS update; finish_auto_update reschedules once it completes."""
     if not auto_update_running:
         return
 
-    current_ip = get_public_ip()
-    if not current_ip:
-        # If the IP could not be fetched, reschedule the next check
-        schedule_next_update(int(float(interval_entry.get()) * 60))
-        return
-
-    ip_label.config(text=current_ip)
-    record_names = [r.strip() for r in record_name_entry.get().split(",") if r.strip()]
-    zone_ids = [z.strip() for z in zone_id_entry.get().split(",") if z.strip()]
+    update_scheduler.mark_run()
+    countdown_label.config(text="Updating...")
+    if not start_update_cycle(auto=True):
+        # A manual update is still running; check again on the next interval
+        schedule_next_update()
 
-    if len(zone_ids) == 1 and len(record_names) > 1:
-        zone_ids = zone_ids * len(record_names)
-    elif len(zone_ids) != len(record_names):
-        result_text.insert(tk.END, "Error: Number of Zone IDs must be either 1 or match the number of Record Names.\n")
-        schedule_next_update(int(float(interval_entry.get()) * 60))
+def on_ip_event():
+    """Handles an IP-change event on the Tk main thread by re-evaluating the schedule."""
+    global auto_update_id
+    update_scheduler.notify()
+    if not auto_update_running or update_in_progress:
         return
+    if auto_update_id:
+        root.after_cancel(auto_update_id)
+        auto_update_id = None
+    schedule_next_update()
 
-    update_performed = False
-    for record_name, zone_id in zip(record_names, zone_ids):
-        dns_record_ip = check_dns_record(api_key_entry.get(), email_entry.get(), zone_id, record_name, record_type_entry.get())
-        if dns_record_ip == current_ip:
-            result_text.insert(tk.END, f"Info: {record_name} is already up-to-date.\n")
-            continue
-        elif dns_record_ip is None:
-            result_text.insert(tk.END, f"Error: Could not retrieve DNS record for {record_name}.\n")
-            continue
+def finish_auto_update(updated: bool | None):
+    """Reports the outcome of an automatic cycle and schedules the next one.
 
-        if update_dns_record_for_domain(api_key_entry.get(), email_entry.get(), zone_id, record_name, record_type_entry.get(), current_ip):
-            result_text.insert(tk.END, f"Success: Updated {record_name} to {current_ip}.\n")
-            update_performed = True
-        else:
-            result_text.insert(tk.END, f"Error: Failed to update {record_name}.\n")
+    Args:
+        updated: The return value of run_update_cycle.
+    """
+    if not auto_update_running:
+        return
 
-    if not update_performed:
-        result_text.insert(tk.END, f"No update necessary at {time.strftime('%Y-%m-%d %H:%M:%S')}.\n")
+    if updated is False:
+        ui_queue.put(("status", f"No update necessary at {time.strftime('%Y-%m-%d %H:%M:%S')}.\n"))
 
-    # Reschedule next update using the specified interval (in minutes)
-    interval_sec = int(float(interval_entry.get()) * 60)
-    schedule_next_update(interval_sec)
+    schedule_next_update()
 
 def start_auto_update():
     """Starts the automatic update process."""
-    global auto_update_running
-    auto_update_running = True
+    global auto_update_running, update_scheduler
     try:
-        interval_sec = int(float(interval_entry.get()) * 60)
+        interval_sec = float(interval_entry.get()) * 60
     except ValueError:
         messagebox.showerror("Error", "Please enter a valid number for the update interval.")
         return
-    schedule_next_update(interval_sec)
+    auto_update_running = True
+    update_scheduler = UpdateScheduler(interval_sec, debounce_delay)
+    update_scheduler.mark_run()  # The first check happens one interval from now
+    start_event_sources(lambda: ui_queue.put(("ip-event", None)))
+    schedule_next_update()
 
 def stop_auto_update():
     """Stops the automatic update process."""
@@ -349,72 +3570,538 @@ def toggle_api_key_visibility():
         api_key_entry.config(show="*")
         toggle_api_key_button.config(text="Show API Key")
 
+# Timers never sleep longer than this, so a deadline missed during suspend is noticed soon after resume
+MAX_TIMER_DELAY = 60
+# The countdown shows whole minutes, refreshed once a minute, until this many seconds are left
+COUNTDOWN_SECONDS_BELOW = 60
+SUSPEND_AWARE_CLOCK = getattr(time, 'CLOCK_BOOTTIME', None)  # Linux only
+
+
+def scheduler_clock() -> float:
+    """Monotonic seconds that keep counting while the machine is suspended, where the OS allows it.
+
+    time.monotonic() stops during suspend on Linux, which would postpone every
+    deadline by the time the laptop slept; CLOCK_BOOTTIME does not.
+    """
+    if SUSPEND_AWARE_CLOCK is not None:
+        return time.clock_gettime(SUSPEND_AWARE_CLOCK)
+    return time.monotonic()
+
+
+def countdown_display(remaining: float) -> tuple[str, float]:
+    """Formats the countdown and says when the text next changes.
+
+    Args:
+        remaining: Seconds until the next cycle, more than 0.
+
+    Returns:
+        The countdown text and the seconds until it needs refreshing (at most
+        MAX_TIMER_DELAY, and never past the deadline).
+    """
+    if remaining > COUNTDOWN_SECONDS_BELOW:
+        minutes = math.ceil(remaining / 60)
+        text = f"Next check in: {minutes} min"
+        # The text changes when a minute boundary is crossed
+        next_change = remaining - max((minutes - 1) * 60, COUNTDOWN_SECONDS_BELOW)
+    else:
+        mins, secs = divmod(math.ceil(remaining), 60)
+        text = f"Next check in: {mins:02d}:{secs:02d}"
+        next_change = remaining - (math.ceil(remaining) - 1)
+    return text, min(max(next_change, 0.001), MAX_TIMER_DELAY, remaining)
+
+
+class UpdateScheduler:
+    """Decides when the next update cycle is due.
+
+    A cycle runs when an IP-change event has settled (no further event for
+    `debounce` seconds, but at most MAX_EVENT_DELAY after the first one, so a
+    flapping address cannot postpone it forever), or when `safety_interval`
+    seconds have passed since the last cycle. Deadlines are absolute times on
+    the clock, computed from the last run rather than accumulated, so they do
+    not drift; deadlines missed while the machine slept collapse into a single
+    overdue cycle. The clock is injectable so the logic can be driven by a
+    simulated clock.
+    """
+
+    def __init__(self, safety_interval: float, debounce: float = DEFAULT_DEBOUNCE, clock=scheduler_clock):
+        self.safety_interval = safety_interval
+        self.debounce = debounce
+        self.clock = clock
+        self.last_run = None  # None means a cycle is due immediately
+        self.first_event = None
+        self.last_event = None
+        self._lock = threading.Lock()
+
+    def notify(self):
+        """Records an IP-change event. Safe to call from any thread."""
+        with self._lock:
+            now = self.clock()
+            if self.first_event is None:
+                self.first_event = now
+            self.last_event = now
+
+    def mark_run(self):
+        """Records that a cycle has started; pending events are covered by it."""
+        with self._lock:
+            self.last_run = self.clock()
+            self.first_event = self.last_event = None
+
+    def next_deadline(self) -> float:
+        """Returns the clock time at which the next cycle is due."""
+        with self._lock:
+            if self.last_run is None:
+                return self.clock()
+            deadline = self.last_run + self.safety_interval
+            if self.first_event is not None:
+                settled = min(self.last_event + self.debounce, self.first_event + MAX_EVENT_DELAY)
+                deadline = min(deadline, settled)
+            return deadline
+
+    def time_until_next(self) -> float:
+        """Returns the seconds until the next cycle is due, 0 if it is overdue."""
+        return max(0.0, self.next_deadline() - self.clock())
+
+
+class IpProbeSource:
+    """Event source that polls the public IP and calls back when it changes.
+
+    Meant for cheap providers (dns:// or local://): probing costs one IP lookup
+    and no Cloudflare calls, so it can run far more often than full cycles.
+    """
+
+    def __init__(self, interval: float, callback, resolve=None):
+        self.interval = interval
+        self.callback = callback
+        self.resolve = resolve or get_public_ip
+        self.last_ip = None
+        self._stop = threading.Event()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            ip = self.resolve()
+            if ip and self.last_ip and ip != self.last_ip:
+                ip_events_total.inc("probe")
+                self.callback()
+            self.last_ip = ip or self.last_ip
+
+    def stop(self):
+        self._stop.set()
+
+
+ip_probe = None
+
+
+def start_event_sources(callback):
+    """Starts the configured IP-change event sources.
+
+    Args:
+        callback: Called from a background thread whenever the IP may have changed.
+    """
+    global ip_probe
+    start_address_watcher(callback)
+    if ip_probe is not None and ip_probe.interval != probe_interval:
+        ip_probe.stop()
+        ip_probe = None
+    if ip_probe is None and probe_interval > 0:
+        ip_probe = IpProbeSource(probe_interval, callback)
+
+
+# The daemon watches its config files with inotify, or polls them where inotify is unavailable
+CONFIG_POLL_INTERVAL = 2
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_DELETE = 0x200
+CONFIG_WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE
+
+
+class ConfigWatcher:
+    """Calls back when one of the watched files is written, replaced or deleted.
+
+    On Linux the files' directories are watched with inotify (through ctypes,
+    so no extra dependency), which also catches editors that save by renaming
+    a temporary file over the original. Elsewhere, or if inotify cannot be
+    set up, the files' mtime and size are polled every CONFIG_POLL_INTERVAL
+    seconds.
+    """
+
+    def __init__(self, paths: list[str], callback):
+        self.callback = callback
+        self.paths = set()
+        self.watches = {}  # inotify watch descriptor -> directory
+        self.stamps = {}  # path -> (mtime_ns, size), polling fallback only
+        self._lock = threading.Lock()
+        self.libc = None
+        self.fd = self._init_inotify()
+        threading.Thread(target=self._run_inotify if self.fd is not None else self._run_polling, daemon=True).start()
+        self.watch(paths)
+
+    def _init_inotify(self) -> int | None:
+        """Returns an inotify file descriptor, or None if inotify is unavailable."""
+        if not sys.platform.startswith('linux'):
+            return None
+        try:
+            self.libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+            fd = self.libc.inotify_init1(os.O_CLOEXEC)
+        except (OSError, AttributeError) as e:
+            logging.error(f"inotify unavailable, polling config files instead: {e}")
+            return None
+        if fd < 0:
+            logging.error(f"inotify unavailable, polling config files instead: {os.strerror(ctypes.get_errno())}")
+            return None
+        return fd
+
+    @staticmethod
+    def _stamp(path: str) -> tuple[int, int] | None:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def watch(self, paths: list[str]):
+        """Adds files to the watch list (already watched ones are ignored)."""
+        with self._lock:
+            for path in paths:
+                path = os.path.abspath(path)
+                if path in self.paths:
+                    continue
+                self.paths.add(path)
+                self.stamps[path] = self._stamp(path)
+                directory = os.path.dirname(path)
+                if self.fd is not None and directory not in self.watches.values():
+                    wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), CONFIG_WATCH_MASK)
+                    if wd < 0:
+                        logging.error(f"Cannot watch {directory}: {os.strerror(ctypes.get_errno())}")
+                    else:
+                        self.watches[wd] = directory
+
+    def _run_inotify(self):
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except OSError as e:
+                logging.error(f"Stopped watching config files: {e}")
+                return
+            changed = False
+            offset = 0
+            while offset + 16 <= len(data):
+                wd, mask, cookie, length = struct.unpack_from('=iIII', data, offset)
+                name = data[offset + 16:offset + 16 + length].rstrip(b'\0')
+                offset += 16 + length
+                with self._lock:
+                    directory = self.watches.get(wd)
+                    if directory is not None and os.path.join(directory, os.fsdecode(name)) in self.paths:
+                        changed = True
+            if changed:
+                self.callback()
+
+    def _run_polling(self):
+        while True:
+            time.sleep(CONFIG_POLL_INTERVAL)
+            with self._lock:
+                changed = False
+                for path in self.paths:
+                    stamp = self._stamp(path)
+                    if stamp != self.stamps[path]:
+                        self.stamps[path] = stamp
+                        changed = True
+            if changed:
+                self.callback()
+
+
+# --- Headless daemon ---
+def print_status(kind: str, value: str):
+    """Status sink for headless mode: writes status lines to stdout with a timestamp."""
+    if kind == "status":
+        print(f"{time.strftime('%Y-%m-%d %H:%M:%S')} {value}", end="", flush=True)
+
+
+def account_state_path(config_path: str, name: str) -> str:
+    """Returns the state journal of an account: STATE_FILE_NAME for the DEFAULT account, a named one otherwise."""
+    config_dir = os.path.dirname(os.path.abspath(config_path))
+    if name == PRIMARY_ACCOUNT:
+        return os.path.join(config_dir, STATE_FILE_NAME)
+    safe_name = re.sub(r'[^A-Za-z0-9_.-]', '_', name)
+    return os.path.join(config_dir, STATE_FILE_NAME.replace('.state.', f'.{safe_name}.state.', 1))
+
+
+class Tenant:
+    """One Cloudflare account served by the headless engine.
+
+    Every account has its own schedule, rate budget, session, state journal and
+    zone index, while the connection pool, the record ID cache and IP discovery
+    are shared. The cycle code works on module globals, so the engine runs one
+    account's cycle at a time inside active(), which swaps the account's
+    objects in.
+    """
+
+    __slots__ = ('name', 'settings', 'records', 'scheduler', 'rate_limiter', 'state', 'zone_index', 'reload_due')
+
+    def __init__(self, name: str, state_path: str):
+        self.name = name
+        self.settings = None
+        self.records = None  # Desired records as of the last config load
+        self.scheduler = UpdateScheduler(0)
+        self.rate_limiter = RateLimiter()
+        self.state = UpdateState(state_path)
+        self.zone_index = None
+        self.reload_due = False  # Records changed since the last cycle
+        with self.active():
+            self.state.load()
+
+    @contextlib.contextmanager
+    def active(self):
+        """Makes this account's rate limiter, session, state and zone index the ones the cycle code uses."""
+        global update_state, zone_index, rate_limiter
+        saved = update_state, zone_index, rate_limiter, http_client.account
+        update_state, zone_index, rate_limiter = self.state, self.zone_index, self.rate_limiter
+        http_client.account = self.name
+        try:
+            yield self
+        finally:
+            self.zone_index = zone_index  # Possibly refreshed by the cycle
+            update_state, zone_index, rate_limiter, http_client.account = saved
+
+    def emit(self, kind: str, value: str):
+        """Status sink: print_status, with lines of accounts other than the DEFAULT one prefixed by the account name."""
+        if kind == "status" and self.name != PRIMARY_ACCOUNT:
+            value = f"[{self.name}] {value}"
+        print_status(kind, value)
+
+    def configure(self, settings: dict, records: list[RecordSpec]):
+        """Applies freshly loaded settings; changed records make a cycle due for the delta."""
+        self.settings = settings
+        self.scheduler.safety_interval = settings['interval'] * 60
+        self.scheduler.debounce = debounce_delay
+        if self.rate_limiter.limit != settings['rate_limit']:
+            self.rate_limiter = RateLimiter(settings['rate_limit'])
+        if self.records is not None:
+            added, removed, changed = diff_records(self.records, records)
+            if added or removed or changed:
+                self.emit("status", f"Config reloaded: {len(added)} added, {len(removed)} removed, "
+                                    f"{len(changed)} changed.\n")
+                self.reload_due = True
+        self.records = records
+
+    def is_due(self) -> bool:
+        return self.reload_due or self.scheduler.time_until_next() <= 0
+
+    def run_cycle(self, known_ips: dict):
+        """Runs the account's scheduled cycle, or reconciles changed records only when the schedule is not due yet."""
+        scheduled = self.scheduler.time_until_next() <= 0
+        if scheduled:
+            # The interval is measured from the start of the cycle so it does not drift
+            self.scheduler.mark_run()
+        self.reload_due = False
+        with self.active():
+            updated = run_update_cycle(self.settings, self.emit, known_ips=known_ips)
+        if scheduled and updated is False:
+            self.emit("status", "No update necessary.\n")
+
+
+def run_due_tenants(tenants: list[Tenant], stop: threading.Event):
+    """Runs the cycles of every due account, most overdue first.
+
+    The addresses all due accounts need are looked up once and shared. The
+    cycles run one after another, each bounded by CycleDeadline, and the
+    account that has waited longest goes first, so a large or slow account
+    cannot starve the others.
+    """
+    due = sorted((tenant for tenant in tenants if tenant.is_due()), key=lambda tenant: tenant.scheduler.next_deadline())
+    if not due:
+        return
+    known_ips = lookup_ips(ip_lookups([spec for tenant in due for spec in tenant.records]))
+    for tenant in due:
+        if stop.is_set():
+            return
+        tenant.run_cycle(known_ips)
+
+
+def run_daemon(path: str):
+    """Runs the update scheduler without a GUI until SIGINT/SIGTERM.
+
+    Every account in the config file (the DEFAULT section and each
+    [Account <name>] section) is served by this one process. Cycles run when
+    an IP-change event source fires (interface address watch for local://
+    providers, the ProbeInterval IP probe) and at the latest every Interval
+    minutes of the account. The config file and record tables are watched
+    and read again only after one of them changed: when an account's records
+    change, its added and changed records are reconciled right away, while the
+    caches and pooled connections are kept.
+
+    Args:
+        path: Path of the configuration file.
+    """
+    stop = threading.Event()
+    wake = threading.Event()
+    config_changed = threading.Event()
+    tenants: dict[str, Tenant] = {}
+    watcher = None
+
+    def request_stop(signum, frame):
+        stop.set()
+        wake.set()
+
+    def wake_on_event():
+        for tenant in list(tenants.values()):
+            tenant.scheduler.notify()
+        wake.set()
+
+    def wake_on_config():
+        config_changed.set()
+        wake.set()
+
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, request_stop)
+
+    config_changed.set()  # Load the config on the first pass
+    while not stop.is_set():
+        if config_changed.is_set():
+            config_changed.clear()
+            try:
+                accounts = load_accounts(path, load_settings(path))
+                records = {name: desired_records(settings) for name, settings in accounts.items()}
+            except (OSError, ValueError) as e:
+                logging.error(f"Failed to load config file: {e}")
+                if watcher is None:
+                    watcher = ConfigWatcher([path], wake_on_config)
+                config_changed.set()  # Load it again on the next pass
+                wake.wait(60)  # Retry early if the file is fixed
+                wake.clear()
+                continue
+            start_event_sources(wake_on_event)
+            watched = [path] + [settings['records_file'] for settings in accounts.values() if settings['records_file']]
+            if watcher is None:
+                watcher = ConfigWatcher(watched, wake_on_config)
+            else:
+                watcher.watch(watched)
+
+            for name in tenants.keys() - accounts.keys():
+                del tenants[name]
+                http_client.forget_account(name)
+                print_status("status", f"Account {name} removed from the config.\n")
+            for name, settings in accounts.items():
+                if name not in tenants:
+                    tenants[name] = Tenant(name, account_state_path(path, name))
+                tenants[name].configure(settings, records[name])
+
+        run_due_tenants(list(tenants.values()), stop)
+
+        wake.wait(min([tenant.scheduler.time_until_next() for tenant in tenants.values()] + [MAX_TIMER_DELAY]))
+        wake.clear()
+
+
 # --- GUI Setup ---
-root = tk.Tk()
-root.title("DNS Updater")
+def run_gui():
+    """Builds the Tk window and runs its main loop."""
+    global tk, ttk, messagebox
+    global root, ip_label, api_key_entry, toggle_api_key_button, email_entry, zone_id_entry
+    global record_name_entry, record_type_entry, interval_entry, countdown_label, ui_latency_probe
+    global status_log, status_view
+    import tkinter as tk
+    from tkinter import messagebox, ttk  # Import ttk for themed widgets
+
+    root = tk.Tk()
+    root.title("DNS Updater")
+
+    # Use ttk for a more modern look
+    style = ttk.Style()
+    style.theme_use("clam")  # You can choose other themes like "default", "alt", "classic"
 
-# Use ttk for a more modern look
-style = ttk.Style()
-style.theme_use("clam")  # You can choose other themes like "default", "alt", "classic"
+    # Display Public IP
+    ttk.Label(root, text="Your Public IP:").pack(pady=5)
+    ip_label = ttk.Label(root, text="Fetching...")
+    ip_label.pack()
 
-# Display Public IP
-ttk.Label(root, text="Your Public IP:").pack(pady=5)
-ip_label = ttk.Label(root, text=get_public_ip())
-ip_label.pack()
+    # Save and Load Buttons
+    save_config_button = ttk.Button(root, text="Save Config", command=save_config)
+    save_config_button.pack(pady=2)
 
-# Save and Load Buttons
-save_config_button = ttk.Button(root, text="Save Config", command=save_config)
-save_config_button.pack(pady=2)
+    load_config_button = ttk.Button(root, text="Load Config", command=load_config)
+    load_config_button.pack(pady=2)
 
-load_config_button = ttk.Button(root, text="Load Config", command=load_config)
-load_config_button.pack(pady=2)
+    # Input Fields with clear directions
+    ttk.Label(root, text="API Key or API Token:").pack()
+    api_key_entry = ttk.Entry(root, width=50, show="*")  # Add show="*" parameter
+    api_key_entry.pack()
+    toggle_api_key_button = ttk.Button(root, text="Show API Key", command=toggle_api_key_visibility)
+    toggle_api_key_button.pack(pady=2)
 
-# Input Fields with clear directions
-ttk.Label(root, text="API Key:").pack()
-api_key_entry = ttk.Entry(root, width=50, show="*")  # Add show="*" parameter
-api_key_entry.pack()
-toggle_api_key_button = ttk.Button(root, text="Show API Key", command=toggle_api_key_visibility)
-toggle_api_key_button.pack(pady=2)
+    ttk.Label(root, text="Email: (leave empty when using an API token)").pack()
+    email_entry = ttk.Entry(root, width=50)
+    email_entry.pack()
 
-ttk.Label(root, text="Email:").pack()
-email_entry = ttk.Entry(root, width=50)
-email_entry.pack()
+    ttk.Label(root, text="Zone ID(s): (For multiple domains, separate by commas; leave empty to detect)").pack()
+    zone_id_entry = ttk.Entry(root, width=50)
+    zone_id_entry.pack()
 
-ttk.Label(root, text="Zone ID(s): (For multiple domains, separate by commas)").pack()
-zone_id_entry = ttk.Entry(root, width=50)
-zone_id_entry.pack()
+    ttk.Label(root, text="Record Name(s): (For multiple domains, separate by commas)").pack()
+    record_name_entry = ttk.Entry(root, width=50)
+    record_name_entry.pack()
 
-ttk.Label(root, text="Record Name(s): (For multiple domains, separate by commas)").pack()
-record_name_entry = ttk.Entry(root, width=50)
-record_name_entry.pack()
+    ttk.Label(root, text="Record Type(s): (A, AAAA or A+AAAA; one for all or one per record)").pack()
+    record_type_entry = ttk.Entry(root, width=50)
+    record_type_entry.pack()
 
-ttk.Label(root, text="Record Type:").pack()
-record_type_entry = ttk.Entry(root, width=50)
-record_type_entry.pack()
+    ttk.Label(root, text="Update Interval (minutes):").pack()
+    interval_entry = ttk.Entry(root, width=20)
+    interval_entry.pack()
 
-ttk.Label(root, text="Update Interval (minutes):").pack()
-interval_entry = ttk.Entry(root, width=20)
-interval_entry.pack()
+    # Buttons for manual and automatic updates
+    update_button = ttk.Button(root, text="Manual Update", command=manual_update)
+    update_button.pack(pady=5)
 
-# Buttons for manual and automatic updates
-update_button = ttk.Button(root, text="Manual Update", command=manual_update)
-update_button.pack(pady=5)
+    start_button = ttk.Button(root, text="Start Auto Update", command=start_auto_update)
+    start_button.pack(pady=5)
 
-start_button = ttk.Button(root, text="Start Auto Update", command=start_auto_update)
-start_button.pack(pady=5)
+    stop_button = ttk.Button(root, text="Stop Auto Update", command=stop_auto_update)
+    stop_button.pack(pady=5)
 
-stop_button = ttk.Button(root, text="Stop Auto Update", command=stop_auto_update)
-stop_button.pack(pady=5)
+    # Countdown label for auto update
+    countdown_label = ttk.Label(root, text="Auto update stopped.")
+    countdown_label.pack(pady=5)
 
-# Countdown label for auto update
-countdown_label = ttk.Label(root, text="Auto update stopped.")
-countdown_label.pack(pady=5)
+    # Status box; only the visible lines of the bounded log are drawn
+    status_log = StatusLog(status_lines)
+    status_view = StatusLogView(root, status_log)
+    status_view.pack(pady=5, fill=tk.BOTH, expand=True)
 
-# Result text box
-result_text = tk.Text(root, height=10, width=80)
-result_text.pack(pady=5)
+    # Measures main-loop stalls during update cycles
+    ui_latency_probe = UiLatencyProbe(root)
+
+    # Errors logged by the networking functions also show up in the result box
+    logging.getLogger().addHandler(QueueLogHandler(ui_queue))
+
+    # Load configuration on startup
+    load_config()
+    fetch_initial_ip()
+    poll_ui_queue()
+
+    root.mainloop()
+
+
+def main(argv: list[str] | None = None):
+    """Entry point: runs the GUI, or the headless daemon with --headless."""
+    global config_path
+    parser = argparse.ArgumentParser(description="Keeps Cloudflare DNS records pointed at this host's public IP.")
+    parser.add_argument('--headless', '--daemon', action='store_true',
+                        help="run the update scheduler without a GUI (tkinter is never imported)")
+    parser.add_argument('--config', default=config_path, help="path of the configuration file")
+    args = parser.parse_args(argv)
+    config_path = args.config
+
+    # Configure logging
+    logging.basicConfig(filename='cfUpdater.log', level=logging.ERROR,
+                        format='%(asctime)s:%(levelname)s:%(message)s')
+
+    if args.headless:
+        logging.getLogger().addHandler(logging.StreamHandler(sys.stderr))
+        run_daemon(config_path)
+    else:
+        run_gui()
 
-# Load configuration on startup
-load_config()
 
-root.mainloop()
+if __name__ == "__main__":
+    main()
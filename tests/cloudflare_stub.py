@@ -0,0 +1,247 @@
+"""A local stand-in for the parts of the Cloudflare API cfUpdater uses.
+
+Shared by the tests and the benchmarks in bench/. The stub serves on
+127.0.0.1 from a background thread and records every request, so a test can
+assert exactly which calls a cycle made.
+"""
+
+import json
+import multiprocessing
+import re
+import ssl
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+API_PREFIX = "/client/v4"
+
+
+class CloudflareStub:
+    """Serves zone listings, record listings, PATCHes and batch writes from in-memory zones.
+
+    Attributes:
+        zones: zone ID -> list of record dicts (id, name, type, content, proxied, ttl).
+        zone_names: zone name -> zone ID, served by the zone listing.
+        calls: (method, path, query, body) of every request, in arrival order.
+        delay: Seconds every request takes, to inject latency.
+        batch_status: Status the batch endpoint answers with, or None to apply batches.
+        bad_ids: Record IDs whose writes are rejected with a 400.
+        faults: Statuses (or "drop" to close the connection unanswered) served before any real answer.
+        max_in_flight: Highest number of requests served at once.
+        max_zone_in_flight: zone ID -> highest number of requests served at once for that zone.
+        connections: Number of connections accepted (each one a TLS handshake when serving HTTPS).
+        token: What /user/tokens/verify reports (id, status, expires_on) plus the token's
+            policies, served by /user/tokens/<id> (a 403 without them); None answers the verify with a 401.
+    """
+
+    def __init__(self, zones: dict[str, list[dict]] | None = None, delay: float = 0.0):
+        self.zones = zones or {}
+        self.zone_names = {}
+        self.calls = []
+        self.delay = delay
+        self.batch_status = None
+        self.bad_ids = set()
+        self.faults = []
+        self.max_in_flight = 0
+        self.max_zone_in_flight = {}
+        self.connections = 0
+        self.token = None
+        self._in_flight = 0
+        self._zone_in_flight = {}
+        self._lock = threading.Lock()
+        self.server = None
+        self.url = None
+
+    @property
+    def api(self) -> str:
+        """The base URL to use as CLOUDFLARE_API."""
+        return self.url + API_PREFIX
+
+    def start(self, ssl_context: ssl.SSLContext | None = None) -> 'CloudflareStub':
+        """Starts serving; with an ssl_context the stub serves HTTPS."""
+        stub = self
+        handler = type("Handler", (StubHandler,), {"stub": self})
+
+        class Server(ThreadingHTTPServer):
+            request_queue_size = 1024
+
+            def get_request(self):
+                request = super().get_request()
+                with stub._lock:
+                    stub.connections += 1
+                return request
+
+        self.server = Server(("127.0.0.1", 0), handler)
+        if ssl_context is not None:
+            self.server.socket = ssl_context.wrap_socket(self.server.socket, server_side=True)
+        scheme = "http" if ssl_context is None else "https"
+        self.url = f"{scheme}://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def count(self, method: str | None = None, pattern: str = "") -> int:
+        """Counts the requests with the given method whose path matches a regular expression."""
+        return sum(1 for call_method, path, _, _ in self.calls
+                   if (method is None or call_method == method) and re.search(pattern, path))
+
+    def reset_calls(self):
+        self.calls.clear()
+
+    def _enter(self, zone_id: str | None):
+        with self._lock:
+            self._in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self._in_flight)
+            if zone_id:
+                current = self._zone_in_flight[zone_id] = self._zone_in_flight.get(zone_id, 0) + 1
+                self.max_zone_in_flight[zone_id] = max(self.max_zone_in_flight.get(zone_id, 0), current)
+
+    def _leave(self, zone_id: str | None):
+        with self._lock:
+            self._in_flight -= 1
+            if zone_id:
+                self._zone_in_flight[zone_id] -= 1
+
+    def handle(self, method: str, path: str, query: dict, body) -> tuple[int, object] | None:
+        """Answers one request; None closes the connection without an answer."""
+        with self._lock:
+            fault = self.faults.pop(0) if self.faults else None
+        if fault == "drop":
+            return None
+        if fault is not None:
+            return fault, {"success": False, "errors": [{"message": "injected fault"}]}
+
+        if path == "/ip":  # A public IP provider: ?answer=<address>&delay=<seconds>
+            time.sleep(float(query.get("delay", 0)))
+            return 200, query.get("answer", "203.0.113.1")
+        if not path.startswith(API_PREFIX):
+            return 404, {"success": False}
+        path = path[len(API_PREFIX):]
+
+        if path == "/user/tokens/verify":
+            if self.token is None:
+                return 401, {"success": False, "errors": [{"code": 1000, "message": "Invalid API Token"}]}
+            return 200, {"success": True, "result": {key: value for key, value in self.token.items()
+                                                     if key in ("id", "status", "expires_on")}}
+        match = re.fullmatch(r"/user/tokens/([^/]+)", path)
+        if match:
+            if self.token is None or self.token.get("id") != match.group(1) or "policies" not in self.token:
+                return 403, {"success": False}
+            return 200, {"success": True, "result": self.token}
+
+        if path == "/zones":
+            page, per_page = int(query.get("page", 1)), int(query.get("per_page", 50))
+            names = sorted(self.zone_names.items())
+            chunk = names[(page - 1) * per_page:page * per_page]
+            return 200, {"result": [{"name": name, "id": zone_id} for name, zone_id in chunk],
+                         "result_info": {"total_pages": max(1, -(-len(names) // per_page))}}
+
+        match = re.fullmatch(r"/zones/([^/]+)/dns_records/batch", path)
+        if match and method == "POST":
+            if self.batch_status is not None:
+                return self.batch_status, {"success": False}
+            records = {record["id"]: record for record in self.zones.get(match.group(1), [])}
+            patches = body["patches"]
+            if any(patch["id"] in self.bad_ids or patch["id"] not in records for patch in patches):
+                return 400, {"success": False}  # Batches are atomic
+            for patch in patches:
+                records[patch["id"]].update(patch)
+            return 200, {"success": True, "result": {"patches": [records[patch["id"]] for patch in patches]}}
+
+        match = re.fullmatch(r"/zones/([^/]+)/dns_records(?:/([^/]+))?", path)
+        if match:
+            records = self.zones.get(match.group(1), [])
+            if match.group(2):
+                record = next((record for record in records if record["id"] == match.group(2)), None)
+                if record is None:
+                    return 404, {"success": False}
+                if method != "GET" and record["id"] in self.bad_ids:
+                    return 400, {"success": False}
+                if body:
+                    record.update(body)
+                return 200, {"success": True, "result": record}
+            result = [record for record in records
+                      if query.get("name", record["name"]) == record["name"]
+                      and query.get("type", record["type"]) == record["type"]]
+            return 200, {"success": True, "result": result, "result_info": {"total_pages": 1}}
+        return 404, {"success": False}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    stub = None  # Set on the subclass built by CloudflareStub.start
+
+    def log_message(self, format, *args):
+        pass
+
+    def _serve(self, method: str):
+        url = urlsplit(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length)) if length else None
+        self.stub.calls.append((method, url.path, query, body))
+        zone = re.match(API_PREFIX + r"/zones/([^/]+)/", url.path)
+        zone_id = zone.group(1) if zone else None
+
+        self.stub._enter(zone_id)
+        try:
+            if self.stub.delay:
+                time.sleep(self.stub.delay)
+            answer = self.stub.handle(method, url.path, query, body)
+        finally:
+            self.stub._leave(zone_id)
+        if answer is None:
+            self.close_connection = True
+            return
+        status, payload = answer
+        data = payload.encode() if isinstance(payload, str) else json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain" if isinstance(payload, str) else "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self._serve("GET")
+
+    def do_POST(self):
+        self._serve("POST")
+
+    def do_PUT(self):
+        self._serve("PUT")
+
+    def do_PATCH(self):
+        self._serve("PATCH")
+
+
+def make_zone(zone_id: str, count: int, domain: str = "example.com", content: str = "192.0.2.1",
+              record_type: str = "A") -> list[dict]:
+    """Builds `count` records named host<n>.<domain>, all pointing at `content`."""
+    return [{"id": f"{zone_id}-{number:05d}", "name": f"host{number}.{domain}", "type": record_type,
+             "content": content, "proxied": False, "ttl": 1}
+            for number in range(count)]
+
+
+def _serve_stub(zones: dict, delay: float, batch_status: int | None, connection):
+    stub = CloudflareStub(zones, delay)
+    stub.batch_status = batch_status
+    connection.send(stub.start().api)
+    threading.Event().wait()  # Serve until the parent terminates the process
+
+
+def serve_in_subprocess(zones: dict[str, list[dict]], delay: float = 0.0,
+                        batch_status: int | None = None) -> tuple[multiprocessing.Process, str]:
+    """Runs a stub in a child process, so a benchmark does not share the GIL with it.
+
+    Returns:
+        The process (terminate it when done) and the base URL to use as CLOUDFLARE_API.
+    """
+    parent, child = multiprocessing.Pipe()
+    process = multiprocessing.Process(target=_serve_stub, args=(zones, delay, batch_status, child), daemon=True)
+    process.start()
+    return process, parent.recv()
@@ -0,0 +1,58 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cfUpdater  # noqa: E402
+from cloudflare_stub import CloudflareStub  # noqa: E402
+
+
+@pytest.fixture
+def cf(monkeypatch, tmp_path):
+    """cfUpdater with fresh module state: caches, limiter, HTTP client and state file under tmp_path."""
+    for variable in ("HTTP_PROXY", "HTTPS_PROXY", "ALL_PROXY", "http_proxy", "https_proxy", "all_proxy"):
+        monkeypatch.delenv(variable, raising=False)
+    client = cfUpdater.HttpClient()
+    client.retry_policy.base = 0.01  # Keep retry backoff short
+    monkeypatch.setattr(cfUpdater, "http_client", client)
+    monkeypatch.setattr(cfUpdater, "rate_limiter", cfUpdater.RateLimiter())
+    monkeypatch.setattr(cfUpdater, "record_id_cache", cfUpdater.RecordIdCache())
+    monkeypatch.setattr(cfUpdater, "batch_unavailable_zones", set())
+    monkeypatch.setattr(cfUpdater, "record_tables", {})
+    monkeypatch.setattr(cfUpdater, "source_resolvers", {})
+    monkeypatch.setattr(cfUpdater, "config_path", str(tmp_path / "config.ini"))
+    monkeypatch.setattr(cfUpdater, "update_state", None)
+    monkeypatch.setattr(cfUpdater, "zone_index", None)
+    monkeypatch.setattr(cfUpdater, "async_client", None)
+    monkeypatch.setattr(cfUpdater, "pending_network_backend", None)
+    monkeypatch.setattr(cfUpdater, "update_in_progress", False)
+    monkeypatch.setattr(cfUpdater, "cycle_deadline", None)
+    cfUpdater.credentials_for.cache_clear()
+    yield cfUpdater
+    client.close()
+
+
+@pytest.fixture
+def stub(cf, monkeypatch):
+    """A running CloudflareStub that the cf fixture's module sends its API calls to."""
+    server = CloudflareStub().start()
+    monkeypatch.setattr(cf, "CLOUDFLARE_API", server.api)
+    yield server
+    server.stop()
+
+
+@pytest.fixture(params=["threads", "asyncio"])
+def backend(request, cf, stub, monkeypatch):
+    """Runs the test on the thread pool and on the asyncio backend."""
+    if request.param == "asyncio":
+        if cf.httpx is None:
+            pytest.skip("the asyncio backend needs httpx")
+        client = cf.AsyncHttpClient()
+        client.retry_policy.base = 0.01
+        monkeypatch.setattr(cf, "async_client", client)
+        yield request.param
+        client.close()
+    else:
+        yield request.param
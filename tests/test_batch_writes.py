@@ -0,0 +1,98 @@
+"""Batch writes: chunking by BatchSize, bisection of rejected chunks and the fallback to single PATCHes."""
+
+from cloudflare_stub import make_zone
+
+NEW_IP = "203.0.113.7"
+
+
+def reconcile(cf, stub, count: int):
+    stub.zones["zone1"] = make_zone("zone1", count)
+    desired = [(cf.RecordSpec(record["name"], "zone1"), NEW_IP) for record in stub.zones["zone1"]]
+    return {spec.name: result for spec, result in cf.reconcile_records("key", "user@example.com", desired)}
+
+
+def batch_chunks(stub) -> list[list[str]]:
+    return [[patch["id"] for patch in body["patches"]]
+            for method, path, _, body in stub.calls if method == "POST" and path.endswith("/batch")]
+
+
+def test_stale_records_are_written_in_chunks_of_batch_size(cf, stub, backend, monkeypatch):
+    monkeypatch.setattr(cf, "batch_size", 3)
+
+    results = reconcile(cf, stub, 8)
+
+    assert set(results.values()) == {cf.RESULT_UPDATED}
+    assert sorted(batch_chunks(stub)) == [[f"zone1-{n:05d}" for n in chunk]
+                                          for chunk in ([0, 1, 2], [3, 4, 5], [6, 7])]
+    assert stub.count("PATCH") == 0
+    assert all(record["content"] == NEW_IP for record in stub.zones["zone1"])
+
+
+def test_rejected_chunk_is_halved_down_to_the_bad_record(cf, stub, backend, monkeypatch):
+    monkeypatch.setattr(cf, "batch_size", 8)
+    stub.bad_ids.add("zone1-00005")
+
+    results = reconcile(cf, stub, 8)
+
+    assert results.pop("host5.example.com") == cf.RESULT_FAILED
+    assert set(results.values()) == {cf.RESULT_UPDATED}
+    # 8 -> 4 + 4 -> (4..5) + (6..7) -> single PATCHes for 4 and 5
+    assert sorted(map(len, batch_chunks(stub))) == [2, 2, 4, 4, 8]
+    patched = sorted(path.rsplit("/", 1)[1] for method, path, _, _ in stub.calls if method == "PATCH")
+    assert patched == ["zone1-00004", "zone1-00005"]
+    assert [record["content"] == NEW_IP for record in stub.zones["zone1"]] == [True] * 5 + [False] + [True] * 2
+    assert "zone1" not in cf.batch_unavailable_zones
+
+
+def test_missing_batch_endpoint_falls_back_to_one_patch_per_record(cf, stub, backend, monkeypatch):
+    monkeypatch.setattr(cf, "batch_size", 3)
+    stub.batch_status = 405
+
+    results = reconcile(cf, stub, 5)
+
+    assert set(results.values()) == {cf.RESULT_UPDATED}
+    assert "zone1" in cf.batch_unavailable_zones
+    assert stub.count("PATCH") == 5
+
+    # The zone is remembered, so the next writes skip the batch endpoint
+    stub.reset_calls()
+    for record in stub.zones["zone1"]:
+        record["content"] = "192.0.2.1"
+    reconcile_again = [(cf.RecordSpec(record["name"], "zone1"), NEW_IP) for record in stub.zones["zone1"]]
+    list(cf.reconcile_records("key", "user@example.com", reconcile_again))
+    assert stub.count("POST") == 0
+    assert stub.count("PATCH") == 5
+
+
+def test_batch_size_zero_disables_batching(cf, stub, backend, monkeypatch):
+    monkeypatch.setattr(cf, "batch_size", 0)
+
+    results = reconcile(cf, stub, 4)
+
+    assert set(results.values()) == {cf.RESULT_UPDATED}
+    assert stub.count("POST") == 0
+    assert stub.count("PATCH") == 4
+
+
+def test_auth_error_fails_the_whole_chunk_in_one_request(cf, stub, backend, monkeypatch):
+    monkeypatch.setattr(cf, "batch_size", 100)
+    stub.batch_status = 403
+
+    results = reconcile(cf, stub, 100)
+
+    assert set(results.values()) == {cf.RESULT_FAILED}
+    assert stub.count("POST") == 1
+    assert stub.count("PATCH") == 0
+    assert "zone1" not in cf.batch_unavailable_zones
+
+
+def test_persistent_5xx_fails_the_whole_chunk_without_splitting(cf, stub, backend, monkeypatch):
+    monkeypatch.setattr(cf, "batch_size", 16)
+    stub.batch_status = 503
+
+    results = reconcile(cf, stub, 16)
+
+    assert set(results.values()) == {cf.RESULT_FAILED}
+    assert stub.count("POST") == cf.http_client.retry_policy.retries + 1  # Retried, but never split
+    assert stub.count("PATCH") == 0
+    assert all(record["content"] == "192.0.2.1" for record in stub.zones["zone1"])
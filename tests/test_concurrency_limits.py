@@ -0,0 +1,55 @@
+"""reconcile_records keeps within its global and per-zone limits on requests in flight."""
+
+from cloudflare_stub import make_zone
+
+NEW_IP = "203.0.113.7"
+
+
+def stale_records(cf, stub, zones: int, per_zone: int):
+    desired = []
+    for number in range(zones):
+        zone_id = f"zone{number}"
+        stub.zones[zone_id] = make_zone(zone_id, per_zone, domain=f"zone{number}.example")
+        desired.extend((cf.RecordSpec(record["name"], zone_id), NEW_IP) for record in stub.zones[zone_id])
+    return desired
+
+
+def test_workers_bound_requests_in_flight(cf, stub, monkeypatch):
+    monkeypatch.setattr(cf, "batch_size", 0)  # One PATCH per record, so there is plenty to overlap
+    stub.delay = 0.05
+    desired = stale_records(cf, stub, zones=4, per_zone=6)
+
+    results = list(cf.reconcile_records("key", "user@example.com", desired, workers=3, per_zone=8))
+
+    assert [result for _, result in results] == [cf.RESULT_UPDATED] * 24
+    assert stub.max_in_flight == 3
+
+
+def test_per_zone_limit_bounds_requests_to_one_zone(cf, stub, monkeypatch):
+    monkeypatch.setattr(cf, "batch_size", 0)
+    stub.delay = 0.05
+    desired = stale_records(cf, stub, zones=2, per_zone=8)
+
+    results = list(cf.reconcile_records("key", "user@example.com", desired, workers=8, per_zone=2))
+
+    assert len(results) == 16
+    assert stub.max_zone_in_flight == {"zone0": 2, "zone1": 2}
+    assert stub.max_in_flight <= 4
+
+
+def test_results_stream_in_completion_order(cf, stub, monkeypatch):
+    monkeypatch.setattr(cf, "batch_size", 0)
+    desired = stale_records(cf, stub, zones=2, per_zone=1)
+    stub.bad_ids.add("zone0-00000")
+    original = stub.handle
+
+    def slow_zone0(method, path, query, body):
+        if "/zone0/" in path:
+            cf.time.sleep(0.3)
+        return original(method, path, query, body)
+
+    stub.handle = slow_zone0
+    results = [(spec.zone_id, result) for spec, result in
+               cf.reconcile_records("key", "user@example.com", desired, workers=4, per_zone=1)]
+
+    assert results == [("zone1", cf.RESULT_UPDATED), ("zone0", cf.RESULT_FAILED)]
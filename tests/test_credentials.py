@@ -0,0 +1,182 @@
+"""API token verification, the cached policies and the DNS Write checks made from them."""
+
+import datetime
+import time
+
+import pytest
+
+from cloudflare_stub import make_zone
+
+ZONE = "com.cloudflare.api.account.zone."
+DNS_WRITE = [{"id": "4755a26eedb94da69e1066d98aa820be", "name": "DNS Write"}]
+
+
+def policy(resources: dict, effect: str = "allow", groups: list[dict] = DNS_WRITE) -> dict:
+    return {"effect": effect, "resources": resources, "permission_groups": groups}
+
+
+def api_time(epoch: float) -> str:
+    return datetime.datetime.fromtimestamp(epoch, datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = time.time()
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(cf, monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(cf.time, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def token(cf, stub):
+    stub.token = {"id": "token1", "status": "active", "policies": [policy({ZONE + "*": "*"})]}
+    return cf.credentials_for("secret-token", "")
+
+
+def test_global_api_key_is_valid_without_a_request(cf, stub):
+    credentials = cf.credentials_for("key", "user@example.com")
+
+    assert credentials.verify() is True
+    assert credentials.may_edit_dns("zone1") is True
+    assert stub.calls == []
+
+
+def test_verification_and_policies_are_cached(cf, stub, token, clock):
+    assert token.verify() is True
+    assert token.policies == stub.token["policies"]
+    assert [path for _, path, _, _ in stub.calls] == ["/client/v4/user/tokens/verify",
+                                                      "/client/v4/user/tokens/token1"]
+
+    stub.reset_calls()
+    clock.now += cf.CREDENTIALS_CACHE_TTL - 1
+    assert token.verify() is True
+    assert stub.calls == []
+
+    clock.now += 2  # The cache period ran out
+    assert token.verify() is True
+    assert stub.count("GET", r"/user/tokens/verify$") == 1
+
+
+def test_cache_ends_when_the_token_expires(cf, stub, token, clock):
+    stub.token["expires_on"] = api_time(clock.now + 600)
+    assert token.verify() is True
+    assert token.checked_until == pytest.approx(clock.now + 600, abs=1)
+
+    stub.token["status"] = "expired"
+    clock.now += 601
+    assert token.verify() is False
+    assert stub.count("GET", r"/user/tokens/verify$") == 2
+
+
+def test_disabled_token_is_rejected(cf, stub, token):
+    stub.token["status"] = "disabled"
+
+    assert token.verify() is False
+    assert stub.count("GET", r"/user/tokens/token1$") == 0  # Policies are not read
+
+
+def test_4xx_from_verify_lets_writes_go_ahead(cf, stub, token, clock):
+    stub.token = None  # E.g. an account-owned token, verified under /accounts/<id>/tokens/verify
+
+    assert token.verify() is None
+    assert token.may_edit_dns("zone1") is True
+
+    stub.reset_calls()
+    assert token.verify() is None  # Cached like a successful verification
+    assert stub.calls == []
+
+
+def test_network_error_is_not_cached(cf, stub, token):
+    stub.faults = ["drop"] * 10
+
+    assert token.verify() is None
+    stub.faults = []
+    assert token.verify() is True
+
+
+def test_unreadable_policies_allow_every_zone(cf, stub, token):
+    del stub.token["policies"]
+
+    assert token.verify() is True
+    assert token.policies is None
+    assert token.may_edit_dns("zone1") is True
+
+
+@pytest.mark.parametrize("resources, covered", [
+    ({ZONE + "zone1": "*"}, True),
+    ({ZONE + "zone2": "*"}, False),
+    ({ZONE + "*": "*"}, True),
+    ({"com.cloudflare.api.account.acct1": {ZONE + "*": "*"}}, True),
+    ({"com.cloudflare.api.account.acct1": {ZONE + "zone1": "*"}}, True),
+    ({"com.cloudflare.api.account.acct1": {ZONE + "zone2": "*"}}, False),
+    ({"com.cloudflare.api.account.acct1": "*"}, False),
+    ({}, False),
+])
+def test_covers_zone(cf, resources, covered):
+    assert cf.Credentials.covers_zone(resources, "zone1") is covered
+
+
+def test_deny_policy_wins_over_an_allow(cf):
+    credentials = cf.Credentials("secret-token", "")
+    credentials.policies = [policy({ZONE + "*": "*"}), policy({ZONE + "zone2": "*"}, effect="deny")]
+
+    assert credentials.may_edit_dns("zone1") is True
+    assert credentials.may_edit_dns("zone2") is False
+
+
+def test_policy_without_dns_write_does_not_allow(cf):
+    credentials = cf.Credentials("secret-token", "")
+    credentials.policies = [policy({ZONE + "*": "*"}, groups=[{"name": "DNS Read"}]),
+                            policy({ZONE + "zone2": "*"})]
+
+    assert credentials.may_edit_dns("zone1") is False
+    assert credentials.may_edit_dns("zone2") is True
+
+
+@pytest.fixture
+def settings(cf, stub, monkeypatch):
+    stub.zones["zone1"] = make_zone("zone1", 1)
+    stub.zones["zone2"] = make_zone("zone2", 1, domain="example.org")
+    monkeypatch.setattr(cf, "get_source_ip", lambda source, family=4: "203.0.113.7")
+    return {'api_key': "secret-token", 'email': "", 'zone_ids': "zone1, zone2",
+            'record_names': "host0.example.com, host0.example.org", 'record_type': "A", 'records_file': ''}
+
+
+def run_cycle(cf, settings):
+    lines = []
+    cf.run_update_cycle(settings, lambda kind, value: lines.append((kind, value)))
+    return [value for kind, value in lines if kind == "status"]
+
+
+def test_cycle_skips_zones_the_token_may_not_edit(cf, stub, token, settings):
+    stub.token["policies"] = [policy({ZONE + "zone1": "*"})]
+
+    lines = run_cycle(cf, settings)
+
+    assert "Error: The API token may not edit DNS records in zone zone2 (host0.example.org).\n" in lines
+    assert stub.count(None, r"/zones/zone2/") == 0
+    assert stub.zones["zone1"][0]["content"] == "203.0.113.7"
+
+
+def test_cycle_writes_when_the_token_cannot_be_verified(cf, stub, token, settings):
+    stub.token = None
+
+    run_cycle(cf, settings)
+
+    assert [record["content"] for zone in ("zone1", "zone2") for record in stub.zones[zone]] == ["203.0.113.7"] * 2
+
+
+def test_cycle_stops_for_an_expired_token(cf, stub, token, settings):
+    stub.token["status"] = "expired"
+
+    lines = run_cycle(cf, settings)
+
+    assert lines == ["Error: Cloudflare reports the API token as expired or disabled.\n"]
+    assert stub.count(None, r"/zones/") == 0
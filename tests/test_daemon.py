@@ -0,0 +1,171 @@
+"""The headless daemon: config reloads on watched file changes, and several accounts in one engine."""
+
+import os
+import signal
+import threading
+import time
+
+import pytest
+
+from cloudflare_stub import make_zone
+
+CONFIG = """[DEFAULT]
+ApiKey = key
+Email = user@example.com
+ZoneIDs = zone1
+RecordNames = {names}
+RecordType = A
+Interval = 60
+"""
+
+ACCOUNTS_CONFIG = """[DEFAULT]
+Interval = 60
+
+[Account a]
+ApiKey = key-a
+Email = a@example.com
+ZoneIDs = zone1
+RecordNames = host0.example.com
+RecordType = A
+
+[Account b]
+ApiKey = key-b
+Email = b@example.com
+ZoneIDs = zone2
+RecordNames = host0.example.org
+RecordType = A
+RateLimit = 600
+"""
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not reached in time")
+        time.sleep(0.02)
+
+
+@pytest.fixture
+def daemon(cf, stub, monkeypatch, tmp_path):
+    """Runs run_daemon on the main thread (it installs signal handlers) while `script` drives it."""
+    stub.zones["zone1"] = make_zone("zone1", 2)
+    monkeypatch.setattr(cf, "get_source_ip", lambda source, family=4: "203.0.113.7")
+    monkeypatch.setattr(cf, "start_metrics_server", lambda port, address=None: None)
+    config = tmp_path / "config.ini"
+    config.write_text(CONFIG.format(names="host0.example.com"))
+
+    loads = []
+    load_settings = cf.load_settings
+    monkeypatch.setattr(cf, "load_settings", lambda path: loads.append(path) or load_settings(path))
+    wake_on_event = []
+    monkeypatch.setattr(cf, "start_event_sources", wake_on_event.append)
+
+    def run(script, text=None):
+        if text is not None:
+            config.write_text(text)
+        handlers = {sig: signal.getsignal(sig) for sig in (signal.SIGINT, signal.SIGTERM)}
+        errors = []
+
+        def drive():
+            try:
+                script(config, loads, wake_on_event)
+            except BaseException as e:
+                errors.append(e)
+            finally:
+                os.kill(os.getpid(), signal.SIGTERM)
+        threading.Thread(target=drive, daemon=True).start()
+        try:
+            cf.run_daemon(str(config))
+        finally:
+            for sig, handler in handlers.items():
+                signal.signal(sig, handler)
+        if errors:
+            raise errors[0]
+    return run
+
+
+def test_wakes_without_a_config_change_do_not_reload(daemon, stub):
+    def script(config, loads, wake_on_event):
+        wait_for(lambda: wake_on_event and stub.count("PATCH") == 1)
+        for _ in range(5):
+            wake_on_event[0]()
+            time.sleep(0.05)
+        assert len(loads) == 1
+
+    daemon(script)
+
+
+def test_config_change_reloads_and_reconciles_the_new_record(daemon, stub):
+    def script(config, loads, wake_on_event):
+        wait_for(lambda: stub.count("PATCH") == 1)
+        config.write_text(CONFIG.format(names="host0.example.com, host1.example.com"))
+        wait_for(lambda: stub.count("PATCH") == 2)
+        assert len(loads) == 2
+        assert stub.zones["zone1"][1]["content"] == "203.0.113.7"
+
+    daemon(script)
+
+
+def test_accounts_share_the_ip_lookup_but_not_journal_or_rate_limiter(cf, daemon, stub, monkeypatch, tmp_path):
+    stub.zones["zone2"] = make_zone("zone2", 1, domain="example.org")
+    lookups = []
+    monkeypatch.setattr(cf, "get_source_ip",
+                        lambda source, family=4: lookups.append((source, family)) or "203.0.113.7")
+    cycles = []
+    run_update_cycle = cf.run_update_cycle
+
+    def recording_cycle(settings, emit, **kwargs):
+        cycles.append((cf.http_client.account, cf.rate_limiter, cf.update_state.path))
+        return run_update_cycle(settings, emit, **kwargs)
+    monkeypatch.setattr(cf, "run_update_cycle", recording_cycle)
+
+    def script(config, loads, wake_on_event):
+        wait_for(lambda: stub.count("PATCH") == 2)
+
+    daemon(script, ACCOUNTS_CONFIG)
+
+    assert lookups == [(None, 4)]  # One lookup for both accounts
+    assert sorted(account for account, _, _ in cycles) == ["a", "b"]
+    limiters = {account: limiter for account, limiter, _ in cycles}
+    assert limiters["a"] is not limiters["b"]
+    assert (limiters["a"].limit, limiters["b"].limit) == (cf.DEFAULT_RATE_LIMIT, 600)
+    journals = {account: path for account, _, path in cycles}
+    assert journals == {"a": str(tmp_path / "cfUpdater.a.state.journal"),
+                        "b": str(tmp_path / "cfUpdater.b.state.journal")}
+    assert all(os.path.exists(path) for path in journals.values())
+    assert not os.path.exists(tmp_path / cf.STATE_FILE_NAME)  # DEFAULT has no ApiKey, so it is no account
+    assert stub.zones["zone1"][0]["content"] == stub.zones["zone2"][0]["content"] == "203.0.113.7"
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_most_overdue_account_runs_first(cf, monkeypatch, tmp_path):
+    clock = FakeClock()
+    tenants = {}
+    for name, last_run, record_type in (("b", 100, "A"), ("c", 900, "A"), ("a", 0, "AAAA"), ("d", 50, "A")):
+        tenant = tenants[name] = cf.Tenant(name, str(tmp_path / f"{name}.journal"))
+        tenant.scheduler = cf.UpdateScheduler(300, clock=clock)
+        clock.now = last_run
+        tenant.scheduler.mark_run()
+        tenant.records = [cf.RecordSpec(f"{name}.example.com", "zone1", record_type)]
+    lookups = []
+    monkeypatch.setattr(cf, "get_source_ip",
+                        lambda source, family=4: lookups.append((source, family)) or "203.0.113.7")
+    cycles = []
+    monkeypatch.setattr(cf, "run_update_cycle",
+                        lambda settings, emit, known_ips: cycles.append((cf.http_client.account, known_ips)))
+    clock.now = 1000  # a, d and b are due, c is not
+
+    cf.run_due_tenants(list(tenants.values()), threading.Event())
+
+    assert [account for account, _ in cycles] == ["a", "d", "b"]
+    assert sorted(lookups) == [(None, 4), (None, 6)]  # Looked up once for all due accounts
+    assert all(known_ips is cycles[0][1] for _, known_ips in cycles)
+    assert tenants["c"].scheduler.next_deadline() == 1200
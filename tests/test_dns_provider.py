@@ -0,0 +1,152 @@
+"""The DNS whoami parser and query_dns_provider against a local UDP resolver."""
+
+import socket
+import struct
+import threading
+
+import pytest
+
+import cfUpdater
+from cfUpdater import DNS_CLASSES, DNS_TYPES, build_dns_query, parse_dns_response
+
+
+def dns_name(name: str) -> bytes:
+    return b''.join(bytes([len(label)]) + label.encode('ascii') for label in name.split('.')) + b'\0'
+
+
+def response(query: bytes, answers: list[tuple[int, int, bytes]], flags: int = 0x8180,
+             txid: int | None = None, compress: bool = True) -> bytes:
+    """Answers a query with (type, class, rdata) records, naming them by a pointer to the question or in full."""
+    query_id, = struct.unpack_from('!H', query)
+    question = query[12:]
+    name = question[:-4]
+    header = struct.pack('!HHHHHH', query_id if txid is None else txid, flags, 1, len(answers), 0, 0)
+    records = b''.join((b'\xc0\x0c' if compress else name) + struct.pack('!HHIH', rtype, rclass, 60, len(rdata)) + rdata
+                       for rtype, rclass, rdata in answers)
+    return header + question + records
+
+
+def a_record(address: str) -> tuple[int, int, bytes]:
+    return DNS_TYPES['A'], DNS_CLASSES['IN'], socket.inet_pton(socket.AF_INET, address)
+
+
+@pytest.mark.parametrize("compress", [True, False])
+def test_a_answer_with_and_without_name_compression(compress):
+    txid, query = build_dns_query("myip.opendns.com", DNS_TYPES['A'])
+    packet = response(query, [a_record("192.0.2.1")], compress=compress)
+
+    assert parse_dns_response(packet, txid, DNS_TYPES['A']) == ["192.0.2.1"]
+
+
+def test_aaaa_answer_skips_records_of_other_types():
+    txid, query = build_dns_query("myip.opendns.com", DNS_TYPES['AAAA'])
+    aaaa = (DNS_TYPES['AAAA'], DNS_CLASSES['IN'], socket.inet_pton(socket.AF_INET6, "2001:db8::1"))
+    packet = response(query, [a_record("192.0.2.1"), aaaa])
+
+    assert parse_dns_response(packet, txid, DNS_TYPES['AAAA']) == ["2001:db8::1"]
+
+
+def test_chaos_txt_answer():
+    txid, query = build_dns_query("whoami.cloudflare", DNS_TYPES['TXT'], DNS_CLASSES['CH'])
+    packet = response(query, [(DNS_TYPES['TXT'], DNS_CLASSES['CH'], b'\x0b192.0.2.10')])
+
+    assert parse_dns_response(packet, txid, DNS_TYPES['TXT']) == ["192.0.2.10"]
+
+
+@pytest.mark.parametrize("flags, txid_offset, message", [
+    (0x8380, 0, "truncated"),  # TC bit
+    (0x8183, 0, "rcode 3"),  # NXDOMAIN
+    (0x8180, 1, "does not match"),  # Answer to another query
+    (0x0100, 0, "does not match"),  # A query, not a response
+])
+def test_unusable_responses_raise(flags, txid_offset, message):
+    txid, query = build_dns_query("myip.opendns.com", DNS_TYPES['A'])
+    packet = response(query, [a_record("192.0.2.1")], flags=flags, txid=(txid + txid_offset) & 0xFFFF)
+
+    with pytest.raises(ValueError, match=message):
+        parse_dns_response(packet, txid, DNS_TYPES['A'])
+
+
+@pytest.mark.parametrize("cut", [5, 14, 30, 34])
+def test_truncated_packet_raises_value_error(cut):
+    txid, query = build_dns_query("myip.opendns.com", DNS_TYPES['A'])
+    packet = response(query, [a_record("192.0.2.1")], compress=False)
+
+    with pytest.raises(ValueError, match="malformed"):
+        parse_dns_response(packet[:cut], txid, DNS_TYPES['A'])
+
+
+def test_answer_with_short_rdata_is_skipped():
+    txid, query = build_dns_query("myip.opendns.com", DNS_TYPES['A'])
+    packet = response(query, [a_record("192.0.2.1")])
+
+    assert parse_dns_response(packet[:-1], txid, DNS_TYPES['A']) == []
+
+
+class UdpResolver:
+    """Answers each query with the datagrams built by `reply(query)`."""
+
+    def __init__(self, reply):
+        self.reply = reply
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(("127.0.0.1", 0))
+        self.port = self.sock.getsockname()[1]
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        while True:
+            try:
+                query, client = self.sock.recvfrom(512)
+            except OSError:
+                return
+            for packet in self.reply(query):
+                self.sock.sendto(packet, client)
+
+    def close(self):
+        self.sock.close()
+
+
+@pytest.fixture
+def resolver():
+    servers = []
+
+    def start(reply):
+        server = UdpResolver(reply)
+        servers.append(server)
+        return f"dns://127.0.0.1:{server.port}"
+    yield start
+    for server in servers:
+        server.close()
+
+
+def test_query_ignores_a_mismatched_reply_and_takes_the_real_one(resolver):
+    def reply(query):
+        txid, = struct.unpack_from('!H', query)
+        return [response(query, [a_record("198.51.100.1")], txid=txid ^ 1),
+                response(query, [a_record("192.0.2.1")])]
+    url = resolver(reply)
+
+    assert cfUpdater.query_dns_provider(f"{url}/myip.opendns.com", timeout=2, family=4) == "192.0.2.1"
+
+
+def test_query_chaos_txt(resolver):
+    def reply(query):
+        assert query.endswith(struct.pack('!HH', DNS_TYPES['TXT'], DNS_CLASSES['CH']))
+        return [response(query, [(DNS_TYPES['TXT'], DNS_CLASSES['CH'], b'\x0b192.0.2.10')])]
+    url = resolver(reply)
+
+    assert cfUpdater.query_dns_provider(f"{url}/whoami.cloudflare?type=TXT&class=CH", timeout=2) == "192.0.2.10"
+
+
+def test_query_of_a_failing_resolver_raises(resolver):
+    url = resolver(lambda query: [response(query, [], flags=0x8182)])  # SERVFAIL
+
+    with pytest.raises(ValueError, match="rcode 2"):
+        cfUpdater.query_dns_provider(f"{url}/myip.opendns.com", timeout=0.3)
+
+
+def test_query_without_answer_raises(resolver):
+    url = resolver(lambda query: [response(query, [])])
+
+    with pytest.raises(ValueError, match="no A answer"):
+        cfUpdater.query_dns_provider(f"{url}/myip.opendns.com", timeout=2)
@@ -0,0 +1,258 @@
+"""HttpClient retries, RetryPolicy rules and the deadline-aware rate limiter."""
+
+import socket
+import time
+
+import pytest
+import requests
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+
+from cfUpdater import ConnectFailed, DeadlineExceeded, RateLimiter, RetryPolicy
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def sends(cf, monkeypatch):
+    """Counts the attempts HttpClient.request makes."""
+    attempts = []
+    original = cf.http_client._send
+
+    def counting_send(method, url, **kwargs):
+        attempts.append(method)
+        return original(method, url, **kwargs)
+    monkeypatch.setattr(cf.http_client, "_send", counting_send)
+    return attempts
+
+
+def closed_port_url() -> str:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    return f"http://127.0.0.1:{port}/client/v4/zones"
+
+
+@pytest.mark.parametrize("method, idempotent, error, expected", [
+    ("GET", None, None, True),
+    ("PATCH", None, requests.exceptions.ReadTimeout(), True),
+    ("POST", None, None, False),
+    ("POST", None, requests.exceptions.ReadTimeout(), False),
+    ("POST", True, None, True),
+    ("PATCH", False, requests.exceptions.ConnectionError(), False),
+    ("POST", None, requests.exceptions.ConnectTimeout(), True),
+    ("POST", None, ConnectFailed(), True),
+    ("POST", None, requests.exceptions.ConnectionError(MaxRetryError(None, "/", NewConnectionError(None, "refused"))),
+     True),
+])
+def test_can_retry(method, idempotent, error, expected):
+    assert RetryPolicy.can_retry(method, idempotent, error) is expected
+
+
+def test_backoff_is_capped_full_jitter():
+    policy = RetryPolicy(base=0.5, cap=4.0, rng=lambda: 1.0)
+    assert [policy.backoff(attempt) for attempt in range(5)] == [0.5, 1.0, 2.0, 4.0, 4.0]
+    assert RetryPolicy(rng=lambda: 0.0).backoff(3) == 0.0
+
+
+def test_5xx_is_retried_until_it_succeeds(cf, stub, sends):
+    stub.faults = [503, 502]
+
+    response = cf.http_client.get(f"{stub.api}/zones/zone1/dns_records")
+
+    assert response.status_code == 200
+    assert sends == ["GET"] * 3
+
+
+def test_5xx_is_returned_once_retries_run_out(cf, stub, sends):
+    stub.faults = [500] * 10
+
+    response = cf.http_client.get(f"{stub.api}/zones/zone1/dns_records")
+
+    assert response.status_code == 500
+    assert len(sends) == cf.http_client.retry_policy.retries + 1
+
+
+def test_post_is_not_resent_after_a_5xx(cf, stub, sends):
+    stub.faults = [503]
+
+    response = cf.http_client.post(f"{stub.api}/zones/zone1/dns_records/batch", json={"patches": []})
+
+    assert response.status_code == 503
+    assert sends == ["POST"]
+
+
+def test_idempotent_post_is_resent_after_a_5xx(cf, stub, sends):
+    stub.faults = [503]
+
+    response = cf.http_client.post(f"{stub.api}/zones/zone1/dns_records/batch", json={"patches": []},
+                                   idempotent=True)
+
+    assert response.status_code == 200
+    assert sends == ["POST", "POST"]
+
+
+def test_dropped_connection_is_retried_for_get_but_not_for_post(cf, stub, sends):
+    stub.faults = ["drop"]
+    assert cf.http_client.get(f"{stub.api}/zones/zone1/dns_records").status_code == 200
+    assert sends == ["GET", "GET"]
+
+    sends.clear()
+    stub.faults = ["drop"]
+    with pytest.raises(requests.exceptions.ConnectionError):
+        cf.http_client.post(f"{stub.api}/zones/zone1/dns_records/batch", json={"patches": []})
+    assert sends == ["POST"]
+
+
+def test_connect_failure_is_retried_even_for_post(cf, sends):
+    with pytest.raises(requests.exceptions.ConnectionError):
+        cf.http_client.post(closed_port_url(), json={})
+
+    assert sends == ["POST"] * (cf.http_client.retry_policy.retries + 1)
+
+
+def test_no_retry_when_the_backoff_would_overrun_the_deadline(cf, stub, sends, monkeypatch):
+    cf.http_client.retry_policy = RetryPolicy(base=5, rng=lambda: 1.0)
+    monkeypatch.setattr(cf, "cycle_deadline", time.monotonic() + 2)
+    stub.faults = [503]
+
+    assert cf.http_client.get(f"{stub.api}/zones/zone1/dns_records").status_code == 503
+    assert sends == ["GET"]
+
+
+def test_request_after_the_deadline_fails_fast(cf, stub, monkeypatch):
+    monkeypatch.setattr(cf, "cycle_deadline", time.monotonic() - 1)
+
+    with pytest.raises(DeadlineExceeded):
+        cf.http_client.get(f"{stub.api}/zones/zone1/dns_records")
+    assert stub.calls == []
+
+
+def test_rate_limit_wait_past_the_deadline_raises_without_waiting(cf, stub, sends, monkeypatch):
+    limiter = RateLimiter(limit=1, period=600)
+    limiter.acquire()
+    monkeypatch.setattr(cf, "rate_limiter", limiter)
+    monkeypatch.setattr(cf, "cycle_deadline", time.monotonic() + 5)
+
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        cf.http_client.get(f"{stub.api}/zones/zone1/dns_records")
+    assert time.monotonic() - started < 1
+    assert sends == ["GET"]  # Not retried
+    assert stub.calls == []
+
+
+def test_acquire_raises_when_the_refill_would_take_too_long():
+    clock = FakeClock()
+    limiter = RateLimiter(limit=1, period=100, clock=clock)
+    assert limiter.acquire(timeout=1) == 0
+
+    with pytest.raises(DeadlineExceeded):
+        limiter.acquire(timeout=50)  # The next token takes 100 s
+    clock.now += 100
+    assert limiter.acquire(timeout=1) == 0
+
+
+def test_acquire_raises_while_paused_past_the_deadline():
+    limiter = RateLimiter(limit=10, period=10, clock=FakeClock())
+    limiter.pause(30)
+
+    with pytest.raises(DeadlineExceeded):
+        limiter.acquire(write=True, timeout=10)
+
+
+def test_read_held_back_for_a_write_gives_up_at_the_deadline():
+    limiter = RateLimiter(limit=10, period=10)
+    limiter.waiting_writes = 1  # A write is queued
+
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        limiter.acquire(timeout=0.2)
+    assert 0.15 < time.monotonic() - started < 1
+    assert limiter.acquire(write=True, timeout=0.2) == pytest.approx(0, abs=0.05)
+
+
+def test_reserve_reports_the_wait_or_raises_past_the_deadline():
+    clock = FakeClock()
+    limiter = RateLimiter(limit=1, period=100, clock=clock)
+    assert limiter.reserve(timeout=1) == 0
+
+    assert limiter.reserve() == pytest.approx(100)
+    assert limiter.reserve(timeout=150) == pytest.approx(100)
+    with pytest.raises(DeadlineExceeded):
+        limiter.reserve(timeout=50)
+
+
+def test_async_rate_limit_wait_past_the_deadline_raises(cf, stub, monkeypatch):
+    if cf.httpx is None:
+        pytest.skip("the asyncio backend needs httpx")
+    limiter = RateLimiter(limit=1, period=600)
+    limiter.acquire()
+    monkeypatch.setattr(cf, "rate_limiter", limiter)
+    monkeypatch.setattr(cf, "cycle_deadline", time.monotonic() + 5)
+    client = cf.AsyncHttpClient()
+    try:
+        with pytest.raises(DeadlineExceeded):
+            client.run(client.get(f"{stub.api}/zones/zone1/dns_records"))
+    finally:
+        client.close()
+    assert stub.calls == []
+
+
+def test_waiting_async_write_holds_back_threaded_reads(cf, stub, monkeypatch):
+    if cf.httpx is None:
+        pytest.skip("the asyncio backend needs httpx")
+    stub.zones["zone1"] = [{"id": "record1", "name": "a.example.com", "type": "A", "content": "192.0.2.1"}]
+    limiter = RateLimiter(limit=2, period=2)  # One token per second
+    limiter.acquire()
+    limiter.acquire()
+    monkeypatch.setattr(cf, "rate_limiter", limiter)
+    client = cf.AsyncHttpClient()
+    try:
+        write = client.submit(client.patch(f"{stub.api}/zones/zone1/dns_records/record1",
+                                           json={"content": "192.0.2.2"}))
+        deadline = time.monotonic() + 2
+        while limiter.waiting_writes == 0 and time.monotonic() < deadline:
+            time.sleep(0.005)
+        assert limiter.waiting_writes == 1  # Registered while it waits for a token
+
+        assert cf.http_client.get(f"{stub.api}/zones/zone1/dns_records").status_code == 200
+        assert write.result(timeout=5).status_code == 200
+    finally:
+        client.close()
+    assert [method for method, _, _, _ in stub.calls] == ["PATCH", "GET"]
+    assert limiter.waiting_writes == 0
+
+
+def test_backend_change_waits_for_the_running_cycle(cf, stub, monkeypatch):
+    if cf.httpx is None:
+        pytest.skip("the asyncio backend needs httpx")
+    stub.zones["zone1"] = [{"id": "record1", "name": "a.example.com", "type": "A", "content": "192.0.2.1"}]
+    limiter = RateLimiter(limit=2, period=2)  # One token per second
+    limiter.acquire()
+    limiter.acquire()
+    monkeypatch.setattr(cf, "rate_limiter", limiter)
+    client = cf.configure_network_backend("asyncio")
+    try:
+        monkeypatch.setattr(cf, "update_in_progress", True)
+        write = client.submit(client.patch(f"{stub.api}/zones/zone1/dns_records/record1",
+                                           json={"content": "192.0.2.2"}))
+
+        assert cf.configure_network_backend("threads") is client  # E.g. load_config during the cycle
+        assert write.result(timeout=5).status_code == 200  # Its coroutine was not stranded
+        assert cf.async_client is client
+
+        cf.apply_pending_network_backend()  # Still running: nothing changes
+        assert cf.async_client is client
+        monkeypatch.setattr(cf, "update_in_progress", False)
+        cf.apply_pending_network_backend()
+        assert cf.async_client is None
+        assert cf.pending_network_backend is None
+    finally:
+        if cf.async_client is not None:
+            cf.async_client.close()
@@ -0,0 +1,96 @@
+"""IpResolver races providers served by the stub's /ip endpoint."""
+
+import threading
+import time
+
+import pytest
+
+
+@pytest.fixture
+def provider(stub):
+    """Builds the URL of a stub provider answering `answer` after `delay` seconds."""
+    def url(answer: str, delay: float = 0.0) -> str:
+        return f"{stub.url}/ip?answer={answer}&delay={delay}"
+    return url
+
+
+def test_fastest_provider_wins_without_waiting_for_the_loser(cf, provider):
+    slow, fast = provider("192.0.2.1", 1.0), provider("192.0.2.2")
+    resolver = cf.IpResolver([slow, fast], quorum=1, race_width=2, timeout=3)
+
+    started = time.perf_counter()
+    assert resolver.resolve() == "192.0.2.2"
+    assert time.perf_counter() - started < 0.8
+
+    # The abandoned loser finishes in the background and still records its latency
+    deadline = time.monotonic() + 3
+    while resolver.stats[slow].successes == 0 and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert resolver.stats[slow].successes == 1
+    assert resolver.ranked() == [fast, slow]
+
+
+def test_wrong_answers_count_as_failures(cf, provider, stub):
+    ipv6 = provider("2001:db8::1")
+    garbage = provider("not-an-address")
+    missing = f"{stub.url}/no-such-provider"
+    good = provider("192.0.2.3", 0.2)
+    resolver = cf.IpResolver([ipv6, garbage, missing, good], quorum=1, race_width=4, timeout=3, family=4)
+
+    assert resolver.resolve() == "192.0.2.3"
+    for failed in (ipv6, garbage, missing):
+        assert resolver.stats[failed].failures == 1
+        assert resolver.stats[failed].latency >= cf.ProviderStats.SMOOTHING * resolver.timeout
+
+
+def test_quorum_needs_agreeing_providers_and_penalizes_dissent(cf, provider):
+    liar = provider("198.51.100.9")
+    first, second = provider("192.0.2.4", 0.1), provider("192.0.2.4", 0.3)
+    resolver = cf.IpResolver([liar, first, second], quorum=2, race_width=3, timeout=3)
+
+    assert resolver.resolve() == "192.0.2.4"
+    assert resolver.stats[liar].failures == 1
+    assert resolver.stats[first].successes == 1
+
+
+def test_no_quorum_moves_on_to_the_next_providers(cf, provider, stub):
+    broken = f"{stub.url}/no-such-provider"
+    resolver = cf.IpResolver([broken, provider("192.0.2.5")], quorum=1, race_width=1, timeout=3)
+    resolver.stats[broken].latency = -1  # Rank the broken provider first
+
+    assert resolver.resolve() == "192.0.2.5"
+    assert len(stub.calls) == 2
+
+
+def test_disagreement_without_quorum_returns_none(cf, provider):
+    resolver = cf.IpResolver([provider("192.0.2.6"), provider("192.0.2.7")], quorum=2, race_width=2, timeout=3)
+
+    assert resolver.resolve() is None
+
+
+def test_repeated_races_do_not_pile_up_queries_of_a_slow_provider(cf, provider, stub):
+    slow, fast = provider("192.0.2.1", 1.0), provider("192.0.2.2")
+    resolver = cf.IpResolver([slow, fast], quorum=1, race_width=2, timeout=3)
+
+    for _ in range(10):  # A short ProbeInterval
+        assert resolver.resolve() == "192.0.2.2"
+
+    assert stub.count("GET", r"^/ip$") == 11  # One query of the slow provider, ten of the fast one
+    assert list(resolver.running) == [slow]
+    assert len([thread for thread in threading.enumerate() if thread.name.startswith("ip-query")]) <= 2
+
+    resolver.running[slow].result(timeout=3)
+    assert resolver.running == {}
+    resolver.resolve()
+    assert stub.count("GET", r"^/ip$") == 13  # Once it finished, the slow provider is queried again
+
+
+def test_race_joins_the_query_still_running_from_an_earlier_race(cf, provider, stub):
+    slow, fast = provider("192.0.2.1", 0.5), provider("192.0.2.2")
+    resolver = cf.IpResolver([slow, fast], quorum=1, race_width=2, timeout=3)
+    assert resolver.resolve() == "192.0.2.2"
+
+    stub.faults = [503]  # The fast provider fails this time
+    assert resolver.resolve() == "192.0.2.1"
+
+    assert stub.count("GET", r"^/ip$") == 3  # The slow provider's answer came from the query already under way
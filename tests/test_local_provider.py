@@ -0,0 +1,126 @@
+"""The local:// IP provider: rtnetlink parsing and picking public addresses from an interface table."""
+
+import socket
+import struct
+
+import pytest
+
+from cfUpdater import (IFA_ADDRESS, IFA_LABEL, IFA_LOCAL, NLMSG_DONE, NLMSG_ERROR, RTM_NEWADDR,
+                       _parse_ifaddr_messages, pick_public_addresses)
+
+TABLE = [
+    ("lo", "127.0.0.1"),
+    ("lo", "::1"),
+    ("eth0", "192.168.1.20"),  # RFC 1918
+    ("eth0", "fe80::1%eth0"),  # Link-local, with a zone
+    ("eth0", "fd12:3456:789a::20"),  # ULA
+    ("wan0", "100.64.12.34"),  # CGNAT
+    ("wan0", "10.1.2.3"),  # RFC 1918
+    ("wan0", "172.16.0.9"),  # RFC 1918
+    ("wan0", "8.8.4.4"),
+    ("wan0", "2606:4700:4700::1001%wan0"),  # Global, with a zone
+    ("wan1", "1.0.0.1"),
+    ("wan1", "169.254.10.1"),  # Link-local
+    ("wan1", "not an address"),
+]
+
+
+def message(msg_type: int, payload: bytes) -> bytes:
+    """Packs one netlink message, padded to 4 bytes like the kernel does."""
+    length = 16 + len(payload)
+    return struct.pack('=LHHLL', length, msg_type, 0, 1, 0) + payload + b'\0' * (-length % 4)
+
+
+def attribute(attr_type: int, value: bytes) -> bytes:
+    length = 4 + len(value)
+    return struct.pack('=HH', length, attr_type) + value + b'\0' * (-length % 4)
+
+
+def newaddr(family: int, index: int, *attributes: bytes) -> bytes:
+    return message(RTM_NEWADDR, struct.pack('=BBBBI', family, 24, 0, 0, index) + b''.join(attributes))
+
+
+def packed(family: int, address: str) -> bytes:
+    return socket.inet_pton(family, address)
+
+
+def test_picks_only_global_addresses():
+    assert pick_public_addresses(TABLE) == ["8.8.4.4", "2606:4700:4700::1001", "1.0.0.1"]
+
+
+@pytest.mark.parametrize("interface, version, expected", [
+    ("wan0", None, ["8.8.4.4", "2606:4700:4700::1001"]),
+    ("wan0", 4, ["8.8.4.4"]),
+    ("wan0", 6, ["2606:4700:4700::1001"]),
+    (None, 4, ["8.8.4.4", "1.0.0.1"]),
+    ("wan1", 6, []),
+    ("eth0", None, []),
+    ("missing0", None, []),
+])
+def test_interface_and_family_filters(interface, version, expected):
+    assert pick_public_addresses(TABLE, interface, version) == expected
+
+
+@pytest.mark.parametrize("provider, family, expected", [
+    ("local://", None, "8.8.4.4"),
+    ("local://wan1", None, "1.0.0.1"),
+    ("local://?family=6", None, "2606:4700:4700::1001"),
+    ("local://wan0", 6, "2606:4700:4700::1001"),
+    ("local://wan0?family=4", 6, "8.8.4.4"),
+])
+def test_query_local_provider(cf, monkeypatch, provider, family, expected):
+    monkeypatch.setattr(cf, "read_interface_addresses", lambda: TABLE)
+    assert cf.query_local_provider(provider, family) == expected
+
+
+def test_query_local_provider_without_a_public_address(cf, monkeypatch):
+    monkeypatch.setattr(cf, "read_interface_addresses", lambda: TABLE)
+    with pytest.raises(ValueError, match="no public IPv6 address bound to wan1"):
+        cf.query_local_provider("local://wan1?family=6")
+
+
+def test_parses_a_dump_up_to_nlmsg_done():
+    data = (newaddr(socket.AF_INET, 1, attribute(IFA_ADDRESS, packed(socket.AF_INET, "10.0.0.1")),
+                    attribute(IFA_LOCAL, packed(socket.AF_INET, "8.8.4.4")), attribute(IFA_LABEL, b"ppp0\0"))
+            + newaddr(socket.AF_INET6, 2, attribute(IFA_ADDRESS, packed(socket.AF_INET6, "2606:4700::1")),
+                      attribute(IFA_LABEL, b"eth10\0"))  # A label whose length needs padding
+            + message(NLMSG_DONE, struct.pack('=i', 0))
+            + newaddr(socket.AF_INET, 3, attribute(IFA_LOCAL, packed(socket.AF_INET, "1.0.0.1"))))
+
+    entries, done = _parse_ifaddr_messages(data)
+
+    assert entries == [("ppp0", "8.8.4.4"), ("eth10", "2606:4700::1")]  # IFA_LOCAL wins over the peer address
+    assert done is True
+
+
+def test_unlabelled_address_is_named_by_interface_index():
+    index, name = socket.if_nameindex()[0]
+    data = (newaddr(socket.AF_INET, index, attribute(IFA_ADDRESS, packed(socket.AF_INET, "8.8.4.4")))
+            + newaddr(socket.AF_INET, 2 ** 31 - 1, attribute(IFA_ADDRESS, packed(socket.AF_INET, "1.0.0.1"))))
+
+    entries, done = _parse_ifaddr_messages(data)
+
+    assert entries == [(name, "8.8.4.4"), (str(2 ** 31 - 1), "1.0.0.1")]
+    assert done is False  # The dump continues in the next read
+
+
+def test_messages_without_an_address_or_of_other_families_are_skipped():
+    data = (newaddr(socket.AF_INET, 1, attribute(IFA_LABEL, b"eth0\0"))
+            + newaddr(17, 1, attribute(IFA_ADDRESS, b"\x00" * 6))  # AF_PACKET
+            + message(NLMSG_ERROR, struct.pack('=i', 0))  # An acknowledgement, not an error
+            + message(NLMSG_DONE, struct.pack('=i', 0)))
+
+    assert _parse_ifaddr_messages(data) == ([], True)
+
+
+def test_kernel_error_is_raised():
+    with pytest.raises(OSError) as error:
+        _parse_ifaddr_messages(message(NLMSG_ERROR, struct.pack('=i', -13)))
+    assert error.value.errno == 13
+
+
+def test_truncated_buffer_stops_parsing():
+    data = newaddr(socket.AF_INET, 1, attribute(IFA_LOCAL, packed(socket.AF_INET, "8.8.4.4")))
+
+    assert _parse_ifaddr_messages(data[:10]) == ([], False)
+    assert _parse_ifaddr_messages(struct.pack('=LHHLL', 8, RTM_NEWADDR, 0, 1, 0)) == ([], False)
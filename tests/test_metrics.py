@@ -0,0 +1,50 @@
+"""The Prometheus metrics endpoint."""
+
+import socket
+import urllib.request
+
+import pytest
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def metrics(cf, monkeypatch):
+    monkeypatch.setattr(cf, "metrics_server", None)
+    monkeypatch.setattr(cf, "metrics_endpoint", None)
+    yield cf
+    cf.start_metrics_server(0)
+
+
+@pytest.mark.parametrize("address", ["127.0.0.1", "localhost"])
+def test_unchanged_settings_keep_the_running_server(metrics, address):
+    port = free_port()
+    server = metrics.start_metrics_server(port, address)
+
+    assert server is not None
+    assert metrics.start_metrics_server(port, address) is server
+
+
+def test_changed_port_moves_and_zero_stops_the_server(metrics):
+    first = metrics.start_metrics_server(free_port(), "localhost")
+    second = metrics.start_metrics_server(free_port(), "localhost")
+
+    assert second is not first
+    assert metrics.start_metrics_server(0, "localhost") is None
+    assert metrics.metrics_server is None
+
+
+def test_metrics_are_served_as_prometheus_text(metrics):
+    port = free_port()
+    metrics.start_metrics_server(port, "localhost")
+    metrics.records_total.inc(metrics.RESULT_UPDATED)
+
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as response:
+        body = response.read().decode()
+
+    assert response.headers["Content-Type"].startswith("text/plain")
+    assert 'cfupdater_records_total{result="updated"}' in body
@@ -0,0 +1,145 @@
+"""Writes by cached record ID, the fallback when a cached ID is gone, and RecordIdCache expiry and eviction."""
+
+import time
+
+from cloudflare_stub import make_zone
+
+NEW_IP = "203.0.113.7"
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = time.time()
+
+    def __call__(self):
+        return self.now
+
+
+def desired(cf, stub, zone_id="zone1"):
+    return [(cf.RecordSpec(record["name"], zone_id), NEW_IP) for record in stub.zones[zone_id]]
+
+
+def cache_ids(cf, stub, zone_id="zone1", ids=None):
+    for record, record_id in zip(stub.zones[zone_id], ids or [record["id"] for record in stub.zones[zone_id]]):
+        cf.record_id_cache.put(zone_id, record["name"], record["type"], record_id)
+
+
+def reconcile(cf, targets, known_stale):
+    return {spec.name: result for spec, result in cf.reconcile_records("key", "user@example.com", targets,
+                                                                       known_stale)}
+
+
+def test_known_stale_records_are_written_by_cached_id_without_a_listing(cf, stub, backend):
+    stub.zones["zone1"] = make_zone("zone1", 3)
+    cache_ids(cf, stub)
+    targets = desired(cf, stub)
+
+    results = reconcile(cf, targets, {spec.key for spec, _ in targets})
+
+    assert set(results.values()) == {cf.RESULT_UPDATED}
+    assert stub.count("GET") == 0
+    assert stub.count("POST", r"/dns_records/batch$") == 1
+    assert all(record["content"] == NEW_IP for record in stub.zones["zone1"])
+
+
+def test_single_known_stale_record_is_patched_by_cached_id(cf, stub, backend):
+    stub.zones["zone1"] = make_zone("zone1", 1)
+    cache_ids(cf, stub)
+    targets = desired(cf, stub)
+
+    assert reconcile(cf, targets, {targets[0][0].key}) == {"host0.example.com": cf.RESULT_UPDATED}
+    assert [method for method, _, _, _ in stub.calls] == ["PATCH"]
+
+
+def test_zone_is_listed_unless_every_record_is_known_stale_and_cached(cf, stub, backend):
+    stub.zones["zone1"] = make_zone("zone1", 3)
+    cache_ids(cf, stub)
+    targets = desired(cf, stub)
+
+    reconcile(cf, targets, {spec.key for spec, _ in targets[:2]})  # The third one may be up to date
+
+    assert stub.count("GET", r"/zones/zone1/dns_records$") == 1
+
+
+def test_404_on_a_cached_id_invalidates_it_and_lists_the_zone(cf, stub, backend):
+    stub.zones["zone1"] = make_zone("zone1", 1)
+    cache_ids(cf, stub, ids=["deleted-id"])  # The record was deleted and recreated under a new ID
+    targets = desired(cf, stub)
+
+    results = reconcile(cf, targets, {targets[0][0].key})
+
+    assert results == {"host0.example.com": cf.RESULT_UPDATED}
+    assert [(method, path.rsplit("/", 1)[1]) for method, path, _, _ in stub.calls] == [
+        ("PATCH", "deleted-id"), ("GET", "dns_records"), ("PATCH", "zone1-00000")]
+    assert cf.record_id_cache.get("zone1", "host0.example.com", "A") == "zone1-00000"
+    assert stub.zones["zone1"][0]["content"] == NEW_IP
+
+
+def test_stale_id_in_a_batch_relists_only_the_missing_record(cf, stub, backend):
+    stub.zones["zone1"] = make_zone("zone1", 4)
+    cache_ids(cf, stub, ids=["zone1-00000", "zone1-00001", "deleted-id", "zone1-00003"])
+    targets = desired(cf, stub)
+
+    results = reconcile(cf, targets, {spec.key for spec, _ in targets})
+
+    assert set(results.values()) == {cf.RESULT_UPDATED}
+    assert stub.count("GET", r"/zones/zone1/dns_records$") == 1
+    assert stub.count("PATCH", r"/deleted-id$") == 1
+    assert stub.count("PATCH", r"/zone1-00002$") == 1
+    assert all(record["content"] == NEW_IP for record in stub.zones["zone1"])
+
+
+def test_record_deleted_for_good_is_reported_not_found(cf, stub, backend):
+    stub.zones["zone1"] = make_zone("zone1", 1)
+    cache_ids(cf, stub)
+    targets = desired(cf, stub)
+    stub.zones["zone1"].clear()
+
+    assert reconcile(cf, targets, {targets[0][0].key}) == {"host0.example.com": cf.RESULT_NOT_FOUND}
+    assert cf.record_id_cache.get("zone1", "host0.example.com", "A") is None
+
+
+def test_entries_expire_after_the_ttl(cf, monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(cf.time, "time", clock)
+    cache = cf.RecordIdCache(ttl_minutes=10)
+    cache.put("zone1", "a.example.com", "A", "id-a")
+
+    clock.now += 599
+    assert cache.get("zone1", "a.example.com", "A") == "id-a"
+    clock.now += 1
+    assert cache.get("zone1", "a.example.com", "A") is None
+    assert cache.entries == {}
+
+
+def test_names_are_normalized_in_the_key(cf):
+    cache = cf.RecordIdCache()
+    cache.put("zone1", "A.Example.com.", "a", "id-a")
+
+    assert cache.get("zone1", "a.example.com", "A") == "id-a"
+
+
+def test_least_recently_used_entry_is_evicted(cf):
+    cache = cf.RecordIdCache(max_entries=3)
+    for name in ("a", "b", "c"):
+        cache.put("zone1", f"{name}.example.com", "A", f"id-{name}")
+    cache.get("zone1", "a.example.com", "A")  # a is now the most recently used
+
+    cache.put("zone1", "d.example.com", "A", "id-d")
+
+    assert cache.get("zone1", "b.example.com", "A") is None
+    assert [cache.get("zone1", f"{name}.example.com", "A") for name in ("a", "c", "d")] == ["id-a", "id-c", "id-d"]
+
+
+def test_load_json_skips_expired_entries(cf, monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(cf.time, "time", clock)
+    cache = cf.RecordIdCache(ttl_minutes=10)
+    cache.put("zone1", "a.example.com", "A", "id-a")
+    cache.put("zone1", "b.example.com", "A", "id-b")
+    cache.entries[cache.key("zone1", "a.example.com", "A")] = ("id-a", clock.now - 1)
+
+    restored = cf.RecordIdCache()
+    restored.load_json(cache.to_json())
+
+    assert list(restored.entries) == ["zone1/b.example.com/A"]
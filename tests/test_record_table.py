@@ -0,0 +1,99 @@
+"""Validation and caching of JSON record tables."""
+
+import json
+import os
+
+import pytest
+
+from cfUpdater import parse_record_table
+
+ZONE = "023e105f4ecef8ad9ca31a8372d0c353"
+
+
+def test_records_inherit_defaults():
+    records = parse_record_table({
+        "defaults": {"zone": ZONE, "proxied": True},
+        "records": [
+            {"name": "example.com"},
+            {"name": "vpn.example.com", "proxied": False, "ttl": 300},
+            {"name": "nas.example.com", "type": "A+AAAA", "ip_source": " local://eth0 "},
+        ],
+    }, "records.json")
+
+    assert [(spec.name, spec.zone_id, spec.type, spec.proxied, spec.ttl, spec.ip_source) for spec in records] == [
+        ("example.com", ZONE, "A", True, None, None),
+        ("vpn.example.com", ZONE, "A", False, 300, None),
+        ("nas.example.com", ZONE, "A", True, None, "local://eth0"),
+        ("nas.example.com", ZONE, "AAAA", True, None, "local://eth0"),
+    ]
+
+
+def test_zone_may_be_left_out():
+    spec, = parse_record_table({"records": [{"name": "example.com"}]}, "records.json")
+    assert spec.zone_id is None
+
+
+@pytest.mark.parametrize("table, message", [
+    ([{"name": "example.com"}], "expected an object with a \"records\" list"),
+    ({"records": {"name": "example.com"}}, "expected an object with a \"records\" list"),
+    ({"defaults": {"name": "example.com"}, "records": []}, "\"defaults\" must be an object without a name"),
+    ({"defaults": ["proxied"], "records": []}, "\"defaults\" must be an object without a name"),
+    ({"records": ["example.com"]}, "record 1: expected an object"),
+    ({"records": [{"name": "example.com", "prioxied": True}]}, "record 1: unknown field\\(s\\) prioxied"),
+    ({"defaults": {"comment": "x"}, "records": [{"name": "example.com"}]}, "unknown field\\(s\\) comment"),
+    ({"records": [{"zone": ZONE}]}, "record 1: \"name\" must be a non-empty string"),
+    ({"records": [{"name": " . "}]}, "\"name\" must be a non-empty string"),
+    ({"records": [{"name": "example.com", "zone": 42}]}, "\"zone\" must be a string"),
+    ({"records": [{"name": "example.com", "type": "MX"}]}, "\"type\" must be A, AAAA or A\\+AAAA"),
+    ({"records": [{"name": "example.com", "proxied": "yes"}]}, "\"proxied\" must be true or false"),
+    ({"records": [{"name": "example.com", "proxied": 1}]}, "\"proxied\" must be true or false"),
+    ({"records": [{"name": "example.com", "ttl": "300"}]}, "\"ttl\" must be 1 \\(automatic\\) or 60-86400"),
+    ({"records": [{"name": "example.com", "ttl": True}]}, "\"ttl\" must be 1"),
+    ({"records": [{"name": "example.com", "ttl": 300.0}]}, "\"ttl\" must be 1"),
+    ({"records": [{"name": "example.com", "ttl": 30}]}, "\"ttl\" must be 1"),
+    ({"records": [{"name": "example.com", "ttl": 86401}]}, "\"ttl\" must be 1"),
+    ({"records": [{"name": "example.com", "ip_source": ["local://eth0"]}]}, "\"ip_source\" must be a string"),
+])
+def test_invalid_tables_are_rejected(table, message):
+    with pytest.raises(ValueError, match=message):
+        parse_record_table(table, "records.json")
+
+
+@pytest.mark.parametrize("records", [
+    [{"name": "example.com"}, {"name": "example.com"}],
+    [{"name": "example.com"}, {"name": "Example.COM."}],
+    [{"name": "example.com", "type": "A+AAAA"}, {"name": "example.com", "type": "AAAA"}],
+])
+def test_duplicate_records_are_rejected(records):
+    with pytest.raises(ValueError, match="records.json: record 2 \\(.*\\): listed more than once"):
+        parse_record_table({"defaults": {"zone": ZONE}, "records": records}, "records.json")
+
+
+def test_same_name_in_other_zone_or_type_is_not_a_duplicate():
+    records = parse_record_table({"records": [
+        {"name": "example.com", "zone": "zone1"},
+        {"name": "example.com", "zone": "zone2"},
+        {"name": "example.com", "zone": "zone1", "type": "AAAA"},
+    ]}, "records.json")
+    assert len(records) == 3
+
+
+def test_table_is_parsed_again_only_when_it_changes(cf, tmp_path):
+    path = tmp_path / "records.json"
+    path.write_text(json.dumps({"records": [{"name": "a.example.com"}]}))
+
+    first = cf.load_record_table(str(path))
+    assert cf.load_record_table(str(path)) is first
+
+    path.write_text(json.dumps({"records": [{"name": "a.example.com"}, {"name": "b.example.com"}]}))
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert [spec.name for spec in cf.load_record_table(str(path))] == ["a.example.com", "b.example.com"]
+
+
+def test_invalid_json_file_raises_value_error(cf, tmp_path):
+    path = tmp_path / "records.json"
+    path.write_text("{\"records\": [")
+
+    with pytest.raises(ValueError):
+        cf.load_record_table(str(path))
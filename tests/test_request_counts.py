@@ -0,0 +1,68 @@
+"""How many Cloudflare requests an update cycle costs."""
+
+import pytest
+
+from cloudflare_stub import make_zone
+
+PUBLIC_IP = "203.0.113.7"
+
+
+@pytest.fixture
+def settings(cf, stub, monkeypatch):
+    stub.zones["zone1"] = make_zone("zone1", 3)
+    monkeypatch.setattr(cf, "get_source_ip", lambda source, family=4: PUBLIC_IP)
+    return {'api_key': "key", 'email': "user@example.com", 'zone_ids': "zone1",
+            'record_names': "host0.example.com", 'record_type': "A", 'records_file': ''}
+
+
+def run_cycle(cf, settings, force=False):
+    lines = []
+    updated = cf.run_update_cycle(settings, lambda kind, value: lines.append((kind, value)), force=force)
+    return updated, lines
+
+
+def test_stale_record_costs_one_listing_and_one_write(cf, stub, settings):
+    updated, lines = run_cycle(cf, settings)
+
+    assert updated is True
+    assert ("status", f"Success: Updated host0.example.com to {PUBLIC_IP}.\n") in lines
+    assert stub.count("GET", r"/zones/zone1/dns_records$") == 1
+    assert stub.count("PATCH", r"/zones/zone1/dns_records/zone1-00000$") == 1
+    assert len(stub.calls) == 2
+    assert stub.zones["zone1"][0]["content"] == PUBLIC_IP
+
+
+def test_warm_unchanged_cycle_sends_no_requests(cf, stub, settings):
+    run_cycle(cf, settings)
+    stub.reset_calls()
+
+    updated, lines = run_cycle(cf, settings)
+
+    assert updated is False
+    assert stub.calls == []
+
+
+def test_forced_cycle_of_up_to_date_record_only_lists(cf, stub, settings):
+    run_cycle(cf, settings)
+    stub.reset_calls()
+
+    updated, lines = run_cycle(cf, settings, force=True)
+
+    assert updated is False
+    assert ("status", "Info: host0.example.com is already up-to-date.\n") in lines
+    assert stub.count("GET") == 1
+    assert len(stub.calls) == 1
+
+
+def test_reconcile_lists_each_zone_once(cf, stub):
+    stub.zones["zone1"] = make_zone("zone1", 5)
+    stub.zones["zone2"] = make_zone("zone2", 5, domain="example.org")
+    desired = [(cf.RecordSpec(record["name"], zone_id), PUBLIC_IP)
+               for zone_id in ("zone1", "zone2") for record in stub.zones[zone_id][:3]]
+
+    results = list(cf.reconcile_records("key", "user@example.com", desired))
+
+    assert sorted(result for _, result in results) == [cf.RESULT_UPDATED] * 6
+    assert stub.count("GET") == 2
+    assert stub.count("POST", r"/dns_records/batch$") == 2  # One chunk per zone
+    assert stub.count("PATCH") == 0
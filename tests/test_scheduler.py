@@ -0,0 +1,129 @@
+"""UpdateScheduler deadlines and countdown_display, driven by a simulated clock."""
+
+import pytest
+
+from cfUpdater import MAX_EVENT_DELAY, MAX_TIMER_DELAY, UpdateScheduler, countdown_display
+
+
+class FakeClock:
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def test_first_cycle_is_due_immediately(clock):
+    scheduler = UpdateScheduler(300, clock=clock)
+    assert scheduler.time_until_next() == 0
+
+
+def test_deadlines_follow_mark_run_without_drift(clock):
+    scheduler = UpdateScheduler(300, clock=clock)
+    starts = []
+    for duration in (7, 0.5, 42, 299, 3):
+        clock.now += scheduler.time_until_next()  # The timer fires on time
+        scheduler.mark_run()
+        starts.append(clock.now)
+        clock.now += duration  # However long the cycle takes
+    assert starts == [0, 300, 600, 900, 1200]
+    assert scheduler.next_deadline() == 1500
+
+
+def test_late_wakeup_does_not_accumulate(clock):
+    scheduler = UpdateScheduler(300, clock=clock)
+    scheduler.mark_run()
+    clock.now = 300.25  # The timer fired a little late
+    scheduler.mark_run()
+    clock.now = 310
+    assert scheduler.next_deadline() == 600.25
+
+
+def test_event_waits_for_the_debounce(clock):
+    scheduler = UpdateScheduler(3600, debounce=5, clock=clock)
+    scheduler.mark_run()
+    clock.now = 10
+    scheduler.notify()
+    assert scheduler.next_deadline() == 15
+
+    clock.now = 13
+    scheduler.notify()  # Another change restarts the debounce
+    assert scheduler.next_deadline() == 18
+    clock.now = 18
+    assert scheduler.time_until_next() == 0
+
+    scheduler.mark_run()  # The cycle covers the events
+    assert scheduler.next_deadline() == 18 + 3600
+
+
+def test_flapping_address_is_capped_at_max_event_delay(clock):
+    scheduler = UpdateScheduler(3600, debounce=5, clock=clock)
+    scheduler.mark_run()
+    clock.now = 10
+    while clock.now < 10 + MAX_EVENT_DELAY:
+        scheduler.notify()
+        assert scheduler.next_deadline() == min(clock.now + 5, 10 + MAX_EVENT_DELAY)
+        clock.now += 4  # Never settles for 5 s
+    assert scheduler.next_deadline() == 10 + MAX_EVENT_DELAY
+    assert scheduler.time_until_next() == 0
+
+
+def test_safety_interval_wins_over_a_later_settle_time(clock):
+    scheduler = UpdateScheduler(20, debounce=5, clock=clock)
+    scheduler.mark_run()
+    clock.now = 18
+    scheduler.notify()
+    assert scheduler.next_deadline() == 20
+
+
+def test_clock_jump_past_several_intervals_runs_one_overdue_cycle(clock):
+    scheduler = UpdateScheduler(300, clock=clock)
+    runs = []
+
+    def run_loop(until: float):
+        while clock.now < until:
+            if scheduler.time_until_next() <= 0:
+                scheduler.mark_run()
+                runs.append(clock.now)
+            clock.now += min(scheduler.time_until_next(), MAX_TIMER_DELAY, until - clock.now) or MAX_TIMER_DELAY
+
+    run_loop(301)
+    assert runs == [0, 300]
+    clock.now += 1000  # Suspended for more than three intervals
+    run_loop(clock.now + 1)
+    assert runs == [0, 300, 1301]
+    run_loop(1602)
+    assert runs == [0, 300, 1301, 1601]
+
+
+@pytest.mark.parametrize("remaining, text, refresh", [
+    (61, "Next check in: 2 min", 1),
+    (60.5, "Next check in: 2 min", 0.5),
+    (60, "Next check in: 01:00", 1),
+    (59.25, "Next check in: 01:00", 0.25),
+    (59, "Next check in: 00:59", 1),
+    (125, "Next check in: 3 min", 5),
+    (600, "Next check in: 10 min", MAX_TIMER_DELAY),
+    (3600.5, "Next check in: 61 min", 0.5),
+    (0.3, "Next check in: 00:01", 0.3),
+])
+def test_countdown_text_and_refresh_time(remaining, text, refresh):
+    assert countdown_display(remaining) == (text, pytest.approx(refresh))
+
+
+def test_countdown_refreshes_exactly_when_the_text_changes():
+    remaining = 185.5
+    shown = []
+    while remaining > 0:
+        text, refresh = countdown_display(remaining)
+        assert not shown or text != shown[-1]  # No wasted refreshes
+        shown.append(text)
+        remaining -= refresh
+    assert shown[:4] == ["Next check in: 4 min", "Next check in: 3 min", "Next check in: 2 min",
+                         "Next check in: 01:00"]
+    assert shown[4:] == [f"Next check in: 00:{seconds:02d}" for seconds in range(59, 0, -1)]
@@ -0,0 +1,135 @@
+"""Crash safety of the append-only state journal."""
+
+import os
+import random
+import signal
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Appends one record per save forever, reporting each save once it returned
+WRITER = textwrap.dedent("""
+    import sys
+    sys.path.insert(0, sys.argv[1])
+    import cfUpdater
+
+    state = cfUpdater.UpdateState(sys.argv[2])
+    state.load()
+    number = len(state.records)
+    while True:
+        state.records[f"zone1/host{number}.example.com/A"] = f"192.0.2.{number % 256}"
+        state.ip = f"203.0.113.{number % 256}"
+        state.save()
+        print(number, flush=True)
+        number += 1
+""")
+
+
+def load(cf, path):
+    cf.record_id_cache = cf.RecordIdCache()
+    state = cf.UpdateState(path)
+    state.load()
+    return state
+
+
+def test_journal_survives_sigkill_of_the_writer(cf, tmp_path):
+    path = str(tmp_path / cf.STATE_FILE_NAME)
+    rng = random.Random(19)
+    confirmed = -1
+    for _ in range(8):
+        writer = subprocess.Popen([sys.executable, "-c", WRITER, ROOT, path], stdout=subprocess.PIPE, text=True)
+        for _ in range(rng.randint(1, 250)):  # Crosses several compactions over the rounds
+            confirmed = int(writer.stdout.readline())
+        writer.send_signal(signal.SIGKILL)
+        writer.wait()
+        writer.stdout.close()
+
+        state = load(cf, path)
+        # Every save that returned is there; at most the one in progress made it too
+        assert confirmed + 1 <= len(state.records) <= confirmed + 2
+        assert state.records == {f"zone1/host{number}.example.com/A": f"192.0.2.{number % 256}"
+                                 for number in range(len(state.records))}
+        assert state.ip == f"203.0.113.{(len(state.records) - 1) % 256}"
+        confirmed = len(state.records) - 1
+
+
+@pytest.fixture
+def journal(cf, tmp_path):
+    """A journal of one snapshot and several deltas, with the expected (ip, records) after each line."""
+    path = str(tmp_path / cf.STATE_FILE_NAME)
+    state = load(cf, path)
+    expected = []
+    for number in range(6):
+        state.ip = f"203.0.113.{number // 2}"
+        state.records[f"zone1/host{number}.example.com/A"] = f"192.0.2.{number}"
+        if number == 4:
+            del state.records["zone1/host1.example.com/A"]
+        state.save()
+        expected.append((state.ip, dict(state.records)))
+    with open(path, 'rb') as journalfile:
+        data = journalfile.read()
+    assert data.count(b'\n') == len(expected)
+    return path, data, expected
+
+
+def test_every_truncated_prefix_replays_to_the_last_complete_entry(cf, journal):
+    path, data, expected = journal
+    for length in range(len(data) + 1):
+        prefix = data[:length]
+        with open(path, 'wb') as journalfile:
+            journalfile.write(prefix)
+        complete = prefix.count(b'\n')
+
+        state = load(cf, path)
+
+        if complete:
+            assert (state.ip, state.records) == expected[complete - 1], length
+        else:
+            assert (state.ip, state.records) == (None, {}), length
+        torn = not prefix.endswith(b'\n')
+        assert state.needs_compaction == (torn or complete == 0), length
+
+        # The next save rewrites a torn journal instead of appending after the torn tail
+        state.records["zone1/new.example.com/A"] = "192.0.2.99"
+        state.save()
+        with open(path, 'rb') as journalfile:
+            saved = journalfile.read()
+        if torn or complete == 0:
+            assert saved.count(b'\n') == 1 and cf.UpdateState.decode_entry(saved)['snapshot'], length
+        else:
+            assert saved.startswith(prefix) and saved.count(b'\n') == complete + 1, length
+        reloaded = load(cf, path)
+        assert (reloaded.ip, reloaded.records) == (state.ip, state.records), length
+        assert not reloaded.needs_compaction
+
+
+def test_corrupt_line_drops_it_and_everything_after(cf, journal):
+    path, data, expected = journal
+    lines = data.splitlines(keepends=True)
+    lines[3] = lines[3].replace(b'192.0.2.3', b'192.0.2.8')  # Same length, wrong CRC
+    with open(path, 'wb') as journalfile:
+        journalfile.write(b''.join(lines))
+
+    state = load(cf, path)
+
+    assert (state.ip, state.records) == expected[2]
+    assert state.needs_compaction
+
+
+def test_journal_is_compacted_after_the_configured_number_of_appends(cf, tmp_path, monkeypatch):
+    monkeypatch.setattr(cf, "JOURNAL_COMPACT_ENTRIES", 3)
+    path = str(tmp_path / cf.STATE_FILE_NAME)
+    state = load(cf, path)
+    line_counts = []
+    for number in range(6):
+        state.records[f"zone1/host{number}.example.com/A"] = "192.0.2.1"
+        state.save()
+        with open(path, 'rb') as journalfile:
+            line_counts.append(journalfile.read().count(b'\n'))
+
+    assert line_counts == [1, 2, 3, 4, 1, 2]
+    assert load(cf, path).records == state.records
@@ -0,0 +1,109 @@
+"""The status box's ring buffer and the view's incremental refresh, over a simulated month of cycles."""
+
+import tracemalloc
+from collections import deque
+
+import pytest
+
+from cfUpdater import StatusLog, StatusLogView
+
+CYCLES_PER_MONTH = 30 * 24 * 12  # One cycle every 5 minutes
+
+
+class FakeVar:
+    """Stands in for a tk.StringVar."""
+
+    def __init__(self, value: str):
+        self.value = value
+
+    def get(self) -> str:
+        return self.value
+
+
+def headless_view(log: StatusLog, severity: str = "All", record: str = "", height: int = 10) -> StatusLogView:
+    """A StatusLogView without widgets: the filtering and trimming logic, with rendering left out."""
+    view = StatusLogView.__new__(StatusLogView)
+    view.log, view.height, view.top, view.follow = log, height, 0, True
+    view.lines, view.seen = deque(), 0
+    view.severity, view.record = FakeVar(severity), FakeVar(record)
+    view.render = lambda: None
+    return view
+
+
+def cycle_lines(number: int) -> str:
+    if number % 100 == 0:
+        return f"Error: Failed to update host{number % 7}.example.com.\nInfo: Cycle took 0.40 s.\n"
+    return "No update necessary.\nInfo: Cycle took 0.05 s, longest UI stall 3 ms.\n\n"
+
+
+def test_append_splits_lines_and_reads_severity():
+    log = StatusLog()
+    log.append("Success: Updated a.example.com to 203.0.113.7.\n\nError: x\nplain line\n")
+
+    assert [(line.seq, line.severity) for line in log.lines] == [(0, "Success"), (1, "Error"), (2, "Info")]
+
+
+def test_since_returns_only_lines_still_held():
+    log = StatusLog(max_lines=5)
+    log.append("".join(f"line {n}\n" for n in range(8)))
+
+    assert [line.seq for line in log.since(6)] == [6, 7]
+    assert [line.seq for line in log.since(0)] == [3, 4, 5, 6, 7]  # 0..2 were dropped
+    assert log.since(8) == []
+
+
+def test_resize_keeps_the_newest_lines():
+    log = StatusLog(max_lines=10)
+    log.append("".join(f"line {n}\n" for n in range(10)))
+    log.resize(3)
+
+    assert [line.text for line in log.lines] == ["line 7", "line 8", "line 9"]
+    assert log.total == 10
+
+
+@pytest.mark.parametrize("severity, record", [("All", ""), ("Error", ""), ("All", "host3")])
+def test_a_month_of_cycles_stays_at_the_cap(severity, record):
+    log = StatusLog(max_lines=1000)
+    view = headless_view(log, severity, record)
+    tracemalloc.start()
+    try:
+        for number in range(CYCLES_PER_MONTH):
+            log.append(cycle_lines(number))
+            view.refresh()
+            if number == 2000:  # Well past the point where the buffer filled up
+                settled, _ = tracemalloc.get_traced_memory()
+        final, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert len(log.lines) == 1000
+    assert log.total == 2 * CYCLES_PER_MONTH
+    assert final - settled < 64 * 1024  # Flat, not growing with the number of cycles
+    assert view.seen == log.total
+    assert view.lines and view.lines[0].seq >= log.lines[0].seq  # Nothing the ring buffer dropped
+    assert list(view.lines) == [line for line in log.lines if view.matches(line)]
+
+
+def test_refresh_after_more_lines_than_the_cap_keeps_only_held_ones():
+    log = StatusLog(max_lines=50)
+    view = headless_view(log)
+    log.append("".join(f"first {n}\n" for n in range(30)))
+    view.refresh()
+
+    log.append("".join(f"second {n}\n" for n in range(120)))
+    view.refresh()
+
+    assert [line.text for line in view.lines] == [f"second {n}" for n in range(70, 120)]
+
+
+def test_scrolled_back_view_keeps_its_place_as_old_lines_drop():
+    log = StatusLog(max_lines=100)
+    view = headless_view(log)
+    log.append("".join(f"line {n}\n" for n in range(100)))
+    view.refresh()
+    view.follow, view.top = False, 60  # Reading line 60
+
+    log.append("".join(f"line {n}\n" for n in range(100, 125)))
+    view.refresh()
+
+    assert view.lines[view.top].text == "line 60"
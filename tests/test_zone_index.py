@@ -0,0 +1,108 @@
+"""Zone lookup for records without a zone ID: the suffix trie, the paginated listing and its refresh rules."""
+
+import pytest
+
+ZONES = {"example.com": "zone-com", "b.example.com": "zone-b", "example.org": "zone-org"}
+
+
+@pytest.fixture
+def zones(cf, stub, monkeypatch):
+    """Serves ZONES from the stub's zone listing, two zones per page."""
+    stub.zone_names.update(ZONES)
+    monkeypatch.setattr(cf, "ZONES_PER_PAGE", 2)
+    return stub
+
+
+def resolve(cf, *names, api_key="key"):
+    specs = [cf.RecordSpec(name) for name in names]
+    return [spec.zone_id for spec in cf.resolve_zones(api_key, "user@example.com", specs)]
+
+
+@pytest.mark.parametrize("name, zone_id", [
+    ("a.b.example.com", "zone-b"),
+    ("b.example.com", "zone-b"),
+    ("a.example.com", "zone-com"),
+    ("x.y.a.example.com", "zone-com"),
+    ("example.com", "zone-com"),
+    ("A.B.Example.COM.", "zone-b"),
+    ("bb.example.com", "zone-com"),
+    ("www.example.org", "zone-org"),
+    ("example.net", None),
+    ("com", None),
+])
+def test_longest_suffix_wins(cf, name, zone_id):
+    assert cf.ZoneIndex(ZONES, "owner").lookup(name) == zone_id
+
+
+def test_listing_follows_every_page(cf, zones):
+    index = cf.fetch_zone_index("key", "user@example.com")
+
+    assert index.zones == ZONES
+    assert [query["page"] for _, path, query, _ in zones.calls] == ["1", "2"]
+    assert all(query["per_page"] == "2" for _, _, query, _ in zones.calls)
+
+
+def test_failed_listing_returns_none(cf, zones):
+    zones.faults = [403]
+
+    assert cf.fetch_zone_index("key", "user@example.com") is None
+
+
+def test_index_is_listed_once_and_reused(cf, zones):
+    assert resolve(cf, "a.b.example.com", "www.example.org") == ["zone-b", "zone-org"]
+    zones.reset_calls()
+
+    assert resolve(cf, "a.example.com") == ["zone-com"]
+    assert zones.calls == []
+
+
+def test_records_with_a_zone_id_need_no_listing(cf, zones):
+    specs = [cf.RecordSpec("a.example.com", "zone-x")]
+
+    assert cf.resolve_zones("key", "user@example.com", specs) == specs
+    assert zones.calls == []
+
+
+def test_stale_index_is_listed_again(cf, zones):
+    resolve(cf, "a.example.com")
+    cf.zone_index.built_at -= cf.zone_index_ttl * 60 + 1
+    zones.reset_calls()
+
+    assert resolve(cf, "a.example.com") == ["zone-com"]
+    assert zones.count("GET", r"/zones$") == 2
+
+
+def test_index_of_other_credentials_is_listed_again(cf, zones):
+    resolve(cf, "a.example.com")
+    zones.reset_calls()
+
+    assert resolve(cf, "a.example.com", api_key="other-key") == ["zone-com"]
+    assert zones.count("GET", r"/zones$") == 2
+    assert cf.zone_index.owner == cf.credentials_fingerprint("other-key", "user@example.com")
+
+
+def test_unknown_name_relists_at_most_every_min_age(cf, zones):
+    resolve(cf, "a.example.com")
+    zones.zone_names["example.net"] = "zone-net"  # Added on Cloudflare after the listing
+    zones.reset_calls()
+
+    assert resolve(cf, "www.example.net") == [None]  # The index is too young to list again
+    assert zones.calls == []
+
+    cf.zone_index.built_at -= cf.ZONE_INDEX_MIN_AGE
+    assert resolve(cf, "www.example.net") == ["zone-net"]
+    assert zones.count("GET", r"/zones$") == 2
+
+    zones.reset_calls()
+    assert resolve(cf, "www.example.info") == [None]  # The fresh listing is not repeated
+    assert zones.calls == []
+
+
+def test_failed_refresh_keeps_the_old_index(cf, zones):
+    resolve(cf, "a.example.com")
+    old = cf.zone_index
+    old.built_at -= cf.zone_index_ttl * 60 + 1
+    zones.faults = [403]
+
+    assert resolve(cf, "a.b.example.com") == ["zone-b"]
+    assert cf.zone_index is old